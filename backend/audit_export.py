@@ -0,0 +1,253 @@
+"""
+Plaza-wise audit export for Plaza Portal.
+Writes one run (scope, from date, to date, as DELETE /api/idr/request groups it) as an
+audit workbook laid out like `audit (1).xlsx` (Sr. No., name, bulleted list), one row per
+plaza, scope and month, plus a ZIP of every uploaded document of the run.
+
+Rows come from a server-side cursor and the workbook is written in write-only mode, so
+memory stays flat however large the run is. Documents are fetched from S3 by a bounded
+pool of threads and copied into the ZIP in query order; each one is held in a spooled
+temporary file (memory up to SPOOL_MAX_BYTES, disk beyond) until it is written.
+
+S3 settings are the ones config/s3.js uses (AWS_S3_BUCKET_NAME, AWS_REGION,
+AWS_S3_ENDPOINT for an S3-compatible server such as MinIO, AWS_ACCESS_KEY_ID /
+AWS_SECRET_ACCESS_KEY). AUDIT_EXPORT_WORKERS sets the number of parallel fetches (default 8).
+
+Usage: python audit_export.py <scope_name> <from_date> <to_date> [output_dir]
+"""
+
+import csv
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import groupby
+
+from db import close_pool, db_connection
+
+CURSOR_ITERSIZE = 2000
+SPOOL_MAX_BYTES = 1024 * 1024
+COPY_CHUNK_BYTES = 256 * 1024
+
+HEADER = ('Sr. No.', 'Plaza', 'Scope', 'Month', 'Request ID', 'Status', 'Documents')
+# Column widths in the spirit of audit (1).xlsx: narrow Sr. No., wide wrapped list last
+COLUMN_WIDTHS = {'A': 9.5, 'B': 30, 'C': 30, 'D': 12, 'E': 16, 'F': 10, 'G': 80}
+
+# Every document slot of the run, archived quarters included, one (plaza, scope, month)
+# group after another with documents in the scope's order. Slots without an upload are
+# listed as not uploaded.
+RUN_DOCUMENTS_SQL = """
+    SELECT p.name, s.scope_name, dm.period, im.req_id, im.done,
+           dm.id, dm.document_type, dm.object_key, dm.modified_time, dm.is_rejected, dm.reason
+    FROM idr_master im
+    JOIN (
+        SELECT id, req_id, document_type, object_key, modified_time, period, is_rejected, reason
+        FROM document_master
+        UNION ALL
+        SELECT id, req_id, document_type, object_key, modified_time, period, is_rejected, reason
+        FROM document_master_archive
+    ) dm ON dm.req_id = im.req_id
+    LEFT JOIN plaza p ON p.id = im.plaza_id
+    LEFT JOIN scope s ON s.id = im.scope_id
+    WHERE im.scope_id = (SELECT min(id) FROM scope WHERE scope_name = %(scope_name)s)
+      AND im.from_date = %(from_date)s::date
+      AND im.to_date = %(to_date)s::date
+    ORDER BY p.name, im.req_id, dm.period NULLS LAST,
+             (SELECT min(sd.position) FROM scope_document sd
+              WHERE sd.scope_id = im.scope_id AND sd.document_type = dm.document_type) NULLS LAST,
+             dm.document_type, dm.id
+"""
+
+
+def safe_name(value):
+    """File name part for a plaza, document type or key; path separators and odd characters become '_'."""
+    return re.sub(r'[^A-Za-z0-9._ -]+', '_', str(value or '')).strip(' .') or '_'
+
+
+def bundle_path(plaza, period, document_id, object_key):
+    """Path of an uploaded document inside the ZIP: <plaza>/<YYYY-MM>/<id>_<file name>."""
+    month = period.strftime('%Y-%m') if period else 'no-month'
+    return f"{safe_name(plaza)}/{month}/{document_id}_{safe_name(object_key.rsplit('/', 1)[-1])}"
+
+
+def s3_client(workers):
+    """boto3 S3 client configured like config/s3.js, with one HTTP connection per worker."""
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError as e:
+        raise ImportError("boto3 is not installed. Install it using: pip install boto3") from e
+
+    endpoint = os.getenv('AWS_S3_ENDPOINT')
+    return boto3.client(
+        's3',
+        region_name=os.getenv('AWS_REGION', 'us-east-1'),
+        endpoint_url=endpoint or None,
+        config=Config(
+            max_pool_connections=workers,
+            s3={'addressing_style': 'path'} if endpoint else {},
+        ),
+    )
+
+
+def fetch_object(s3, bucket, key):
+    """Download one object into a spooled temporary file, rewound; returns (file, size)."""
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    try:
+        shutil.copyfileobj(body, spool, COPY_CHUNK_BYTES)
+        size = spool.tell()
+        spool.seek(0)
+    except Exception:
+        spool.close()
+        raise
+    finally:
+        body.close()
+    return spool, size
+
+
+def styled_row(sheet, values, **style):
+    """Write-only cells for one sheet row, each with the given font / border / alignment."""
+    from openpyxl.cell import WriteOnlyCell
+
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(sheet, value=value)
+        for name, setting in style.items():
+            setattr(cell, name, setting)
+        cells.append(cell)
+    return cells
+
+
+def document_line(document_type, path, is_rejected, reason):
+    """Bullet for one document slot, in the '• field' style of audit (1).xlsx."""
+    if path is None:
+        return f"• {document_type}: not uploaded"
+    line = f"• {document_type}: {path}"
+    if is_rejected:
+        line += f" (rejected: {reason})" if reason else " (rejected)"
+    return line
+
+
+def export_run(scope_name, from_date, to_date, output_dir='.'):
+    """
+    Write <output_dir>/audit_<scope>_<from>_<to>.xlsx and .zip for one run and return
+    a summary dict. Objects that cannot be fetched are listed in missing.csv inside the ZIP.
+    """
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Alignment, Border, Font, Side
+    except ImportError as e:
+        raise ImportError("openpyxl is not installed. Install it using: pip install openpyxl") from e
+
+    bucket = os.getenv('AWS_S3_BUCKET_NAME')
+    if not bucket:
+        raise ValueError("AWS_S3_BUCKET_NAME is not set")
+    workers = max(1, int(os.getenv('AUDIT_EXPORT_WORKERS', '8')))
+    # Fetched objects waiting to be written; bounds both open connections and spooled files
+    window = workers * 2
+
+    base = os.path.join(output_dir, f"audit_{safe_name(scope_name)}_{from_date}_{to_date}")
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    wrap = Alignment(wrap_text=True, vertical='top')
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Audit')
+    for column, width in COLUMN_WIDTHS.items():
+        sheet.column_dimensions[column].width = width
+    sheet.append(styled_row(sheet, HEADER, font=Font(bold=True), border=border))
+
+    s3 = s3_client(workers)
+    summary = {'rows': 0, 'documents': 0, 'bytes': 0, 'missing': []}
+    started = time.perf_counter()
+
+    with zipfile.ZipFile(f"{base}.zip", 'w', allowZip64=True) as bundle, \
+            ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        def write_next():
+            path, key, modified_time, future = pending.popleft()
+            try:
+                spool, size = future.result()
+            except Exception as e:
+                summary['missing'].append((path, key, str(e)))
+                return
+            with spool:
+                info = zipfile.ZipInfo(path, date_time=(modified_time or datetime.now()).timetuple()[:6])
+                # Uploads are PDFs, images and office files, which are compressed already
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = size
+                with bundle.open(info, 'w') as target:
+                    shutil.copyfileobj(spool, target, COPY_CHUNK_BYTES)
+            summary['documents'] += 1
+            summary['bytes'] += size
+
+        with db_connection() as conn, conn.cursor(name='audit_export') as cursor:
+            cursor.itersize = CURSOR_ITERSIZE
+            cursor.execute(RUN_DOCUMENTS_SQL, {
+                'scope_name': scope_name, 'from_date': from_date, 'to_date': to_date,
+            })
+
+            for (plaza, scope, period, req_id, done), slots in groupby(cursor, key=lambda r: r[:5]):
+                lines = []
+                for *_, document_id, document_type, object_key, modified_time, is_rejected, reason in slots:
+                    path = bundle_path(plaza, period, document_id, object_key) if object_key else None
+                    lines.append(document_line(document_type, path, is_rejected, reason))
+                    if path:
+                        while len(pending) >= window:
+                            write_next()
+                        future = executor.submit(fetch_object, s3, bucket, object_key)
+                        pending.append((path, object_key, modified_time, future))
+
+                summary['rows'] += 1
+                sheet.append(styled_row(sheet, (
+                    summary['rows'], plaza, scope, period.strftime('%b %Y') if period else '',
+                    req_id, 'Done' if done else 'Pending', '\n'.join(lines),
+                ), border=border, alignment=wrap))
+
+        while pending:
+            write_next()
+
+        if summary['missing']:
+            with bundle.open('missing.csv', 'w') as target, io.TextIOWrapper(target, newline='') as text:
+                writer = csv.writer(text)
+                writer.writerow(['path', 'object_key', 'error'])
+                writer.writerows(summary['missing'])
+
+    workbook.save(f"{base}.xlsx")
+
+    print(
+        f"Exported {summary['rows']} row(s) and {summary['documents']} document(s) "
+        f"({summary['bytes'] / 1024 / 1024:.1f} MB) in {time.perf_counter() - started:.1f}s "
+        f"to {base}.xlsx / {base}.zip"
+    )
+    if summary['missing']:
+        print(f"{len(summary['missing'])} document(s) could not be fetched; see missing.csv in the ZIP")
+    return summary
+
+
+def main():
+    """Export the run named on the command line."""
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python audit_export.py <scope_name> <from_date> <to_date> [output_dir]")
+        sys.exit(1)
+
+    try:
+        export_run(*sys.argv[1:])
+    except Exception as e:
+        print(f"Error exporting audit: {e}")
+        sys.exit(1)
+    finally:
+        close_pool()
+
+
+if __name__ == '__main__':
+    main()
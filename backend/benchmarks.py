@@ -0,0 +1,691 @@
+"""
+Database benchmarks for Plaza Portal.
+Runs against the database configured in .env; every benchmark works inside a
+transaction that is rolled back, so no benchmark data is left behind. `slot-claim` needs
+its rows visible to other connections, so it commits them and deletes them when it ends.
+
+Usage: python benchmarks.py <benchmark> [args]
+
+`queries` prints a JSON results file; keep one per commit and diff two of them with
+`python benchmarks.py compare <baseline.json> <current.json> [threshold]`.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timezone
+
+from db import connection_params, db_connection
+from query_plans import HOT_QUERIES, SEED_SQL, seed_query_params
+from schema import INDEXES
+from user_import import BCRYPT_ROUNDS, USER_IMPORT_COLUMNS, hash_passwords, import_users
+
+BENCH_SCOPE = 'bench scope'
+BENCH_DOCUMENTS = [f'Document {d}' for d in range(1, 16)]
+BENCH_FROM_DATE = '2025-01-01'
+BENCH_TO_DATE = '2025-06-30'
+BENCH_DUE_DATE = '2025-07-15'
+
+
+def bench_months(from_date, to_date):
+    """Return (year, month) pairs between two ISO dates, the same way routes/idr.js used to."""
+    from_year, from_month = int(from_date[:4]), int(from_date[5:7])
+    to_year, to_month = int(to_date[:4]), int(to_date[5:7])
+
+    months = []
+    year, month = from_year, from_month
+    while (year, month) <= (to_year, to_month):
+        months.append((str(year), f'{month:02d}'))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def fanout_loop(cursor, plazas):
+    """The original POST /master path: one INSERT per plaza and one per document slot."""
+    cursor.execute("SELECT NOW() AT TIME ZONE 'Asia/Kolkata'")
+    request_datetime = cursor.fetchone()[0]
+    cursor.execute("SELECT min(id) FROM scope WHERE scope_name = %s", (BENCH_SCOPE,))
+    scope_id = cursor.fetchone()[0]
+    cursor.execute("SELECT document_type FROM scope_document WHERE scope_id = %s ORDER BY position", (scope_id,))
+    required_documents = [row[0] for row in cursor.fetchall()]
+    months = bench_months(BENCH_FROM_DATE, BENCH_TO_DATE)
+
+    for plaza_name, req_id in plazas:
+        cursor.execute("""
+            INSERT INTO idr_master (plaza_id, request_datetime, due_date, from_date, to_date, scope_id, req_id)
+            VALUES ((SELECT id FROM plaza WHERE name = %s), %s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (plaza_name, request_datetime, BENCH_DUE_DATE, BENCH_FROM_DATE, BENCH_TO_DATE, scope_id, req_id))
+        for document_type in required_documents:
+            for year, month in months:
+                cursor.execute("""
+                    INSERT INTO document_master (req_id, document_type, object_key, modified_time, period)
+                    VALUES (%s, %s, NULL, %s, make_date(%s::integer, %s::integer, 1))
+                """, (req_id, document_type, request_datetime, year, month))
+
+
+def fanout_bulk(cursor, plazas):
+    """The create_idr_run() path: the whole run in one statement."""
+    cursor.execute("""
+        SELECT count(*) FROM create_idr_run(%s::text[], %s::text[], %s, %s::date, %s::date, %s::date)
+    """, (
+        [plaza_name for plaza_name, _ in plazas],
+        [req_id for _, req_id in plazas],
+        BENCH_SCOPE, BENCH_DUE_DATE, BENCH_FROM_DATE, BENCH_TO_DATE,
+    ))
+
+
+def bench_fanout(*sizes):
+    """Compare the per-row IDR fan-out loop with create_idr_run() at several plaza counts."""
+    sizes = [int(size) for size in sizes] or [20, 200, 2000]
+    slots_per_plaza = len(BENCH_DOCUMENTS) * len(bench_months(BENCH_FROM_DATE, BENCH_TO_DATE))
+
+    print(f"{'plazas':>8} {'slots':>9} {'loop (s)':>10} {'bulk (s)':>10} {'speedup':>8}")
+    with db_connection() as conn, conn.cursor() as cursor:
+        for size in sizes:
+            timings = {}
+            for name, fanout in (('loop', fanout_loop), ('bulk', fanout_bulk)):
+                cursor.execute("""
+                    WITH created AS (
+                        INSERT INTO scope (scope_name) VALUES (%s) RETURNING id
+                    )
+                    INSERT INTO scope_document (scope_id, position, document_type)
+                    SELECT created.id, d.position, d.document_type
+                    FROM created, unnest(%s::text[]) WITH ORDINALITY AS d(document_type, position)
+                """, (BENCH_SCOPE, BENCH_DOCUMENTS))
+                plazas = [(f'bench plaza {p}', uuid.uuid4().hex[:10].upper()) for p in range(size)]
+                cursor.execute(
+                    "INSERT INTO plaza (name) SELECT unnest(%s::text[]) ON CONFLICT (name) DO NOTHING",
+                    ([plaza_name for plaza_name, _ in plazas],),
+                )
+
+                started = time.perf_counter()
+                fanout(cursor, plazas)
+                timings[name] = time.perf_counter() - started
+                conn.rollback()
+
+            print(
+                f"{size:>8} {size * slots_per_plaza:>9} {timings['loop']:>10.3f} "
+                f"{timings['bulk']:>10.3f} {timings['loop'] / timings['bulk']:>7.1f}x"
+            )
+
+
+def bench_user_import(rows=50000):
+    """Generate an upload_excel.xlsx-style sheet and time a dry-run import of it."""
+    from openpyxl import Workbook
+
+    rows = int(rows)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([header.title() for header in USER_IMPORT_COLUMNS])
+    run_id = uuid.uuid4().hex[:8]
+    for i in range(rows):
+        # Every 100th row is invalid and every 250th repeats an earlier email
+        email = f'bench-{run_id}-{i - 1 if i % 250 == 0 and i else i}@import.invalid'
+        sheet.append([
+            f'Bench User {i}' if i % 100 else '',
+            email,
+            'Toll Collector',
+            f'9{i:09d}',
+            f'U{i:06d}',
+            'client',
+        ])
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'users.xlsx')
+        workbook.save(path)
+
+        started = time.perf_counter()
+        result = import_users(path, dry_run=True)
+        elapsed = time.perf_counter() - started
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s), "
+          f"{result['inserted']} loaded, {len(result['errors'])} rejected, peak RSS {peak_rss_mb:.0f} MB")
+
+
+def bench_password_hashing(count=200):
+    """Time hash_passwords() for the same batch at 1, 2, 4, ... worker processes up to cpu_count."""
+    count = int(count)
+    passwords = [uuid.uuid4().hex for _ in range(count)]
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+
+    print(f"bcrypt cost {BCRYPT_ROUNDS}, {count} passwords")
+    print(f"{'workers':>8} {'time (s)':>10} {'hashes/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in worker_counts:
+        started = time.perf_counter()
+        hash_passwords(passwords, workers)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {count / elapsed:>10.1f} {baseline / elapsed:>7.1f}x")
+
+
+def median_query_time(cursor, sql, params=None, repeat=5):
+    """Median wall time of running sql and fetching every row, in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)[len(timings) // 2]
+
+
+def bench_pagination(*sizes):
+    """
+    Grow idr_master to each size (default 10k, 100k, 1M rows) and time the first
+    /submitted-requests page against the old unpaginated listing.
+    """
+    sizes = sorted(int(size) for size in sizes) or [10000, 100000, 1000000]
+    unpaginated = """
+        SELECT im.id, p.name AS plaza_name, im.request_datetime, im.due_date, im.from_date, im.to_date,
+               s.scope_name, im.req_id, CASE WHEN im.done THEN 'Done' END AS done
+        FROM idr_master im
+        LEFT JOIN plaza p ON p.id = im.plaza_id
+        LEFT JOIN scope s ON s.id = im.scope_id
+        ORDER BY im.from_date, im.to_date, im.due_date, p.name
+    """
+    scope_page = HOT_QUERIES['submitted_requests_page']
+    scope_params = {'scope_name': 'bench scope 1', 'from_date': '-infinity', 'to_date': '-infinity', 'plaza_id': 0}
+
+    print(f"{'rows':>9} {'all page (ms)':>14} {'scope page (ms)':>16} {'unpaginated (ms)':>17}")
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO plaza (name)
+            SELECT 'bench plaza ' || p FROM generate_series(0, 499) p
+            ON CONFLICT (name) DO NOTHING
+        """)
+        cursor.execute("""
+            INSERT INTO scope (scope_name)
+            SELECT 'bench scope ' || s FROM generate_series(0, 3) s
+            WHERE NOT EXISTS (SELECT 1 FROM scope WHERE scope_name = 'bench scope ' || s)
+        """)
+
+        seeded = 0
+        for size in sizes:
+            # Quarterly runs of 500 plazas over 4 scopes, appended in one statement per step
+            cursor.execute("""
+                INSERT INTO idr_master (plaza_id, request_datetime, due_date, from_date, to_date, done, scope_id, req_id)
+                SELECT p.id,
+                       NOW() AT TIME ZONE 'Asia/Kolkata',
+                       DATE '2000-01-01' + (n / 500) * 90 + 100,
+                       DATE '2000-01-01' + (n / 500) * 90,
+                       DATE '2000-01-01' + (n / 500) * 90 + 89,
+                       n %% 3 > 0,
+                       s.id,
+                       'BENCH-' || n
+                FROM generate_series(%s, %s) n
+                JOIN plaza p ON p.name = 'bench plaza ' || (n %% 500)
+                JOIN (SELECT scope_name, min(id) AS id FROM scope GROUP BY scope_name) s
+                  ON s.scope_name = 'bench scope ' || ((n / 500) %% 4)
+            """, (seeded, size - 1))
+            seeded = size
+            cursor.execute("ANALYZE idr_master")
+
+            all_page = median_query_time(cursor, HOT_QUERIES['submitted_requests_all_page'])
+            scope_page_ms = median_query_time(cursor, scope_page, scope_params)
+            full = median_query_time(cursor, unpaginated, repeat=1)
+            print(f"{size:>9} {all_page:>14.2f} {scope_page_ms:>16.2f} {full:>17.0f}")
+
+        conn.rollback()
+
+
+# Read-only route queries replayed by bench_queries() on top of HOT_QUERIES, copied from
+# routes/idr.js and routes/users.js with $n placeholders turned into named parameters
+ROUTE_QUERIES = {
+    **HOT_QUERIES,
+    'unique_scopes': """
+        SELECT DISTINCT s.scope_name
+        FROM scope s
+        WHERE s.scope_name IS NOT NULL
+          AND EXISTS (SELECT 1 FROM idr_master im WHERE im.scope_id = s.id)
+        ORDER BY s.scope_name
+    """,
+    'request_documents': """
+        SELECT id, req_id, document_type, object_key, modified_time,
+               to_char(period, 'YYYY') AS year, to_char(period, 'MM') AS month, is_rejected, reason
+        FROM document_master
+        WHERE req_id = %(req_id)s
+        ORDER BY period, document_type
+    """,
+    'dashboard_statistics': """
+        SELECT COALESCE(p.name, '') AS plaza_name, COALESCE(s.scope_name, '') AS scope_name,
+               COALESCE(to_char(ds.period, 'YYYY'), '') AS year, COALESCE(to_char(ds.period, 'MM'), '') AS month,
+               ds.total_slots, ds.filled_slots, ds.rejected_slots,
+               ROUND(100.0 * ds.filled_slots / NULLIF(ds.total_slots, 0), 2) as completion_rate,
+               ROUND(100.0 * ds.rejected_slots / NULLIF(ds.filled_slots, 0), 2) as rejection_rate
+        FROM dashboard_stats ds
+        LEFT JOIN plaza p ON p.id = ds.plaza_id
+        LEFT JOIN scope s ON s.id = ds.scope_id
+        WHERE (%(plaza_name)s::text IS NULL OR ds.plaza_id = (SELECT id FROM plaza WHERE name = %(plaza_name)s))
+          AND (%(no_filter)s::text IS NULL OR ds.scope_id = (SELECT min(id) FROM scope WHERE scope_name = %(no_filter)s))
+          AND (%(no_filter)s::text IS NULL OR to_char(ds.period, 'YYYY') = %(no_filter)s)
+          AND (%(no_filter)s::text IS NULL OR to_char(ds.period, 'MM') = %(no_filter)s)
+        ORDER BY 1, 2, ds.period
+    """,
+    'user_plazas': """
+        SELECT p.name
+        FROM plaza p
+        WHERE EXISTS (SELECT 1 FROM users u WHERE u.plaza_id = p.id)
+        ORDER BY p.name
+    """,
+    'plaza_assignments': """
+        SELECT p.name AS plaza_name, u.email_id, u.created_at
+        FROM users u
+        JOIN plaza p ON p.id = u.plaza_id
+        ORDER BY u.created_at ASC
+    """,
+    'unassigned_clients': """
+        SELECT id, email_id, name FROM users
+        WHERE LOWER(role) = LOWER('client') AND plaza_id IS NULL
+        ORDER BY email_id
+    """,
+}
+
+SCAN_NODES = {'Seq Scan', 'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+
+
+def percentile(timings, pct):
+    """Nearest-rank percentile of a sorted list."""
+    rank = max(1, -(-len(timings) * pct // 100))
+    return timings[int(rank) - 1]
+
+
+def plan_scan_stats(plan):
+    """Rows read by the scan nodes of an EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) plan, and the scan types used."""
+    rows_scanned, scans = 0, set()
+    if plan.get('Node Type') in SCAN_NODES:
+        loops = plan.get('Actual Loops', 1)
+        rows_scanned += (plan.get('Actual Rows', 0) + plan.get('Rows Removed by Filter', 0)) * loops
+        scans.add(f"{plan['Node Type']} on {plan.get('Relation Name')}")
+    for child in plan.get('Plans', []):
+        child_rows, child_scans = plan_scan_stats(child)
+        rows_scanned += child_rows
+        scans |= child_scans
+    return rows_scanned, scans
+
+
+def git_commit():
+    """The checked-out commit, so results files can be compared across commits."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_queries(plazas=500, runs=8, documents=15, repeat=50):
+    """
+    Seed SEED_SQL volumes (plazas x quarterly runs x documents x 6 months), replay every
+    ROUTE_QUERIES entry `repeat` times and print one JSON document with p50/p95/p99
+    latency (ms), rows returned, rows read by scans and shared buffers per query.
+    """
+    plazas, runs, documents, repeat = int(plazas), int(runs), int(documents), int(repeat)
+
+    with db_connection() as conn, conn.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute(SEED_SQL, {'plazas': plazas, 'runs': runs, 'documents': documents})
+        seed_seconds = time.perf_counter() - started
+        params = {**seed_query_params(cursor), 'no_filter': None}
+
+        cursor.execute("""
+            SELECT (SELECT count(*) FROM idr_master), (SELECT count(*) FROM document_master), (SELECT count(*) FROM users)
+        """)
+        idr_rows, document_rows, user_rows = cursor.fetchone()
+
+        queries = {}
+        for name, sql in ROUTE_QUERIES.items():
+            # Savepoints keep the statements that write (upload_completion_check) from piling up
+            cursor.execute('SAVEPOINT bench_query')
+            cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+            explained = cursor.fetchone()[0][0]
+            cursor.execute('ROLLBACK TO SAVEPOINT bench_query')
+            rows_scanned, scans = plan_scan_stats(explained['Plan'])
+
+            timings = []
+            for _ in range(repeat):
+                query_started = time.perf_counter()
+                cursor.execute(sql, params)
+                rows = cursor.rowcount
+                if cursor.description:
+                    cursor.fetchall()
+                timings.append((time.perf_counter() - query_started) * 1000)
+                cursor.execute('ROLLBACK TO SAVEPOINT bench_query')
+            timings.sort()
+
+            queries[name] = {
+                'p50_ms': round(percentile(timings, 50), 3),
+                'p95_ms': round(percentile(timings, 95), 3),
+                'p99_ms': round(percentile(timings, 99), 3),
+                'rows': rows,
+                'rows_scanned': int(rows_scanned),
+                'shared_buffers': explained['Plan'].get('Shared Hit Blocks', 0) + explained['Plan'].get('Shared Read Blocks', 0),
+                'scans': sorted(scans),
+            }
+
+        conn.rollback()
+
+    print(json.dumps({
+        'benchmark': 'queries',
+        'commit': git_commit(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'dataset': {
+            'plazas': plazas, 'runs': runs, 'documents': documents, 'repeat': repeat,
+            'idr_master': idr_rows, 'document_master': document_rows, 'users': user_rows,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'queries': queries,
+    }, indent=2))
+
+
+def bench_compare(baseline, current, threshold=1.25):
+    """
+    Compare two bench_queries() JSON files and flag every query whose p95 latency or rows
+    scanned grew by more than `threshold` times. Returns False if any did.
+    """
+    threshold = float(threshold)
+    with open(baseline) as f:
+        before = json.load(f)
+    with open(current) as f:
+        after = json.load(f)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'query':<30} {'p95 before':>11} {'p95 after':>10} {'scanned before':>15} {'scanned after':>14}")
+    regressions = []
+    for name, result in after['queries'].items():
+        previous = before['queries'].get(name)
+        if previous is None:
+            print(f"{name:<30} {'-':>11} {result['p95_ms']:>10.2f} {'-':>15} {result['rows_scanned']:>14}")
+            continue
+        # A 0.1 ms floor keeps sub-millisecond jitter from counting as a regression
+        slower = result['p95_ms'] > max(previous['p95_ms'], 0.1) * threshold
+        wider = result['rows_scanned'] > max(previous['rows_scanned'], 1) * threshold
+        if slower or wider:
+            regressions.append(name)
+        print(
+            f"{name:<30} {previous['p95_ms']:>11.2f} {result['p95_ms']:>10.2f} "
+            f"{previous['rows_scanned']:>15} {result['rows_scanned']:>14}{'  REGRESSION' if slower or wider else ''}"
+        )
+
+    if regressions:
+        print(f"{len(regressions)} quer{'y' if len(regressions) == 1 else 'ies'} regressed beyond {threshold}x.")
+        return False
+    print(f"No regressions beyond {threshold}x.")
+    return True
+
+
+# document_master and idr_master as stored before schema version 12 (text periods, full S3
+# URLs, text status flags): table -> (SELECT over the current table, index specs or None for
+# the current INDEXES). bench_storage() rebuilds the same rows in both layouts.
+LEGACY_STORAGE = {
+    'document_master': (
+        """
+            SELECT id, req_id, document_type,
+                   (%(url_prefix)s || object_key)::varchar(255) AS document_url,
+                   modified_time,
+                   to_char(period, 'YYYY')::varchar(255) AS year,
+                   to_char(period, 'MM')::varchar(255) AS month,
+                   is_rejected, reason
+            FROM document_master
+        """,
+        [
+            '(id)',
+            '(req_id, document_type, year, month)',
+            '(req_id, year, month, document_type, modified_time) WHERE document_url IS NOT NULL',
+            '(document_url) WHERE document_url IS NOT NULL',
+        ],
+    ),
+    'idr_master': (
+        """
+            SELECT id, plaza_id, request_datetime, due_date, from_date, to_date,
+                   (CASE WHEN done THEN 'Done' END)::varchar(50) AS done,
+                   (CASE WHEN email_sent THEN 'sent' END)::varchar(50) AS email_sent,
+                   scope_id, reminder_email_datetime, req_id
+            FROM idr_master
+        """,
+        None,
+    ),
+}
+
+
+def bench_storage(plazas=500, runs=8):
+    """
+    Seed SEED_SQL volumes and report heap and index sizes of document_master and idr_master
+    in the legacy layout (LEGACY_STORAGE) and the current one. Both are rebuilt from the same
+    rows into fresh unpartitioned tables, so neither side carries bloat or partition overhead.
+    """
+    bucket = os.getenv('AWS_S3_BUCKET_NAME', 'plaza-portal-documents')
+    url_prefix = f"https://{bucket}.s3.{os.getenv('AWS_REGION', 'us-east-1')}.amazonaws.com/"
+    mb = 1024 * 1024
+
+    print(f"{'table':<16} {'layout':<8} {'rows':>9} {'heap (MB)':>10} {'indexes (MB)':>13} {'total (MB)':>11}")
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(SEED_SQL, {'plazas': int(plazas), 'runs': int(runs), 'documents': 15})
+
+        for table, (legacy_select, legacy_indexes) in LEGACY_STORAGE.items():
+            current_indexes = [spec for _, indexed, spec, _ in INDEXES if indexed == table]
+            totals = {}
+            for layout, select, indexes in (
+                ('legacy', legacy_select, legacy_indexes or current_indexes),
+                ('compact', f'SELECT * FROM {table}', current_indexes),
+            ):
+                copy = f'{layout}_{table}'
+                cursor.execute(f'CREATE TEMP TABLE {copy} AS {select}', {'url_prefix': url_prefix})
+                rows = cursor.rowcount
+                for spec in indexes:
+                    cursor.execute(f'CREATE INDEX ON {copy} {spec}')
+                cursor.execute('SELECT pg_table_size(%s::regclass), pg_indexes_size(%s::regclass)', (copy, copy))
+                heap, index = cursor.fetchone()
+                totals[layout] = heap + index
+                print(f"{table:<16} {layout:<8} {rows:>9} {heap / mb:>10.1f} {index / mb:>13.1f} {(heap + index) / mb:>11.1f}")
+            print(f"{table:<16} saved {100 * (1 - totals['compact'] / totals['legacy']):.0f}%")
+
+        conn.rollback()
+
+
+SLOT_CLAIM_PLAZA = 'bench slot plaza'
+SLOT_CLAIM_PERIOD = date(2025, 1, 1)
+SLOT_CLAIM_KEY_PREFIX = 'bench/slot-claim/'
+
+
+def upload_round_trips(cursor, req_id, document_type, period, object_key):
+    """The original POST /upload-document path: five statements, each its own round trip."""
+    cursor.execute("SELECT NOW() AT TIME ZONE 'Asia/Kolkata'")
+    modified_time = cursor.fetchone()[0]
+    slot = (req_id, document_type, period)
+    cursor.execute("""
+        SELECT id FROM document_master
+        WHERE req_id = %s AND document_type = %s AND period = %s AND object_key IS NOT NULL
+        LIMIT 1
+    """, slot)
+    empty = None
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            SELECT id FROM document_master
+            WHERE req_id = %s AND document_type = %s AND period = %s AND object_key IS NULL
+            LIMIT 1
+        """, slot)
+        empty = cursor.fetchone()
+    if empty:
+        cursor.execute("""
+            UPDATE document_master SET object_key = %s, modified_time = %s
+            WHERE id = %s AND period = %s
+        """, (object_key, modified_time, empty[0], period))
+    else:
+        cursor.execute("""
+            INSERT INTO document_master (req_id, document_type, object_key, modified_time, period)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (*slot[:2], object_key, modified_time, period))
+    cursor.execute("""
+        UPDATE idr_master im
+        SET done = TRUE
+        FROM request_progress rp
+        WHERE im.req_id = %s
+        AND rp.req_id = im.req_id
+        AND rp.total_slots > 0
+        AND rp.filled_slots = rp.total_slots
+        AND rp.rejected_slots = 0
+    """, (req_id,))
+
+
+def upload_claim(cursor, req_id, document_type, period, object_key):
+    """The claim_document_slot() path: one statement."""
+    cursor.execute(
+        "SELECT id FROM claim_document_slot(%s, %s, %s, %s)",
+        (req_id, document_type, period, object_key),
+    )
+
+
+def bench_slot_claim(clients=16, rounds=50):
+    """
+    Hammer one document slot from `clients` connections at once, `rounds` times, with the
+    original upload statements and with claim_document_slot(). Every round starts from one
+    empty slot; afterwards each upload must be stored exactly once and the request done.
+    A first warm-up round, neither timed nor scored, opens the connections as a pool would.
+    Prints lost uploads, unfinished requests and p50/p95/p99 upload latency (ms) per path.
+    The original statements are expected to lose uploads; the run fails (exit status 1)
+    if claim_document_slot() loses any or leaves a round's request not done.
+    """
+    import psycopg2
+
+    clients, rounds = int(clients), int(rounds)
+    req_id = uuid.uuid4().hex[:10].upper()
+    document_type = BENCH_DOCUMENTS[0]
+
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            WITH created AS (
+                INSERT INTO scope (scope_name) VALUES (%s) RETURNING id
+            )
+            INSERT INTO scope_document (scope_id, position, document_type)
+            SELECT id, 1, %s FROM created
+        """, (BENCH_SCOPE, document_type))
+        cursor.execute("INSERT INTO plaza (name) VALUES (%s) ON CONFLICT (name) DO NOTHING", (SLOT_CLAIM_PLAZA,))
+        cursor.execute("""
+            SELECT id FROM create_idr_run(ARRAY[%s], ARRAY[%s], %s, %s::date, %s::date, %s::date)
+        """, (SLOT_CLAIM_PLAZA, req_id, BENCH_SCOPE, BENCH_DUE_DATE, SLOT_CLAIM_PERIOD, SLOT_CLAIM_PERIOD))
+        idr_master_id = cursor.fetchone()[0]
+        # Keep the request emails of the benchmark run out of the outbox workers' way
+        cursor.execute("DELETE FROM email_outbox WHERE idr_master_id = %s", (idr_master_id,))
+        conn.commit()
+
+        try:
+            print(f"{clients} clients x {rounds} rounds on one slot")
+            print(f"{'path':<12} {'uploads':>8} {'lost':>6} {'not done':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+            for name, upload in (('round-trips', upload_round_trips), ('claim', upload_claim)):
+                timings, errors = [], []
+                result = {'lost': 0, 'not_done': 0, 'round': 0}
+
+                def check_and_reset():
+                    """Barrier action: score the round just finished, then empty the slot again."""
+                    if result['round'] > 1:
+                        cursor.execute("""
+                            SELECT count(DISTINCT dm.object_key), bool_and(im.done)
+                            FROM idr_master im
+                            JOIN document_master dm ON dm.req_id = im.req_id
+                            WHERE im.req_id = %s AND dm.object_key LIKE %s
+                        """, (req_id, f"{SLOT_CLAIM_KEY_PREFIX}{name}/{result['round']}/%"))
+                        stored, done = cursor.fetchone()
+                        result['lost'] += clients - stored
+                        result['not_done'] += 0 if done else 1
+                    result['round'] += 1
+                    cursor.execute("DELETE FROM document_master WHERE req_id = %s", (req_id,))
+                    cursor.execute("""
+                        INSERT INTO document_master (req_id, document_type, period) VALUES (%s, %s, %s)
+                    """, (req_id, document_type, SLOT_CLAIM_PERIOD))
+                    cursor.execute("UPDATE idr_master SET done = FALSE WHERE req_id = %s", (req_id,))
+                    conn.commit()
+
+                barrier = threading.Barrier(clients, action=check_and_reset)
+
+                def client(number):
+                    worker = psycopg2.connect(**connection_params())
+                    worker.autocommit = True
+                    try:
+                        with worker.cursor() as worker_cursor:
+                            for round_number in range(rounds + 1):
+                                barrier.wait()
+                                key = f"{SLOT_CLAIM_KEY_PREFIX}{name}/{result['round']}/{number}"
+                                started = time.perf_counter()
+                                upload(worker_cursor, req_id, document_type, SLOT_CLAIM_PERIOD, key)
+                                if round_number:
+                                    timings.append((time.perf_counter() - started) * 1000)
+                            barrier.wait()
+                    except Exception as e:
+                        errors.append(e)
+                        barrier.abort()
+                    finally:
+                        worker.close()
+
+                threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                if errors:
+                    raise errors[0]
+
+                timings.sort()
+                print(
+                    f"{name:<12} {len(timings):>8} {result['lost']:>6} {result['not_done']:>9} "
+                    f"{percentile(timings, 50):>9.2f} {percentile(timings, 95):>9.2f} {percentile(timings, 99):>9.2f}"
+                )
+                if name == 'claim':
+                    claim_result = result
+
+            if claim_result['lost'] or claim_result['not_done']:
+                print(
+                    f"FAIL claim: {claim_result['lost']} upload(s) lost, "
+                    f"{claim_result['not_done']} round(s) not done."
+                )
+                return False
+            return True
+        finally:
+            conn.rollback()
+            cursor.execute("DELETE FROM document_master WHERE req_id = %s", (req_id,))
+            cursor.execute("DELETE FROM request_progress WHERE req_id = %s", (req_id,))
+            cursor.execute("DELETE FROM email_outbox WHERE idr_master_id = %s", (idr_master_id,))
+            cursor.execute("DELETE FROM idr_master WHERE id = %s", (idr_master_id,))
+            cursor.execute("""
+                DELETE FROM scope_document
+                WHERE scope_id IN (SELECT id FROM scope WHERE scope_name = %s)
+            """, (BENCH_SCOPE,))
+            cursor.execute("DELETE FROM scope WHERE scope_name = %s", (BENCH_SCOPE,))
+            cursor.execute("DELETE FROM plaza WHERE name = %s", (SLOT_CLAIM_PLAZA,))
+            cursor.execute("DELETE FROM s3_purge_queue WHERE object_key LIKE %s", (f'{SLOT_CLAIM_KEY_PREFIX}%',))
+            conn.commit()
+
+
+BENCHMARKS = {
+    'fanout': bench_fanout,
+    'user-import': bench_user_import,
+    'password-hashing': bench_password_hashing,
+    'pagination': bench_pagination,
+    'storage': bench_storage,
+    'slot-claim': bench_slot_claim,
+    'queries': bench_queries,
+    'compare': bench_compare,
+}
+
+
+def main():
+    """Run the benchmark named on the command line."""
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"Usage: python benchmarks.py <{'|'.join(BENCHMARKS)}> [args]")
+        sys.exit(1)
+
+    if BENCHMARKS[sys.argv[1]](*sys.argv[2:]) is False:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
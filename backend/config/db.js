@@ -1,5 +1,7 @@
-const { Pool } = require('pg');
+const { Client, Pool } = require('pg');
 require('dotenv').config();
+const { createQueryStats } = require('../utils/queryStats');
+const { createReferenceCache } = require('../utils/referenceCache');
 
 // SSL configuration for PostgreSQL
 // For remote connections, enable SSL and allow self-signed certificates by default
@@ -9,17 +11,97 @@ const sslConfig = process.env.DB_SSL === 'true' || process.env.DB_HOST !== 'loca
     }
   : false;
 
-const pool = new Pool({
+const connectionConfig = {
   host: process.env.DB_HOST || 'localhost',
   port: process.env.DB_PORT || 5432,
   user: process.env.DB_USER || 'postgres',
   password: process.env.DB_PASSWORD || '',
   database: process.env.DB_NAME || 'plaza_web',
   ssl: sslConfig,
+};
+
+const pool = new Pool(connectionConfig);
+
+// Per-query timings, pool wait times and redacted slow-query samples, served by GET /health/db
+const queryStats = createQueryStats({
+  slowQueryMs: parseInt(process.env.DB_SLOW_QUERY_MS || '500', 10),
+  maxSlowQueries: parseInt(process.env.DB_SLOW_QUERY_SAMPLES || '50', 10),
+  maxNames: parseInt(process.env.DB_QUERY_STATS_MAX_NAMES || '500', 10),
+});
+
+// Scopes, plazas and clients read on most page loads (utils/referenceData.js). Entries are
+// dropped by NOTIFY reference_cache (see reference_cache_notify in schema.py), received on a
+// dedicated connection outside the pool; its hit/miss counters are served by GET /health/db.
+const referenceCache = createReferenceCache({
+  connect: () => new Client(connectionConfig),
+  channel: 'reference_cache',
+  maxEntries: parseInt(process.env.REFERENCE_CACHE_MAX_ENTRIES || '1000', 10),
+  retryMs: parseInt(process.env.REFERENCE_CACHE_RETRY_MS || '5000', 10),
 });
 
+const elapsedMs = (started) => Number(process.hrtime.bigint() - started) / 1e6;
+
+// Time every query of a pooled client. pool.query() goes through client.query() too,
+// so routes that use either are covered; streaming submittables are passed through.
+const instrumentClient = (client) => {
+  const query = client.query.bind(client);
+
+  client.query = (...args) => {
+    const [config] = args;
+    if (config && typeof config.submit === 'function') {
+      return query(...args);
+    }
+
+    const text = typeof config === 'string' ? config : config && config.text;
+    const params = Array.isArray(args[1]) ? args[1] : config && config.values;
+    const started = process.hrtime.bigint();
+    const record = (error) => queryStats.recordQuery(text, params, elapsedMs(started), error);
+
+    const last = args.length - 1;
+    if (typeof args[last] === 'function') {
+      const callback = args[last];
+      args[last] = (error, result) => {
+        record(error);
+        callback(error, result);
+      };
+      return query(...args);
+    }
+
+    return query(...args).then(
+      (result) => {
+        record();
+        return result;
+      },
+      (error) => {
+        record(error);
+        throw error;
+      }
+    );
+  };
+};
+
+// Measure how long callers wait for a client; pool.query() acquires through this as well
+const connect = pool.connect.bind(pool);
+pool.connect = (callback) => {
+  const started = process.hrtime.bigint();
+  const waiting = pool.waitingCount;
+
+  if (callback) {
+    return connect((error, client, release) => {
+      queryStats.recordPoolWait(elapsedMs(started), waiting);
+      callback(error, client, release);
+    });
+  }
+
+  return connect().then((client) => {
+    queryStats.recordPoolWait(elapsedMs(started), waiting);
+    return client;
+  });
+};
+
 // Set timezone to IST for all connections
 pool.on('connect', (client) => {
+  instrumentClient(client);
   client.query("SET timezone = 'Asia/Kolkata'");
 });
 
@@ -32,5 +114,5 @@ pool.query('SELECT NOW()', (err, res) => {
   }
 });
 
-module.exports = { pool };
+module.exports = { pool, queryStats, referenceCache };
 
@@ -2,6 +2,7 @@ const nodemailer = require('nodemailer');
 require('dotenv').config();  // Ensure environment variables are loaded
 
 // Create Nodemailer transporter using SMTP from environment variables
+// Pooled so batched senders reuse a few open SMTP sessions instead of one per message
 const transporter = nodemailer.createTransport({
   host: process.env.SMTP_HOST,
   port: process.env.SMTP_PORT,
@@ -10,6 +11,9 @@ const transporter = nodemailer.createTransport({
     user: process.env.SMTP_USER,
     pass: process.env.SMTP_PASS,
   },
+  pool: true,
+  maxConnections: parseInt(process.env.SMTP_MAX_CONNECTIONS || '5', 10),
+  maxMessages: parseInt(process.env.SMTP_MAX_MESSAGES || '100', 10),
 });
 
 module.exports = { transporter };
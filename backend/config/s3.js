@@ -0,0 +1,26 @@
+const { S3Client } = require('@aws-sdk/client-s3');
+require('dotenv').config();  // Ensure environment variables are loaded
+
+// Create S3 client from environment variables.
+// AWS_S3_ENDPOINT points it at an S3-compatible server (e.g. MinIO) for local runs.
+const s3Client = new S3Client({
+  region: process.env.AWS_REGION || 'us-east-1',
+  credentials: {
+    accessKeyId: process.env.AWS_ACCESS_KEY_ID,
+    secretAccessKey: process.env.AWS_SECRET_ACCESS_KEY,
+  },
+  ...(process.env.AWS_S3_ENDPOINT
+    ? { endpoint: process.env.AWS_S3_ENDPOINT, forcePathStyle: true }
+    : {}),
+});
+
+const S3_BUCKET_NAME = process.env.AWS_S3_BUCKET_NAME;
+
+// Public URL prefix of the bucket. document_master stores only object keys; routes add
+// the prefix back when they return a document_url.
+const S3_URL_PREFIX = `https://${S3_BUCKET_NAME}.s3.${process.env.AWS_REGION || 'us-east-1'}.amazonaws.com/`;
+
+// Public URL of an object key
+const s3ObjectUrl = (key) => `${S3_URL_PREFIX}${key}`;
+
+module.exports = { s3Client, S3_BUCKET_NAME, S3_URL_PREFIX, s3ObjectUrl };
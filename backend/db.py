@@ -0,0 +1,92 @@
+"""
+Database connections for the Plaza Portal Python tools.
+Connection settings come from the .env file (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD,
+DB_NAME); connections are borrowed from one process-wide pool.
+"""
+
+import os
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+class DatabaseError(Exception):
+    """Raised when the database cannot be reached or set up."""
+
+
+def connection_params(database=None):
+    """psycopg2 connection keywords from .env; the IST timezone is sent in the startup packet."""
+    return {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': os.getenv('DB_PORT', '5432'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'dbname': database or os.getenv('DB_NAME', 'plaza_web'),
+        'options': '-c timezone=Asia/Kolkata',
+    }
+
+
+_pool = None
+
+
+def get_pool():
+    """
+    Return the process-wide connection pool, creating it on first use.
+    Pool size comes from DB_POOL_MIN / DB_POOL_MAX (default 1 / 10).
+    """
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    try:
+        import psycopg2
+        from psycopg2.pool import ThreadedConnectionPool
+    except ImportError as e:
+        raise DatabaseError("psycopg2 is not installed. Install it using: pip install psycopg2-binary") from e
+
+    try:
+        _pool = ThreadedConnectionPool(
+            int(os.getenv('DB_POOL_MIN', '1')),
+            int(os.getenv('DB_POOL_MAX', '10')),
+            **connection_params(),
+        )
+    except psycopg2.Error as e:
+        raise DatabaseError(f"Error connecting to database: {e}") from e
+    return _pool
+
+
+def close_pool():
+    """Close every pooled connection; the next db_connection() opens a new pool."""
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a connection to the plaza_web database (IST timezone) from the pool.
+
+    Commit explicitly inside the block; anything left uncommitted, or an exception,
+    rolls the transaction back before the connection goes back to the pool.
+    """
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except Exception as e:
+        raise DatabaseError(f"Error connecting to database: {e}") from e
+
+    discard = False
+    try:
+        yield conn
+    finally:
+        try:
+            if not conn.closed:
+                conn.rollback()
+                conn.autocommit = False
+        except Exception:
+            # Broken connection; don't hand it out again
+            discard = True
+        pool.putconn(conn, close=discard or bool(conn.closed))
@@ -4,6 +4,12 @@ const cors = require('cors');
 require('dotenv').config();
 const { sendLoginEmail } = require('./scripts/login_email');
 const { startIdrEmailJob } = require('./scripts/idr_request_email');
+const { startIdrReminderJob } = require('./scripts/idr_reminder_email');
+const { startS3PurgeJob } = require('./scripts/s3_purge');
+const { startRejectionEmailJob } = require('./scripts/rejection_email');
+const { startPartitionJob } = require('./scripts/partition_maintenance');
+const { pool, queryStats, referenceCache } = require('./config/db');
+const { requireAuth } = require('./middleware/auth');
 
 let authRoutes;
 try {
@@ -94,6 +100,13 @@ app.use('/api/scope', scopeRoutes);
 //Background cron jobs
 sendLoginEmail();
 startIdrEmailJob();
+startIdrReminderJob();
+startS3PurgeJob();
+startRejectionEmailJob();
+startPartitionJob();
+
+// Start listening for reference data invalidations; lookups go to the database until then
+referenceCache.listen();
 
 // Health check endpoint
 app.get('/health', (req, res) => {
@@ -104,6 +117,22 @@ app.get('/health', (req, res) => {
   });
 });
 
+// Query timings, pool usage, redacted slow-query samples and reference cache hit/miss
+// counters since start (or the last reset)
+app.get('/health/db', requireAuth, (req, res) => {
+  const snapshot = queryStats.snapshot(pool);
+  const cache = referenceCache.snapshot();
+  if (req.query.reset === 'true') {
+    queryStats.reset();
+    referenceCache.reset();
+  }
+  res.json({
+    success: true,
+    ...snapshot,
+    referenceCache: cache,
+  });
+});
+
 // 404 handler
 app.use((req, res) => {
   res.status(404).json({
@@ -1,8 +1,32 @@
 const jwt = require('jsonwebtoken');
 const { decryptToken } = require('../utils/tokenEncryption');
+const { createSessionCache } = require('../utils/sessionCache');
 
 const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key-change-in-production';
 
+// Verified session tokens, so repeat requests skip decryption and jwt.verify
+const sessionCache = createSessionCache({
+  maxEntries: parseInt(process.env.SESSION_CACHE_MAX_ENTRIES || '10000', 10),
+  ttlMs: parseInt(process.env.SESSION_CACHE_TTL_MS || '60000', 10),
+});
+
+/**
+ * Decrypt and verify a sessionToken cookie, using the verified-session cache
+ * @param {string} encryptedToken - The encrypted session token
+ * @returns {object} - Decoded JWT payload (throws if invalid or expired)
+ */
+function verifySessionToken(encryptedToken) {
+  const cached = sessionCache.get(encryptedToken);
+  if (cached) {
+    return { ...cached };
+  }
+
+  const jwtToken = decryptToken(encryptedToken);
+  const decoded = jwt.verify(jwtToken, JWT_SECRET);
+  sessionCache.set(encryptedToken, decoded, decoded.exp);
+  return { ...decoded };
+}
+
 function requireAuth(req, res, next) {
   const encryptedToken = req.cookies.sessionToken;
 
@@ -14,9 +38,7 @@ function requireAuth(req, res, next) {
   }
 
   try {
-    const jwtToken = decryptToken(encryptedToken);
-    const decoded = jwt.verify(jwtToken, JWT_SECRET);
-    req.user = decoded;
+    req.user = verifySessionToken(encryptedToken);
     return next();
   } catch (error) {
     // Clear the invalid/expired cookie
@@ -34,4 +56,4 @@ function requireAuth(req, res, next) {
   }
 }
 
-module.exports = { requireAuth };
+module.exports = { requireAuth, verifySessionToken, sessionCache };
@@ -0,0 +1,511 @@
+"""
+Schema migrator for Plaza Portal.
+Diffs the live catalog against the registries in schema.py and applies the difference in
+one transactional batch, then builds indexes concurrently. Also rebuilds and verifies the
+trigger-maintained tables and maintains document_master's quarter partitions.
+"""
+
+import os
+
+from db import DatabaseError, db_connection
+from schema import (
+    SCHEMA_VERSION, TABLES, PARTITIONED_TABLES, PARTITION_QUARTERS_AHEAD,
+    TABLE_CONSTRAINTS, DATA_MIGRATIONS, ON_CREATE, DERIVED_TABLES,
+    RENAMED_COLUMNS, DROPPED_COLUMNS, LEGACY_COLUMN_MIGRATIONS, RETYPED_COLUMNS,
+    REBUILT_COLUMNS, INDEXES, DOCUMENT_CHANGES, REQUEST_PROGRESS_UPSERT,
+    REQUEST_PROGRESS_CLEANUP, DASHBOARD_STATS_UPSERT, DASHBOARD_STATS_CLEANUP, FUNCTIONS,
+    TRIGGERS,
+)
+
+
+def read_catalog(cursor):
+    """Return {table_name: {column_name: data_type}} for the managed tables in a single query."""
+    cursor.execute("""
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = 'public'
+        AND table_name = ANY(%s)
+    """, (list(TABLES),))
+
+    catalog = {}
+    for table_name, column_name, data_type in cursor.fetchall():
+        catalog.setdefault(table_name, {})[column_name] = data_type
+    return catalog
+
+
+def read_partitioned(cursor):
+    """Return {table: partition key} for the PARTITIONED_TABLES that already are partitioned tables."""
+    cursor.execute("""
+        SELECT c.relname, substring(pg_get_partkeydef(c.oid) FROM '^RANGE [(](.*)[)]$')
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind = 'p' AND c.relname = ANY(%s)
+    """, (list(PARTITIONED_TABLES),))
+    return dict(cursor.fetchall())
+
+
+def create_table_sql(table):
+    """CREATE TABLE for a TABLES entry; partitioned tables also get their default partition."""
+    column_sql = ',\n    '.join(
+        [f'{name} {definition}' for name, definition in TABLES[table]] + TABLE_CONSTRAINTS.get(table, [])
+    )
+    if table not in PARTITIONED_TABLES:
+        return f'CREATE TABLE {table} (\n    {column_sql}\n)'
+    return (
+        f'CREATE TABLE {table} (\n    {column_sql}\n) PARTITION BY RANGE ({PARTITIONED_TABLES[table]});\n'
+        f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT'
+    )
+
+
+def partition_table_sql(table, added=frozenset()):
+    """
+    Return SQL that rebuilds an existing table in its PARTITIONED_TABLES layout: a plain
+    table, or one partitioned on an older key. `added` holds the columns this migration adds
+    to it; those listed in REBUILT_COLUMNS are computed from the legacy columns as rows are copied.
+
+    The old table and its partitions are renamed aside, its rows are copied into quarter
+    partitions created for their whole date range and it is dropped, legacy columns and all,
+    in the migration transaction. Triggers and indexes are recreated on the new table by the
+    rest of the migration.
+    """
+    key = PARTITIONED_TABLES[table]
+    rebuilt = REBUILT_COLUMNS.get(table, {})
+    names = [name for name, _ in TABLES[table]]
+    columns = ', '.join(names)
+    select = ', '.join(f'{rebuilt[name]} AS {name}' if name in added and name in rebuilt else name for name in names)
+    source = f'(SELECT {select} FROM {table}_unpartitioned) AS old_rows'
+    return (
+        f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE;\n'
+        f'ALTER TABLE {table} RENAME TO {table}_unpartitioned;\n'
+        f'ALTER SEQUENCE IF EXISTS {table}_id_seq RENAME TO {table}_unpartitioned_id_seq;\n'
+        # Old partitions would keep the new quarter partitions from taking their names
+        f'DO $$\n'
+        f'DECLARE\n'
+        f'    part TEXT;\n'
+        f'BEGIN\n'
+        f"    FOR part IN SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = '{table}_unpartitioned'::regclass LOOP\n"
+        f"        EXECUTE format('ALTER TABLE %I RENAME TO %I', part, part || '_unpartitioned');\n"
+        f'    END LOOP;\n'
+        f'END\n'
+        f'$$;\n'
+        f'{create_table_sql(table)};\n'
+        f'SELECT count(*) FROM create_quarter_partitions(\n'
+        f"    '{table}',\n"
+        f'    (SELECT min({key}) FROM {source}),\n'
+        f'    (SELECT max({key}) FROM {source})\n'
+        f');\n'
+        f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {source};\n'
+        f"SELECT setval('{table}_id_seq', COALESCE((SELECT max(id) FROM {table}), 0) + 1, false);\n"
+        # CASCADE only reaches the id defaults its old partitions took from its sequence
+        f'DROP TABLE {table}_unpartitioned CASCADE'
+    )
+
+
+def plan_migration(catalog, current_version=None, partitioned=frozenset()):
+    """
+    Diff the live catalog against TABLES and return a list of (sql, message) steps.
+    `partitioned` maps the PARTITIONED_TABLES that are already partitioned to their key (read_partitioned()).
+
+    Legacy columns are dropped and RETYPED_COLUMNS converted after every table and column
+    exists, so their LEGACY_COLUMN_MIGRATIONS can fill them in. Tables that are not yet
+    partitioned on their key are rebuilt instead, and derived tables are backfilled last.
+    """
+    steps = []
+    drops = []
+    backfills = []
+    conversions = []
+
+    for table, columns in TABLES.items():
+        live = catalog.get(table)
+
+        # Derived tables hold nothing that cannot be rebuilt, so a new layout replaces them
+        if live is not None and table in DERIVED_TABLES and set(live) != {name for name, _ in columns}:
+            steps.append((f'DROP TABLE {table}', f"Dropped '{table}' to rebuild it with its new columns."))
+            live = None
+
+        if live is None:
+            steps.append((create_table_sql(table), f"Table '{table}' created successfully!"))
+            if table in DERIVED_TABLES:
+                backfills.append((backfill_sql(table), f"Backfilled '{table}' from {DERIVED_TABLES[table][0]}."))
+            if table in ON_CREATE:
+                steps.append((ON_CREATE[table], f"Populated '{table}' from existing data."))
+            continue
+
+        types = live
+        live = set(live)
+
+        for old_name, new_name in RENAMED_COLUMNS.get(table, []):
+            if old_name in live and new_name not in live:
+                steps.append((
+                    f'ALTER TABLE {table} RENAME COLUMN {old_name} TO {new_name}',
+                    f"Renamed column '{old_name}' to '{new_name}' in {table} table.",
+                ))
+                live.discard(old_name)
+                live.add(new_name)
+
+        # Columns are added to a table that is rebuilt below as well, so routines can refer to them
+        added = {name for name, _ in columns if name not in live}
+        for name, definition in columns:
+            if name in added:
+                steps.append((
+                    f'ALTER TABLE {table} ADD COLUMN {name} {definition}',
+                    f"Added column '{name}' to {table} table.",
+                ))
+
+        if table in PARTITIONED_TABLES and partitioned.get(table) != PARTITIONED_TABLES[table]:
+            conversions.append((
+                partition_table_sql(table, added),
+                f"Partitioned {table} table by quarter of {PARTITIONED_TABLES[table]}.",
+            ))
+            continue
+
+        for name in DROPPED_COLUMNS.get(table, []):
+            if name in live:
+                if (table, name) in LEGACY_COLUMN_MIGRATIONS:
+                    drops.append((
+                        LEGACY_COLUMN_MIGRATIONS[(table, name)],
+                        f"Migrated {table}.{name} data.",
+                    ))
+                drops.append((
+                    f'ALTER TABLE {table} DROP COLUMN {name}',
+                    f"Removed column '{name}' from {table} table.",
+                ))
+
+        for (retyped_table, name), (legacy_type, sql) in RETYPED_COLUMNS.items():
+            if retyped_table == table and types.get(name) == legacy_type:
+                drops.append((sql, f"Converted column '{name}' of {table} table to its compact type."))
+
+    steps.extend(drops)
+
+    for version, sql, message in DATA_MIGRATIONS:
+        if current_version is None or current_version < version:
+            steps.append((sql, message))
+
+    # Routines are cheap to replace and may depend on the columns above, so they go last
+    for name, sql in FUNCTIONS:
+        steps.append((sql, f"Installed function '{name}'."))
+
+    # Partitioning uses create_quarter_partitions() and replaces the table the triggers below go on
+    steps.extend(conversions)
+
+    # Derived tables are rebuilt from the final source rows
+    steps.extend(backfills)
+
+    for name, table, definition in TRIGGERS:
+        steps.append((
+            f'DROP TRIGGER IF EXISTS {name} ON {table};\nCREATE TRIGGER {name} {definition}',
+            f"Installed trigger '{name}' on {table} table.",
+        ))
+
+    return steps
+
+
+def backfill_sql(table):
+    """
+    Return SQL that rebuilds a DERIVED_TABLES entry from its source table.
+
+    The source is locked against writes for the rest of the transaction so no
+    trigger-maintained change can slip in between the rebuild and the commit.
+    """
+    source, select = DERIVED_TABLES[table]
+    columns = ', '.join(name for name, _ in TABLES[table])
+    return (
+        f'LOCK TABLE {source} IN SHARE ROW EXCLUSIVE MODE;\n'
+        f'DELETE FROM {table};\n'
+        f'INSERT INTO {table} ({columns}) {select}'
+    )
+
+
+def ensure_indexes(conn):
+    """
+    Create missing INDEXES (and rebuild invalid ones) with CREATE INDEX CONCURRENTLY.
+
+    CONCURRENTLY cannot run inside a transaction block, so this switches the
+    connection to autocommit and issues one statement per index.
+    """
+    cursor = conn.cursor()
+    conn.autocommit = True
+
+    try:
+        cursor.execute("""
+            SELECT c.relname, i.indisvalid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public'
+            AND c.relname = ANY(%s)
+        """, ([index[0] for index in INDEXES],))
+        live = dict(cursor.fetchall())
+
+        for name, table, spec, unique in INDEXES:
+            if live.get(name) is True:
+                continue
+
+            if table in PARTITIONED_TABLES:
+                ensure_partitioned_index(cursor, name, table, spec, unique)
+                continue
+
+            if unique:
+                check_unique(cursor, name, table, spec)
+
+            if name in live:
+                # A previous concurrent build failed and left an INVALID index behind
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+            kind = 'UNIQUE INDEX' if unique else 'INDEX'
+            cursor.execute(f'CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} {spec}')
+            print(f"Created index '{name}' on {table} table.")
+    finally:
+        conn.autocommit = False
+        cursor.close()
+
+
+def check_unique(cursor, name, table, spec):
+    """
+    Raise DatabaseError listing the duplicate keys that would make the unique index
+    name fail to build, instead of leaving an INVALID index behind on every deploy.
+    """
+    columns = spec.strip('()')
+    cursor.execute(f"""
+        SELECT ({columns})::text, COUNT(*)
+        FROM {table}
+        WHERE ({columns}) IS NOT NULL
+        GROUP BY {columns}
+        HAVING COUNT(*) > 1
+        ORDER BY 1
+    """)
+    duplicates = cursor.fetchall()
+    if duplicates:
+        listed = ', '.join(f"{key} ({count} rows)" for key, count in duplicates[:20])
+        if len(duplicates) > 20:
+            listed += f", ... and {len(duplicates) - 20} more"
+        raise DatabaseError(
+            f"Cannot create unique index '{name}': {table} has duplicate {columns} values: {listed}. "
+            f"Resolve them and run migrate again."
+        )
+
+
+def ensure_partitioned_index(cursor, name, table, spec, unique):
+    """
+    Build an INDEXES entry on a partitioned table without blocking writes.
+
+    Partitioned tables do not support CREATE INDEX CONCURRENTLY, so the parent index is
+    created ON ONLY the parent (invalid), every partition that lacks a matching index gets
+    one built concurrently, and attaching the last of them makes the parent index valid.
+    Partitions created later inherit the index automatically.
+    """
+    kind = 'UNIQUE INDEX' if unique else 'INDEX'
+    cursor.execute(f'CREATE {kind} IF NOT EXISTS {name} ON ONLY {table} {spec}')
+
+    # Partitions with no index attached to the parent yet, and any leftover from a failed build
+    cursor.execute("""
+        SELECT c.relname, pi.relname, i.indisvalid
+        FROM pg_inherits inh
+        JOIN pg_class c ON c.oid = inh.inhrelid
+        LEFT JOIN pg_class pi ON pi.relname = %s || substr(c.relname, length(%s) + 1)
+            AND pi.relnamespace = c.relnamespace
+        LEFT JOIN pg_index i ON i.indexrelid = pi.oid
+        WHERE inh.inhparent = %s::regclass
+        AND NOT EXISTS (
+            SELECT 1
+            FROM pg_inherits attached
+            JOIN pg_index pidx ON pidx.indexrelid = attached.inhrelid
+            WHERE attached.inhparent = %s::regclass AND pidx.indrelid = c.oid
+        )
+        ORDER BY c.relname
+    """, (name, table, table, name))
+
+    for partition, partition_index, valid in cursor.fetchall():
+        # idx_document_master_slot on document_master_fy2025_q1 -> idx_document_master_slot_fy2025_q1
+        partition_index = partition_index or name + partition[len(table):]
+        if valid is False:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {partition_index}')
+        cursor.execute(f'CREATE {kind} CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} {spec}')
+        cursor.execute(f'ALTER INDEX {name} ATTACH PARTITION {partition_index}')
+
+    print(f"Created index '{name}' on {table} table.")
+
+
+def ensure_partitions(cursor, quarters_ahead=PARTITION_QUARTERS_AHEAD):
+    """Create the upcoming document_master quarter partitions (see ensure_quarter_partitions()) and commit."""
+    cursor.execute("SELECT ensure_quarter_partitions('document_master', %s)", (int(quarters_ahead),))
+    created = [name for name, in cursor.fetchall()]
+    cursor.connection.commit()
+    for name in created:
+        print(f"Created partition '{name}'.")
+    return created
+
+
+def get_schema_version(cursor):
+    """Return the applied schema version, or None if the version table does not exist yet."""
+    from psycopg2 import errors
+
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except errors.UndefinedTable:
+        cursor.connection.rollback()
+        return None
+    return cursor.fetchone()[0]
+
+
+def migrate():
+    """
+    Bring the database schema in line with TABLES.
+
+    Up-to-date databases return after a single schema_version lookup. Otherwise the
+    live catalog is read in one query, the whole table diff is applied as one
+    transactional batch, INDEXES are built concurrently and the new version is recorded.
+    """
+    with db_connection() as conn, conn.cursor() as cursor:
+        current_version = get_schema_version(cursor)
+        if current_version is not None and current_version >= SCHEMA_VERSION:
+            print(f"Schema is up to date (version {current_version}).")
+            return
+
+        # Serialize concurrent deploys; the lock is released on commit/rollback
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('plaza_web.migrate'))")
+
+        catalog = read_catalog(cursor)
+        steps = plan_migration(catalog, current_version, read_partitioned(cursor))
+
+        batch = [sql for sql, _ in steps]
+        batch.append("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER NOT NULL,
+                applied_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')
+            )
+        """)
+
+        # psycopg2 sends the joined statements in a single round trip
+        cursor.execute(';\n'.join(batch))
+        conn.commit()
+
+        for _, message in steps:
+            print(message)
+
+        ensure_partitions(cursor)
+
+        # Indexes are built after the table changes are committed, and the version is
+        # only recorded once they all exist so a failed build is retried on the next run
+        ensure_indexes(conn)
+
+        cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+        conn.commit()
+        print(f"Schema migrated to version {SCHEMA_VERSION} ({len(steps)} change(s)).")
+
+
+def backfill_derived(*tables):
+    """Rebuild derived tables (default: all DERIVED_TABLES) from their source rows."""
+    tables = tables or tuple(DERIVED_TABLES)
+    with db_connection() as conn, conn.cursor() as cursor:
+        for table in tables:
+            if table not in DERIVED_TABLES:
+                raise ValueError(f"'{table}' is not a derived table")
+            cursor.execute(backfill_sql(table))
+            print(f"Backfilled '{table}' with {cursor.rowcount} row(s).")
+        conn.commit()
+
+
+def verify_derived(*tables):
+    """
+    Compare derived tables (default: all DERIVED_TABLES) with a fresh aggregate of
+    their source rows. Returns True if every row matches.
+    """
+    tables = tables or tuple(DERIVED_TABLES)
+    mismatches = 0
+
+    with db_connection() as conn, conn.cursor() as cursor:
+        # One snapshot for both sides of every comparison
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        for table in tables:
+            if table not in DERIVED_TABLES:
+                raise ValueError(f"'{table}' is not a derived table")
+            _, select = DERIVED_TABLES[table]
+            columns = ', '.join(name for name, _ in TABLES[table])
+            cursor.execute(f"""
+                (SELECT 'missing or stale' AS problem, * FROM ({select}) AS expected
+                 EXCEPT SELECT 'missing or stale', {columns} FROM {table})
+                UNION ALL
+                (SELECT 'unexpected', {columns} FROM {table}
+                 EXCEPT SELECT 'unexpected', * FROM ({select}) AS expected)
+            """)
+            rows = cursor.fetchall()
+            for problem, *values in rows[:20]:
+                print(f"{table}: {problem} row {tuple(values)}")
+            if len(rows) > 20:
+                print(f"{table}: ... and {len(rows) - 20} more")
+            print(f"{table}: {'OK' if not rows else f'{len(rows)} mismatched row(s)'}")
+            mismatches += len(rows)
+        conn.rollback()
+
+    return mismatches == 0
+
+
+def create_partitions(quarters_ahead=PARTITION_QUARTERS_AHEAD):
+    """Create document_master quarter partitions up to quarters_ahead quarters past the current one."""
+    with db_connection() as conn, conn.cursor() as cursor:
+        created = ensure_partitions(cursor, quarters_ahead)
+    if not created:
+        print("All quarter partitions are in place.")
+
+
+def archive_partitions(keep_quarters=8):
+    """
+    Move document_master quarter partitions that ended more than keep_quarters quarters ago
+    to document_master_archive, one transaction per quarter. Quarters that still hold
+    documents of open requests are skipped.
+
+    The archived rows are taken out of request_progress and dashboard_stats the same way
+    the counter triggers handle a DELETE, and the partition moves to ARCHIVE_TABLESPACE
+    when that is set. Archived documents stay in the archive table and their S3 objects
+    are kept, but the routes only read document_master, and archived quarters take no
+    new rows (see archived_quarters()).
+    """
+    keep_quarters = int(keep_quarters)
+    tablespace = os.getenv('ARCHIVE_TABLESPACE')
+    archived = 0
+
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, bound[1]::date, bound[2]::date
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid,
+                 regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM [(]''([^'']+)''[)] TO [(]''([^'']+)''[)]') AS bound
+            WHERE i.inhparent = 'document_master'::regclass
+            AND bound[2]::date <= date_trunc('quarter', NOW() AT TIME ZONE 'Asia/Kolkata')
+                                  - make_interval(months => 3 * %s)
+            ORDER BY 2
+        """, (keep_quarters,))
+        partitions = cursor.fetchall()
+
+        for partition, quarter_start, quarter_end in partitions:
+            cursor.execute(f"""
+                SELECT COUNT(DISTINCT im.req_id)
+                FROM {partition} dm
+                JOIN idr_master im ON im.req_id = dm.req_id
+                WHERE NOT im.done
+            """)
+            open_requests = cursor.fetchone()[0]
+            if open_requests:
+                print(f"Skipping '{partition}': {open_requests} open request(s).")
+                conn.rollback()
+                continue
+
+            cursor.execute(f"""
+                ALTER TABLE document_master DETACH PARTITION {partition};
+                ALTER TABLE document_master_archive ATTACH PARTITION {partition}
+                    FOR VALUES FROM ('{quarter_start}') TO ('{quarter_end}');
+                CREATE TEMP TABLE old_rows ON COMMIT DROP AS SELECT * FROM {partition};
+                {REQUEST_PROGRESS_UPSERT.format(changes=DOCUMENT_CHANGES['DELETE'])}{REQUEST_PROGRESS_CLEANUP}
+                {DASHBOARD_STATS_UPSERT.format(changes=DOCUMENT_CHANGES['DELETE'])}{DASHBOARD_STATS_CLEANUP}
+            """)
+            if tablespace:
+                cursor.execute(f"ALTER TABLE {partition} SET TABLESPACE {tablespace}")
+                cursor.execute("SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass", (partition,))
+                for index, in cursor.fetchall():
+                    cursor.execute(f"ALTER INDEX {index} SET TABLESPACE {tablespace}")
+            conn.commit()
+            archived += 1
+            print(f"Archived '{partition}' ({quarter_start} to {quarter_end}).")
+
+    print(f"Archived {archived} of {len(partitions)} closed quarter(s).")
@@ -0,0 +1,317 @@
+"""
+Query plan check for Plaza Portal.
+HOT_QUERIES are the route queries that must stay index-backed; SEED_SQL generates the
+synthetic dataset they are planned against (also used by benchmarks.py).
+"""
+
+from db import db_connection
+from schema import PARTITIONED_TABLES, TABLES
+
+
+# Route queries from routes/idr.js and scripts/idr_request_email.js that must be index-backed.
+# Parameters are filled from the seeded dataset in check_query_plans().
+HOT_QUERIES = {
+    # claim_document_slot() statements
+    'upload_completion_check': """
+        UPDATE idr_master im
+        SET done = TRUE
+        FROM request_progress rp
+        WHERE im.req_id = %(req_id)s
+        AND NOT im.done
+        AND rp.req_id = im.req_id
+        AND rp.total_slots > 0
+        AND rp.filled_slots = rp.total_slots
+        AND rp.rejected_slots = 0
+    """,
+    'upload_empty_slot': """
+        SELECT id, period FROM document_master
+        WHERE req_id = %(req_id)s AND document_type = %(document_type)s
+        AND period = make_date(%(year)s::integer, %(month)s::integer, 1) AND object_key IS NULL
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    """,
+    'idr_by_req_id': """
+        SELECT p.name AS plaza_name, s.scope_name
+        FROM idr_master im
+        LEFT JOIN plaza p ON p.id = im.plaza_id
+        LEFT JOIN scope s ON s.id = im.scope_id
+        WHERE im.req_id = %(req_id)s
+        LIMIT 1
+    """,
+    'plaza_documents': """
+        SELECT id, req_id, document_type, object_key, modified_time,
+               to_char(period, 'YYYY') AS year, to_char(period, 'MM') AS month, is_rejected, reason
+        FROM document_master
+        WHERE req_id = %(req_id)s AND period = make_date(%(year)s::integer, %(month)s::integer, 1)
+        AND object_key IS NOT NULL
+        ORDER BY document_type, modified_time
+    """,
+    'request_overview': """
+        SELECT im.id, p.name AS plaza_name, im.req_id, CASE WHEN im.done THEN 'Done' END AS done,
+               COALESCE(cells.cells, '[]') AS cells,
+               format('%%s:%%s:%%s:%%s:%%s', im.id, im.xmin,
+                      (SELECT rp.xmin FROM request_progress rp WHERE rp.req_id = im.req_id),
+                      p.name, s.scope_name) AS revision
+        FROM idr_master im
+        LEFT JOIN plaza p ON p.id = im.plaza_id
+        LEFT JOIN scope s ON s.id = im.scope_id
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object(
+                'year', to_char(c.period, 'YYYY'), 'month', to_char(c.period, 'MM'),
+                'total_slots', c.total_slots, 'filled_slots', c.filled_slots, 'rejected_slots', c.rejected_slots
+            ) ORDER BY c.period) AS cells
+            FROM (
+                SELECT dm.period, COUNT(*) AS total_slots, COUNT(dm.object_key) AS filled_slots,
+                       COUNT(*) FILTER (WHERE dm.is_rejected) AS rejected_slots
+                FROM document_master dm
+                WHERE dm.req_id = im.req_id
+                AND dm.period BETWEEN date_trunc('month', im.from_date)::date AND im.to_date
+                GROUP BY dm.period
+            ) c
+        ) cells ON TRUE
+        WHERE COALESCE(im.from_date, 'infinity'::date) = %(from_date)s::DATE
+        AND COALESCE(im.to_date, 'infinity'::date) = %(to_date)s::DATE
+        AND im.scope_id = (SELECT min(id) FROM scope WHERE scope_name = %(scope_name)s)
+        ORDER BY COALESCE(im.from_date, 'infinity'::date), COALESCE(im.to_date, 'infinity'::date),
+                 COALESCE(im.due_date, 'infinity'::date), COALESCE(im.plaza_id, 0), im.id
+    """,
+    'cell_documents': """
+        SELECT dm.id, dm.req_id, dm.document_type, dm.object_key, dm.modified_time,
+               to_char(dm.period, 'YYYY') AS year, to_char(dm.period, 'MM') AS month, dm.is_rejected, dm.reason
+        FROM (
+            SELECT DISTINCT req_id, make_date(year::integer, month::integer, 1) AS cell_period
+            FROM unnest(%(req_ids)s::text[], array_fill(%(year)s::integer, ARRAY[20]),
+                        array_fill(%(month)s::integer, ARRAY[20])) AS c(req_id, year, month)
+        ) c
+        JOIN document_master dm ON dm.req_id = c.req_id AND dm.period = c.cell_period
+        WHERE dm.object_key IS NOT NULL
+        ORDER BY dm.req_id, dm.period, dm.document_type, dm.modified_time
+    """,
+    # im.req_id = ANY(...) repeats the join condition as a planner hint (see /document-counts)
+    'document_counts': """
+        SELECT dm.req_id, p.name AS plaza_name,
+               to_char(dm.period, 'YYYY') AS year, to_char(dm.period, 'MM') AS month, COUNT(*) as document_count
+        FROM document_master dm
+        INNER JOIN idr_master im ON dm.req_id = im.req_id
+        LEFT JOIN plaza p ON p.id = im.plaza_id
+        WHERE dm.req_id = ANY(%(req_ids)s::text[]) AND im.req_id = ANY(%(req_ids)s::text[])
+        AND dm.object_key IS NOT NULL
+        GROUP BY dm.req_id, p.name, dm.period
+    """,
+    'client_requests': """
+        SELECT im.id, p.name AS plaza_name, im.request_datetime, im.due_date, im.from_date, im.to_date,
+               s.scope_name, im.req_id, CASE WHEN im.done THEN 'Done' END AS done
+        FROM idr_master im
+        JOIN plaza p ON p.id = im.plaza_id
+        LEFT JOIN scope s ON s.id = im.scope_id
+        WHERE im.plaza_id = %(plaza_id)s
+        ORDER BY im.done, im.request_datetime DESC
+    """,
+    'request_by_scope_dates': """
+        SELECT req_id FROM idr_master
+        WHERE scope_id = (SELECT min(id) FROM scope WHERE scope_name = %(scope_name)s)
+        AND from_date = %(from_date)s::DATE AND to_date = %(to_date)s::DATE
+    """,
+    'reminder_due': """
+        SELECT id, plaza_id, done FROM idr_master
+        WHERE reminder_email_datetime <= NOW() AT TIME ZONE 'Asia/Kolkata'
+        OR (reminder_email_datetime IS NULL AND plaza_id IS NOT NULL AND NOT done)
+        ORDER BY reminder_email_datetime NULLS FIRST
+        LIMIT 500
+    """,
+    'plaza_recipients': """
+        SELECT email_id FROM users WHERE plaza_id = %(plaza_id)s AND email_id IS NOT NULL
+    """,
+    'submitted_requests_page': """
+        SELECT im.id, p.name AS plaza_name, im.request_datetime, im.due_date, im.from_date, im.to_date,
+               s.scope_name, im.req_id, CASE WHEN im.done THEN 'Done' END AS done
+        FROM idr_master im
+        LEFT JOIN plaza p ON p.id = im.plaza_id
+        LEFT JOIN scope s ON s.id = im.scope_id
+        WHERE im.scope_id = (SELECT min(id) FROM scope WHERE scope_name = %(scope_name)s)
+        AND (COALESCE(im.from_date, 'infinity'::date), COALESCE(im.to_date, 'infinity'::date),
+             COALESCE(im.due_date, 'infinity'::date), COALESCE(im.plaza_id, 0), im.id)
+            > (%(from_date)s::date, %(to_date)s::date, %(from_date)s::date, %(plaza_id)s, 0)
+        ORDER BY COALESCE(im.from_date, 'infinity'::date), COALESCE(im.to_date, 'infinity'::date),
+                 COALESCE(im.due_date, 'infinity'::date), COALESCE(im.plaza_id, 0), im.id
+        LIMIT 201
+    """,
+    'submitted_requests_all_page': """
+        SELECT im.id, p.name AS plaza_name, im.request_datetime, im.due_date, im.from_date, im.to_date,
+               s.scope_name, im.req_id, CASE WHEN im.done THEN 'Done' END AS done
+        FROM idr_master im
+        LEFT JOIN plaza p ON p.id = im.plaza_id
+        LEFT JOIN scope s ON s.id = im.scope_id
+        ORDER BY COALESCE(im.from_date, 'infinity'::date), COALESCE(im.to_date, 'infinity'::date),
+                 COALESCE(im.due_date, 'infinity'::date), COALESCE(im.plaza_id, 0), im.id
+        LIMIT 201
+    """,
+    'users_page': """
+        SELECT u.id, u.name, u.email_id, u.designation, u.mob_no, u.user_code, u.role, p.name AS plaza_name, u.created_at
+        FROM users u
+        LEFT JOIN plaza p ON p.id = u.plaza_id
+        WHERE (COALESCE(u.created_at, 'infinity'::timestamp), u.id) < ('infinity'::timestamp, 2147483647)
+        ORDER BY COALESCE(u.created_at, 'infinity'::timestamp) DESC, u.id DESC
+        LIMIT 201
+    """,
+}
+
+# Synthetic quarterly runs: every plaza has 4 users and RUNS requests of DOCUMENTS document types x 6 months,
+# spread over 4 scopes. About 70% of the slots hold an upload and 5% of those are rejected.
+SEED_SQL = """
+    WITH seed_scope AS (
+        INSERT INTO scope (scope_name)
+        SELECT 'seed scope ' || s FROM generate_series(0, 3) s
+        RETURNING id
+    )
+    INSERT INTO scope_document (scope_id, position, document_type)
+    SELECT id, d, 'Document ' || d
+    FROM seed_scope, generate_series(1, %(documents)s) d;
+
+    INSERT INTO plaza (name)
+    SELECT 'seed plaza ' || p FROM generate_series(1, %(plazas)s) p
+    ON CONFLICT (name) DO NOTHING;
+
+    INSERT INTO users (name, email_id, role, password, plaza_id)
+    SELECT 'Seed user ' || p || '-' || u, 'seed' || p || '-' || u || '@plan-check.invalid', 'client', 'x',
+           (SELECT id FROM plaza WHERE name = 'seed plaza ' || p)
+    FROM generate_series(1, %(plazas)s) p, generate_series(1, 4) u;
+
+    INSERT INTO idr_master (
+        plaza_id, request_datetime, due_date, from_date, to_date, done, scope_id, req_id, reminder_email_datetime
+    )
+    SELECT (SELECT id FROM plaza WHERE name = 'seed plaza ' || p),
+           NOW() AT TIME ZONE 'Asia/Kolkata',
+           DATE '2024-01-01' + (r * 90 + 100),
+           DATE '2024-01-01' + r * 90,
+           DATE '2024-01-01' + (r * 90 + 170),
+           r < %(runs)s - 1,
+           (SELECT min(id) FROM scope WHERE scope_name = 'seed scope ' || (r %% 4)),
+           'SEED-' || p || '-' || r,
+           -- Done requests are off the reminder schedule; about 1 in 7 open ones is due
+           CASE WHEN r = %(runs)s - 1 THEN NOW() AT TIME ZONE 'Asia/Kolkata' + (p %% 7 - 1) * INTERVAL '1 day' END
+    FROM generate_series(1, %(plazas)s) p, generate_series(0, %(runs)s - 1) r;
+
+    INSERT INTO document_master (req_id, document_type, object_key, modified_time, period, is_rejected, reason)
+    SELECT req_id, document_type, object_key, modified_time, period,
+           rejected, CASE WHEN rejected THEN 'Illegible scan' END
+    FROM (
+        SELECT im.req_id,
+               'Document ' || d AS document_type,
+               CASE WHEN random() < 0.7 THEN 'IDR/seed/' || im.req_id || '/Document ' || d || '/' || m || '.pdf' END AS object_key,
+               NOW() AT TIME ZONE 'Asia/Kolkata' AS modified_time,
+               date_trunc('month', im.from_date + (m || ' month')::interval)::date AS period,
+               random() < 0.05 AS rejected
+        FROM idr_master im, generate_series(1, %(documents)s) d, generate_series(0, 5) m
+        WHERE im.req_id LIKE 'SEED-%%'
+    ) slot;
+
+    ANALYZE plaza;
+    ANALYZE scope;
+    ANALYZE scope_document;
+    ANALYZE users;
+    ANALYZE idr_master;
+    ANALYZE document_master;
+    ANALYZE request_progress;
+"""
+
+
+def managed_table(relation):
+    """Return the TABLES entry a relation belongs to, resolving partitions to their parent, or None."""
+    if relation in TABLES:
+        return relation
+    for parent in sorted(PARTITIONED_TABLES, key=len, reverse=True):
+        if relation.startswith(parent + '_'):
+            return parent
+    return None
+
+
+def find_seq_scans(plan, ignore=frozenset()):
+    """Return the relation names of every Seq Scan node in an EXPLAIN (FORMAT JSON) plan tree."""
+    found = []
+    relation = plan.get('Relation Name', '')
+    if plan.get('Node Type') == 'Seq Scan' and managed_table(relation) and relation not in ignore:
+        found.append(relation)
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child, ignore))
+    return found
+
+
+# Relations below this many rows (upcoming quarter partitions, the plaza and scope catalogs)
+# are cheapest to read with a Seq Scan
+SMALL_RELATION_ROWS = 1000
+
+
+def small_relations(cursor):
+    """Return the managed tables and partitions that ANALYZE found to hold (almost) no rows."""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_inherits i ON i.inhrelid = c.oid
+        WHERE n.nspname = 'public'
+        AND c.relkind = 'r'
+        AND (c.relname = ANY(%s) OR i.inhparent::regclass::text = ANY(%s))
+        AND c.reltuples < %s
+    """, (list(TABLES), list(PARTITIONED_TABLES), SMALL_RELATION_ROWS))
+    return {name for name, in cursor.fetchall()}
+
+
+def seed_query_params(cursor):
+    """Parameters for HOT_QUERIES taken from the rows SEED_SQL inserted."""
+    cursor.execute("""
+        SELECT dm.req_id, dm.document_type, to_char(dm.period, 'YYYY'), to_char(dm.period, 'MM'),
+               im.plaza_id, p.name, s.scope_name, im.from_date, im.to_date
+        FROM document_master dm
+        JOIN idr_master im ON im.req_id = dm.req_id
+        JOIN plaza p ON p.id = im.plaza_id
+        JOIN scope s ON s.id = im.scope_id
+        WHERE dm.req_id = 'SEED-1-0'
+        LIMIT 1
+    """)
+    req_id, document_type, year, month, plaza_id, plaza_name, scope_name, from_date, to_date = cursor.fetchone()
+    return {
+        'req_id': req_id,
+        'req_ids': [f'SEED-{p}-0' for p in range(1, 21)],
+        'document_type': document_type,
+        'year': year,
+        'month': month,
+        'plaza_id': plaza_id,
+        'plaza_name': plaza_name,
+        'scope_name': scope_name,
+        'from_date': from_date,
+        'to_date': to_date,
+    }
+
+
+def check_query_plans(plazas=500, runs=8):
+    """
+    Seed a synthetic dataset, EXPLAIN every HOT_QUERIES entry and fail if any of
+    them still falls back to a sequential scan on a managed table. Returns True if none do.
+
+    Everything runs in one transaction that is rolled back, so it is safe to run
+    against a database that already holds real data.
+    """
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(SEED_SQL, {'plazas': int(plazas), 'runs': int(runs), 'documents': 15})
+        params = seed_query_params(cursor)
+        ignore = small_relations(cursor)
+
+        failures = []
+        for name, sql in HOT_QUERIES.items():
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            seq_scans = find_seq_scans(plan, ignore)
+            if seq_scans:
+                failures.append(name)
+                print(f"FAIL {name}: sequential scan on {', '.join(seq_scans)}")
+            else:
+                print(f"ok   {name}")
+
+        conn.rollback()
+
+    if failures:
+        print(f"{len(failures)} of {len(HOT_QUERIES)} hot queries fall back to a sequential scan.")
+        return False
+    print(f"All {len(HOT_QUERIES)} hot queries are index-backed.")
+    return True
@@ -0,0 +1,107 @@
+"""
+pg_stat_statements report for Plaza Portal.
+Shows where the database configured in .env spends its time, so index and batching
+changes can be checked against production traffic.
+
+pg_stat_statements has to be listed in shared_preload_libraries (server restart);
+the report creates the extension in the database itself if it is missing.
+
+Usage: python query_report.py [report [limit] | reset]
+"""
+
+import sys
+
+from db import DatabaseError, close_pool, db_connection
+
+QUERY_WIDTH = 100
+
+ORDERINGS = (
+    ('total time', 'total_exec_time'),
+    ('mean time', 'mean_exec_time'),
+    ('calls', 'calls'),
+)
+
+
+def enable_pg_stat_statements(cursor):
+    """Create the extension in this database, or raise if the server does not preload it."""
+    # The setting is a comma-separated list; entries may be padded with spaces or double-quoted
+    cursor.execute("""
+        SELECT 'pg_stat_statements' = ANY(
+            SELECT btrim(library, ' "')
+            FROM regexp_split_to_table(current_setting('shared_preload_libraries'), ',') AS library
+        )
+    """)
+    if not cursor.fetchone()[0]:
+        raise DatabaseError(
+            "pg_stat_statements is not loaded; add it to shared_preload_libraries and restart PostgreSQL"
+        )
+    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements")
+    cursor.connection.commit()
+
+
+def report(limit=15):
+    """Print the top statements of this database by total time, mean time and calls."""
+    limit = int(limit)
+    with db_connection() as conn, conn.cursor() as cursor:
+        enable_pg_stat_statements(cursor)
+
+        cursor.execute("""
+            SELECT count(*), COALESCE(sum(total_exec_time), 0)
+            FROM pg_stat_statements
+            WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+        """)
+        statements, total_ms = cursor.fetchone()
+        print(f"{statements} statement(s), {total_ms / 1000:.1f}s total execution time")
+
+        for title, column in ORDERINGS:
+            # column comes from ORDERINGS, never from input
+            cursor.execute(f"""
+                SELECT calls, total_exec_time, mean_exec_time, rows,
+                       100.0 * shared_blks_hit / NULLIF(shared_blks_hit + shared_blks_read, 0),
+                       regexp_replace(query, '\\s+', ' ', 'g')
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                ORDER BY {column} DESC
+                LIMIT %s
+            """, (limit,))
+
+            print(f"\nTop {limit} by {title}")
+            print(f"{'calls':>10} {'total (ms)':>12} {'mean (ms)':>10} {'rows':>10} {'hit %':>6}  query")
+            for calls, total, mean, rows, hit_ratio, query in cursor.fetchall():
+                hit = f"{hit_ratio:.1f}" if hit_ratio is not None else '-'
+                print(f"{calls:>10} {total:>12.1f} {mean:>10.2f} {rows:>10} {hit:>6}  {query[:QUERY_WIDTH]}")
+
+
+def reset():
+    """Clear the collected statistics, e.g. before measuring a change."""
+    with db_connection() as conn, conn.cursor() as cursor:
+        enable_pg_stat_statements(cursor)
+        cursor.execute("SELECT pg_stat_statements_reset()")
+        conn.commit()
+    print("pg_stat_statements reset.")
+
+
+COMMANDS = {
+    'report': report,
+    'reset': reset,
+}
+
+
+def main():
+    """Run the report command named on the command line."""
+    command = sys.argv[1] if len(sys.argv) > 1 else 'report'
+    if command not in COMMANDS:
+        print(f"Usage: python query_report.py [{'|'.join(COMMANDS)}] [args]")
+        sys.exit(1)
+
+    try:
+        COMMANDS[command](*sys.argv[2:])
+    except Exception as e:
+        print(f"Error running '{command}': {e}")
+        sys.exit(1)
+    finally:
+        close_pool()
+
+
+if __name__ == '__main__':
+    main()
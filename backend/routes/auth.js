@@ -1,7 +1,9 @@
 const express = require('express');
 const jwt = require('jsonwebtoken');
+const bcrypt = require('bcrypt');
 const { pool } = require('../config/db');
-const { encryptToken, decryptToken } = require('../utils/tokenEncryption');
+const { encryptToken } = require('../utils/tokenEncryption');
+const { verifySessionToken, sessionCache } = require('../middleware/auth');
 
 const router = express.Router();
 
@@ -32,7 +34,11 @@ router.post('/login', async (req, res) => {
 
     // Query user from database
     const result = await pool.query(
-      'SELECT id, name, email_id, password, role, designation, mob_no, user_code, temp_login, plaza_name FROM users WHERE email_id = $1',
+      `SELECT u.id, u.name, u.email_id, u.password, u.role, u.designation, u.mob_no, u.user_code, u.temp_login,
+              p.name AS plaza_name
+       FROM users u
+       LEFT JOIN plaza p ON p.id = u.plaza_id
+       WHERE u.email_id = $1`,
       [email_id]
     );
 
@@ -45,8 +51,13 @@ router.post('/login', async (req, res) => {
 
     const user = result.rows[0];
 
-    // Verify password (plain text comparison)
-    if (password !== user.password) {
+    // Verify password. Users created by user_import.add_users() store a bcrypt hash,
+    // older rows and temporary passwords are still plain text.
+    const isHashed = /^\$2[aby]\$\d{2}\$/.test(user.password || '');
+    const passwordMatches = isHashed
+      ? await bcrypt.compare(password, user.password)
+      : password === user.password;
+    if (!passwordMatches) {
       return res.status(401).json({
         success: false,
         message: 'Invalid email or password',
@@ -165,6 +176,10 @@ router.post('/update-password', async (req, res) => {
  * Logout endpoint - clears the session cookie
  */
 router.post('/logout', (req, res) => {
+  if (req.cookies.sessionToken) {
+    sessionCache.delete(req.cookies.sessionToken);
+  }
+
   res.clearCookie('sessionToken', {
     httpOnly: true,
     secure: process.env.NODE_ENV === 'production',
@@ -193,15 +208,16 @@ router.get('/verify', async (req, res) => {
       });
     }
 
-    // Decrypt the token
-    const jwtToken = decryptToken(encryptedToken);
-
-    // Verify JWT token
-    const decoded = jwt.verify(jwtToken, JWT_SECRET);
+    // Decrypt and verify the token
+    const decoded = verifySessionToken(encryptedToken);
 
     // Optionally fetch fresh user data
     const result = await pool.query(
-      'SELECT id, name, email_id, role, designation, mob_no, user_code, temp_login, plaza_name FROM users WHERE id = $1',
+      `SELECT u.id, u.name, u.email_id, u.role, u.designation, u.mob_no, u.user_code, u.temp_login,
+              p.name AS plaza_name
+       FROM users u
+       LEFT JOIN plaza p ON p.id = u.plaza_id
+       WHERE u.id = $1`,
       [decoded.id]
     );
 
@@ -1,160 +1,265 @@
+const crypto = require('crypto');
 const express = require('express');
 const multer = require('multer');
-const { S3Client, PutObjectCommand, DeleteObjectCommand } = require('@aws-sdk/client-s3');
 const { pool } = require('../config/db');
 const { requireAuth } = require('../middleware/auth');
-const { transporter } = require('../config/mail');
+const { processRejectionEmails } = require('../scripts/rejection_email');
+const { REMINDER_INTERVAL_DAYS } = require('../scripts/idr_reminder_email');
+const { s3Client, S3_BUCKET_NAME, s3ObjectUrl } = require('../config/s3');
+const { MAX_UPLOAD_BYTES, s3StreamStorage, singleFileUpload } = require('../utils/s3Upload');
+const { PaginationError, parseLimit, decodeCursor, toPage } = require('../utils/pagination');
+const { findScope, requestedScopeNames } = require('../utils/referenceData');
 
 const router = express.Router();
-const upload = multer({ storage: multer.memoryStorage() });
-
-// Initialize S3 client
-const s3Client = new S3Client({
-  region: process.env.AWS_REGION || 'us-east-1',
-  credentials: {
-    accessKeyId: process.env.AWS_ACCESS_KEY_ID,
-    secretAccessKey: process.env.AWS_SECRET_ACCESS_KEY,
+
+// Sort key of /submitted-requests; must match idx_idr_master_submitted in schema.py.
+// NULL dates sort last, as with the plain column ORDER BY it replaces.
+const SUBMITTED_REQUESTS_SORT =
+  "COALESCE(im.from_date, 'infinity'::date), COALESCE(im.to_date, 'infinity'::date), " +
+  "COALESCE(im.due_date, 'infinity'::date), COALESCE(im.plaza_id, 0), im.id";
+
+// Routes take plaza and scope names; idr_master, users and dashboard_stats store their ids.
+// Scope names are not unique, a name refers to its oldest scope (as in create_idr_run()).
+const plazaIdByName = (name) => `(SELECT id FROM plaza WHERE name = ${name})`;
+const scopeIdByName = (name) => `(SELECT min(id) FROM scope WHERE scope_name = ${name})`;
+
+// document_master.period is the first day of a document's month and its quarter partition key
+// (PARTITIONED_TABLES in schema.py). Routes keep taking and returning year/month strings.
+const documentPeriod = (year, month) => `make_date(${year}::integer, ${month}::integer, 1)`;
+const YEAR_MONTH = "to_char(period, 'YYYY') AS year, to_char(period, 'MM') AS month";
+
+// document_master stores the S3 object key; responses carry the public URL as before
+const withDocumentUrl = ({ object_key, ...document }) => ({
+  ...document,
+  document_url: object_key ? s3ObjectUrl(object_key) : null,
+});
+
+// idr_master.done is a boolean; responses keep the 'Done' / null status
+const DONE_STATUS = "CASE WHEN im.done THEN 'Done' END AS done";
+
+// Per-request revision of /overview, the input of its ETag. Any write to a request's documents
+// upserts its request_progress row (a trigger in schema.py), so that row's xmin changes with the
+// request's cells; im.xmin covers the request row itself (done, dates). The row is read by a
+// correlated subquery, a primary key lookup per request; as a join the planner may hash a
+// sequential scan of request_progress for a run of a few requests.
+const OVERVIEW_REVISION = `format('%s:%s:%s:%s:%s', im.id, im.xmin,
+  (SELECT rp.xmin FROM request_progress rp WHERE rp.req_id = im.req_id),
+  p.name, s.scope_name) AS revision`;
+const overviewETag = (rows) => {
+  const hash = crypto.createHash('sha1');
+  rows.forEach((row) => hash.update(`${row.revision}\n`));
+  return `"${hash.digest('base64url')}"`;
+};
+
+// Most cells POST /cell-documents returns documents for in one call
+const MAX_DOCUMENT_CELLS = 200;
+
+// Error for a request that is rejected while its file is being streamed
+const uploadError = (status, message) => Object.assign(new Error(message), { status });
+
+// S3 key of a new upload: IDR/plaza_name/scope/document_type/month-year/<unique>/filename.
+// An object may be shared by every document with the same content (document_blob), so a later
+// upload with the same file name gets its own key instead of overwriting it.
+const documentKey = ({ plaza_name, scope_name, document_type, year, month }, filename) =>
+  `IDR/${plaza_name}/${scope_name}/${document_type}/${month}-${year}/${crypto.randomUUID()}/${filename}`;
+
+// Content-addressed dedup of uploads, see document_blob in schema.py
+const documentBlobs = {
+  // A blob without references may already be queued for purging, so it is not reused
+  find: async (sha256) => {
+    const result = await pool.query(
+      'SELECT object_key FROM document_blob WHERE sha256 = $1 AND ref_count > 0',
+      [sha256]
+    );
+    return result.rows.length > 0 ? result.rows[0].object_key : null;
   },
+  // Record a newly stored object. A blob of the same content is only pointed at it when its
+  // old object is unreferenced and queued for purging; a blob registered by an upload whose
+  // document row is not written yet also has no references, and is shared instead.
+  // Returns the key the content is stored under.
+  register: async ({ sha256, key, size }) => {
+    const registered = await pool.query(
+      `INSERT INTO document_blob (sha256, object_key, size)
+       VALUES ($1, $2, $3)
+       ON CONFLICT (sha256) DO UPDATE
+       SET object_key = EXCLUDED.object_key, size = EXCLUDED.size, created_at = EXCLUDED.created_at
+       WHERE document_blob.ref_count = 0
+         AND EXISTS (
+           SELECT 1 FROM s3_purge_queue q
+           WHERE q.object_key = document_blob.object_key AND q.status IN ('pending', 'purging')
+         )
+       RETURNING object_key`,
+      [sha256, key, size]
+    );
+    if (registered.rows.length > 0) {
+      return registered.rows[0].object_key;
+    }
+    const existing = await pool.query('SELECT object_key FROM document_blob WHERE sha256 = $1', [sha256]);
+    return existing.rows.length > 0 ? existing.rows[0].object_key : key;
+  },
+};
+
+// Document uploads are streamed into S3 as they arrive instead of being buffered in memory,
+// and hashed on the way so a file that is already stored is not uploaded again.
+// The S3 key depends on the request, so the form fields must come before the file.
+const documentUpload = multer({
+  storage: s3StreamStorage({
+    s3Client,
+    bucket: S3_BUCKET_NAME,
+    objectUrl: s3ObjectUrl,
+    blobs: documentBlobs,
+    resolveKey: async (req, file) => {
+      const { req_id, document_type, year, month } = req.body;
+
+      if (!req_id || !document_type || !year || !month) {
+        throw uploadError(400, 'Request ID, document type, year, and month are required');
+      }
+
+      // Get plaza_name and scope_name of the request
+      const idrResult = await pool.query(
+        `SELECT p.name AS plaza_name, s.scope_name
+         FROM idr_master im
+         LEFT JOIN plaza p ON p.id = im.plaza_id
+         LEFT JOIN scope s ON s.id = im.scope_id
+         WHERE im.req_id = $1
+         LIMIT 1`,
+        [req_id]
+      );
+
+      if (idrResult.rows.length === 0) {
+        throw uploadError(404, 'Request not found');
+      }
+
+      const { plaza_name, scope_name } = idrResult.rows[0];
+
+      if (!plaza_name || !scope_name) {
+        throw uploadError(400, 'Plaza name or scope name not found for this request');
+      }
+
+      return documentKey({ plaza_name, scope_name, document_type, year, month }, file.originalname);
+    },
+  }),
+  limits: { fileSize: MAX_UPLOAD_BYTES },
 });
 
-const S3_BUCKET_NAME = process.env.AWS_S3_BUCKET_NAME;
+const replacementUpload = multer({
+  storage: s3StreamStorage({
+    s3Client,
+    bucket: S3_BUCKET_NAME,
+    objectUrl: s3ObjectUrl,
+    blobs: documentBlobs,
+    resolveKey: async (req, file) => {
+      const { document_id } = req.body;
+
+      if (!document_id) {
+        throw uploadError(400, 'Document ID is required');
+      }
+
+      // Get existing document row (to know req_id, type, year, month and current object)
+      const docResult = await pool.query(
+        `SELECT dm.id, dm.req_id, dm.document_type, dm.object_key, ${YEAR_MONTH},
+                p.name AS plaza_name, s.scope_name
+         FROM document_master dm
+         JOIN idr_master im ON dm.req_id = im.req_id
+         LEFT JOIN plaza p ON p.id = im.plaza_id
+         LEFT JOIN scope s ON s.id = im.scope_id
+         WHERE dm.id = $1`,
+        [document_id]
+      );
+
+      if (docResult.rows.length === 0) {
+        throw uploadError(404, 'Document not found');
+      }
+
+      const { plaza_name, scope_name } = docResult.rows[0];
+
+      if (!plaza_name || !scope_name) {
+        throw uploadError(400, 'Plaza name or scope name not found for this request');
+      }
+
+      // The route reuses the row instead of looking it up again
+      req.existingDocument = docResult.rows[0];
+      return documentKey(docResult.rows[0], file.originalname);
+    },
+  }),
+  limits: { fileSize: MAX_UPLOAD_BYTES },
+});
 
 /**
  * POST /api/idr/master
  * Create IDR master records
+ * Periods in a quarter moved to document_master_archive are refused with 409.
  */
 router.post('/master', requireAuth, async (req, res) => {
-  const client = await pool.connect();
-  
   try {
     const { plazas, due_date, from_date, to_date, scope_name } = req.body;
 
     // Validate input
     if (!plazas || !Array.isArray(plazas) || plazas.length === 0 || !due_date || !from_date || !to_date || !scope_name) {
-      client.release();
       return res.status(400).json({
         success: false,
         message: 'Plazas array, due date, from date, to date, and scope name are required',
       });
     }
 
-    // Start transaction
-    await client.query('BEGIN');
-
-    // Get current datetime in Mumbai timezone
-    const requestDatetimeResult = await client.query(
-      "SELECT NOW() AT TIME ZONE 'Asia/Kolkata' as current_time"
-    );
-    const requestDatetime = requestDatetimeResult.rows[0].current_time;
-    const modifiedTime = requestDatetimeResult.rows[0].current_time;
-
-    // Fetch scope details to get required_documents
-    const scopeResult = await client.query(
-      'SELECT required_documents FROM scope WHERE scope_name = $1',
-      [scope_name]
-    );
-
-    if (scopeResult.rows.length === 0) {
-      await client.query('ROLLBACK');
-      client.release();
+    // Make sure the scope exists before creating anything
+    if (!(await findScope(scope_name))) {
       return res.status(404).json({
         success: false,
         message: 'Scope not found',
       });
     }
 
-    // Parse required_documents (comma-separated string)
-    const requiredDocumentsStr = scopeResult.rows[0].required_documents || '';
-    const requiredDocuments = requiredDocumentsStr
-      .split(',')
-      .map(doc => doc.trim())
-      .filter(doc => doc.length > 0);
-
-    // Insert records for each plaza
-    const insertedRecords = [];
-    
-    for (const plaza of plazas) {
-      // Each plaza should have plaza_name and req_id
-      const plazaName = typeof plaza === 'string' ? plaza : plaza.plaza_name;
-      const reqId = typeof plaza === 'string' ? null : plaza.req_id;
-      
-      // Insert into idr_master
-      const result = await client.query(
-        `INSERT INTO idr_master (
-          plaza_name, 
-          request_datetime, 
-          due_date, 
-          from_date,
-          to_date,
-          scope_name,
-          req_id,
-          reminder_email_datetime
-        )
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        RETURNING id, plaza_name, request_datetime, due_date, from_date, to_date, scope_name, req_id`,
-        [
-          plazaName,
-          requestDatetime,
-          due_date,
-          from_date,
-          to_date,
-          scope_name,
-          reqId,
-          null // reminder_email_datetime - keep empty
-        ]
-      );
-      
-      insertedRecords.push(result.rows[0]);
-
-      // Insert rows into document_master for each required document and each month in the range
-      if (reqId && requiredDocuments.length > 0) {
-        // Generate all months between from_date and to_date
-        const startDate = new Date(from_date);
-        const endDate = new Date(to_date);
-        const months = [];
-        
-        const current = new Date(startDate.getFullYear(), startDate.getMonth(), 1);
-        const end = new Date(endDate.getFullYear(), endDate.getMonth(), 1);
-        
-        while (current <= end) {
-          const year = current.getFullYear().toString();
-          const month = String(current.getMonth() + 1).padStart(2, '0'); // 1-12, padded to 01-12
-          months.push({ year, month });
-          current.setMonth(current.getMonth() + 1);
-        }
-        
-        // For each document type, create a row for each month
-        for (const documentType of requiredDocuments) {
-          for (const { year, month } of months) {
-            await client.query(
-              `INSERT INTO document_master (
-                req_id,
-                document_type,
-                document_url,
-                modified_time,
-                year,
-                month
-              )
-              VALUES ($1, $2, $3, $4, $5, $6)`,
-              [
-                reqId,
-                documentType,
-                null, // document_url - empty for now
-                modifiedTime,
-                year,
-                month
-              ]
-            );
-          }
-        }
-      }
+    // Each plaza should have plaza_name and req_id
+    const plazaNames = plazas.map(plaza => (typeof plaza === 'string' ? plaza : plaza.plaza_name));
+    const reqIds = plazas.map(plaza => (typeof plaza === 'string' ? null : plaza.req_id));
+
+    if (plazaNames.some(name => typeof name !== 'string' || name.trim() === '')) {
+      return res.status(400).json({
+        success: false,
+        message: 'Every plaza needs a plaza name',
+      });
     }
 
-    // Commit transaction
-    await client.query('COMMIT');
+    // Archived quarters are never partitioned again, so their months cannot take new slots
+    const archived = await pool.query(
+      `SELECT archived_quarters($1::date, $2::date) AS partition_name`,
+      [from_date, to_date]
+    );
+    if (archived.rows.length > 0) {
+      return res.status(409).json({
+        success: false,
+        message: `Documents of this period are archived (${archived.rows.map(row => row.partition_name).join(', ')})`,
+      });
+    }
 
-    // Emails for these new requests will be sent by a background cron job
-    // that checks idr_master.email_sent every minute.
+    // Plazas that are not in the catalog yet are added to it, as POST /api/users/assign-plaza
+    // does. This is its own statement because create_idr_run() and the plaza join below
+    // would not see plazas inserted by the same statement.
+    await pool.query(
+      `INSERT INTO plaza (name)
+       SELECT DISTINCT unnest($1::text[])
+       ON CONFLICT (name) DO NOTHING`,
+      [plazaNames]
+    );
+
+    // create_idr_run (installed by db_init.py) inserts every idr_master row and expands
+    // required documents x months into document_master server-side, atomically,
+    // in a single statement regardless of how many plazas are submitted
+    const result = await pool.query(
+      `SELECT r.id, p.name AS plaza_name, r.request_datetime, r.due_date, r.from_date, r.to_date,
+              s.scope_name, r.req_id
+       FROM create_idr_run($1::text[], $2::text[], $3, $4::date, $5::date, $6::date) r
+       JOIN plaza p ON p.id = r.plaza_id
+       JOIN scope s ON s.id = r.scope_id
+       ORDER BY r.id`,
+      [plazaNames, reqIds, scope_name, due_date, from_date, to_date]
+    );
+
+    const insertedRecords = result.rows;
+
+    // Emails for these new requests are queued in email_outbox by a trigger on idr_master
+    // and sent by the background cron job in scripts/idr_request_email.js.
 
     return res.status(201).json({
       success: true,
@@ -162,38 +267,82 @@ router.post('/master', requireAuth, async (req, res) => {
       records: insertedRecords,
     });
   } catch (error) {
-    // Rollback transaction on error
-    await client.query('ROLLBACK').catch(rollbackError => {
-      console.error('Error rolling back transaction:', rollbackError);
-    });
-    
     console.error('Error creating IDR master records:', error);
     return res.status(500).json({
       success: false,
       message: 'Internal server error',
       error: error.message,
     });
-  } finally {
-    client.release();
   }
 });
 
 /**
  * GET /api/idr/unique-scopes
- * Get all unique scope names from idr_master table
+ * Get the names of all scopes that have IDR requests
  */
 router.get('/unique-scopes', requireAuth, async (req, res) => {
   try {
+    return res.status(200).json({
+      success: true,
+      scopes: await requestedScopeNames(),
+    });
+  } catch (error) {
+    console.error('Get unique scopes error:', error);
+    return res.status(500).json({
+      success: false,
+      message: 'Internal server error',
+    });
+  }
+});
+
+/**
+ * GET /api/idr/dashboard-statistics
+ * Get per plaza/scope/month completion and rejection statistics for the dashboard
+ * Optional filters: plaza_name, scope_name, year, month
+ * Reads the dashboard_stats rollup maintained by triggers on document_master
+ */
+router.get('/dashboard-statistics', requireAuth, async (req, res) => {
+  try {
+    const { plaza_name, scope_name, year, month } = req.query;
+
     const result = await pool.query(
-      'SELECT DISTINCT scope_name FROM idr_master WHERE scope_name IS NOT NULL ORDER BY scope_name'
+      `SELECT 
+        COALESCE(p.name, '') AS plaza_name,
+        COALESCE(s.scope_name, '') AS scope_name,
+        COALESCE(to_char(ds.period, 'YYYY'), '') AS year,
+        COALESCE(to_char(ds.period, 'MM'), '') AS month,
+        ds.total_slots,
+        ds.filled_slots,
+        ds.rejected_slots,
+        ROUND(100.0 * ds.filled_slots / NULLIF(ds.total_slots, 0), 2) as completion_rate,
+        ROUND(100.0 * ds.rejected_slots / NULLIF(ds.filled_slots, 0), 2) as rejection_rate
+      FROM dashboard_stats ds
+      LEFT JOIN plaza p ON p.id = ds.plaza_id
+      LEFT JOIN scope s ON s.id = ds.scope_id
+      WHERE ($1::text IS NULL OR ds.plaza_id = ${plazaIdByName('$1')})
+        AND ($2::text IS NULL OR ds.scope_id = ${scopeIdByName('$2')})
+        AND ($3::text IS NULL OR to_char(ds.period, 'YYYY') = $3)
+        AND ($4::text IS NULL OR to_char(ds.period, 'MM') = $4)
+      ORDER BY 1, 2, ds.period`,
+      [plaza_name || null, scope_name || null, year || null, month || null]
+    );
+
+    const totals = result.rows.reduce(
+      (acc, row) => ({
+        total_slots: acc.total_slots + row.total_slots,
+        filled_slots: acc.filled_slots + row.filled_slots,
+        rejected_slots: acc.rejected_slots + row.rejected_slots,
+      }),
+      { total_slots: 0, filled_slots: 0, rejected_slots: 0 }
     );
 
     return res.status(200).json({
       success: true,
-      scopes: result.rows.map(row => row.scope_name),
+      statistics: result.rows,
+      totals,
     });
   } catch (error) {
-    console.error('Get unique scopes error:', error);
+    console.error('Get dashboard statistics error:', error);
     return res.status(500).json({
       success: false,
       message: 'Internal server error',
@@ -203,11 +352,14 @@ router.get('/unique-scopes', requireAuth, async (req, res) => {
 
 /**
  * GET /api/idr/submitted-requests
- * Get submitted requests filtered by scope_name
+ * Keyset-paginated IDR requests, sorted by from_date, to_date, due_date, plaza id, id.
+ * Query: scope_name ("all" or a scope), optional from_date (>=), to_date (<=), due_date,
+ * plaza_name, done ("done" | "pending"), limit and cursor (next_cursor of the previous page).
+ * Backed by idx_idr_master_submitted / idx_idr_master_scope_submitted in schema.py.
  */
 router.get('/submitted-requests', requireAuth, async (req, res) => {
   try {
-    const { scope_name } = req.query;
+    const { scope_name, from_date, to_date, due_date, plaza_name, done, cursor } = req.query;
 
     if (!scope_name) {
       return res.status(400).json({
@@ -216,47 +368,81 @@ router.get('/submitted-requests', requireAuth, async (req, res) => {
       });
     }
 
-    // If scope_name is "all", return all records; otherwise filter by scope_name
-    let result;
-    if (scope_name === 'all') {
-      result = await pool.query(
-        `SELECT 
-          id,
-          plaza_name,
-          request_datetime,
-          due_date,
-          from_date,
-          to_date,
-          scope_name,
-          req_id,
-          done
-        FROM idr_master 
-        ORDER BY from_date, to_date, due_date, plaza_name`
-      );
-    } else {
-      result = await pool.query(
-        `SELECT 
-          id,
-          plaza_name,
-          request_datetime,
-          due_date,
-          from_date,
-          to_date,
-          scope_name,
-          req_id,
-          done
-        FROM idr_master 
-        WHERE scope_name = $1
-        ORDER BY from_date, to_date, due_date, plaza_name`,
-        [scope_name]
+    const limit = parseLimit(req.query.limit);
+    const after = decodeCursor(cursor, 5);
+
+    const params = [];
+    const conditions = [];
+    const param = (value) => {
+      params.push(value);
+      return `$${params.length}`;
+    };
+
+    // If scope_name is "all", list every scope; otherwise filter by scope_name
+    if (scope_name !== 'all') {
+      conditions.push(`im.scope_id = ${scopeIdByName(param(scope_name))}`);
+    }
+    // Dates may arrive as YYYY-MM-DD or as the ISO timestamps this endpoint returns; read both as IST dates
+    const istDate = (value) => `(${param(value)}::timestamptz AT TIME ZONE 'Asia/Kolkata')::date`;
+    if (from_date) {
+      conditions.push(`im.from_date >= ${istDate(from_date)}`);
+    }
+    if (to_date) {
+      conditions.push(`im.to_date <= ${istDate(to_date)}`);
+    }
+    if (due_date) {
+      conditions.push(`im.due_date = ${istDate(due_date)}`);
+    }
+    if (plaza_name) {
+      conditions.push(`im.plaza_id = ${plazaIdByName(param(plaza_name))}`);
+    }
+    if (done === 'done') {
+      conditions.push('im.done');
+    } else if (done === 'pending') {
+      conditions.push('NOT im.done');
+    }
+    if (after) {
+      conditions.push(
+        `(${SUBMITTED_REQUESTS_SORT}) > (${param(after[0])}::date, ${param(after[1])}::date, ` +
+        `${param(after[2])}::date, ${param(after[3])}::int, ${param(after[4])}::int)`
       );
     }
 
+    const result = await pool.query(
+      `SELECT 
+        im.id,
+        p.name AS plaza_name,
+        im.request_datetime,
+        im.due_date,
+        im.from_date,
+        im.to_date,
+        s.scope_name,
+        im.req_id,
+        ${DONE_STATUS},
+        json_build_array(${SUBMITTED_REQUESTS_SORT}) AS sort_key
+      FROM idr_master im
+      LEFT JOIN plaza p ON p.id = im.plaza_id
+      LEFT JOIN scope s ON s.id = im.scope_id
+      ${conditions.length > 0 ? `WHERE ${conditions.join(' AND ')}` : ''}
+      ORDER BY ${SUBMITTED_REQUESTS_SORT}
+      LIMIT ${param(limit + 1)}`,
+      params
+    );
+
+    const { rows, nextCursor } = toPage(result.rows, limit);
+
     return res.status(200).json({
       success: true,
-      records: result.rows,
+      records: rows,
+      next_cursor: nextCursor,
     });
   } catch (error) {
+    if (error instanceof PaginationError) {
+      return res.status(400).json({
+        success: false,
+        message: error.message,
+      });
+    }
     console.error('Get submitted requests error:', error);
     return res.status(500).json({
       success: false,
@@ -271,9 +457,9 @@ router.get('/submitted-requests', requireAuth, async (req, res) => {
  */
 router.get('/client-requests', requireAuth, async (req, res) => {
   try {
-    // Get user's plaza_name from the database
+    // Get user's plaza from the database
     const userResult = await pool.query(
-      'SELECT plaza_name FROM users WHERE id = $1',
+      'SELECT plaza_id FROM users WHERE id = $1',
       [req.user.id]
     );
 
@@ -284,10 +470,10 @@ router.get('/client-requests', requireAuth, async (req, res) => {
       });
     }
 
-    const plazaName = userResult.rows[0].plaza_name;
+    const plazaId = userResult.rows[0].plaza_id;
 
-    // If user doesn't have a plaza_name, return empty array
-    if (!plazaName) {
+    // If user doesn't have a plaza, return empty array
+    if (!plazaId) {
       return res.status(200).json({
         success: true,
         requests: [],
@@ -297,21 +483,23 @@ router.get('/client-requests', requireAuth, async (req, res) => {
     // Get all requests for this plaza (both pending and done)
     const result = await pool.query(
       `SELECT 
-        id,
-        plaza_name,
-        request_datetime,
-        due_date,
-        from_date,
-        to_date,
-        scope_name,
-        req_id,
-        done
-      FROM idr_master 
-      WHERE plaza_name = $1
+        im.id,
+        p.name AS plaza_name,
+        im.request_datetime,
+        im.due_date,
+        im.from_date,
+        im.to_date,
+        s.scope_name,
+        im.req_id,
+        ${DONE_STATUS}
+      FROM idr_master im
+      JOIN plaza p ON p.id = im.plaza_id
+      LEFT JOIN scope s ON s.id = im.scope_id
+      WHERE im.plaza_id = $1
       ORDER BY 
-        CASE WHEN done = 'Done' THEN 1 ELSE 0 END,
-        request_datetime DESC`,
-      [plazaName]
+        im.done,
+        im.request_datetime DESC`,
+      [plazaId]
     );
 
     return res.status(200).json({
@@ -342,9 +530,13 @@ router.get('/documents/:req_id', requireAuth, async (req, res) => {
       });
     }
 
-    // Get scope_name from idr_master
+    // Get the scope name of the request
     const idrResult = await pool.query(
-      `SELECT scope_name FROM idr_master WHERE req_id = $1 LIMIT 1`,
+      `SELECT s.scope_name
+       FROM idr_master im
+       LEFT JOIN scope s ON s.id = im.scope_id
+       WHERE im.req_id = $1
+       LIMIT 1`,
       [req_id]
     );
 
@@ -356,21 +548,20 @@ router.get('/documents/:req_id', requireAuth, async (req, res) => {
         id,
         req_id,
         document_type,
-        document_url,
+        object_key,
         modified_time,
-        year,
-        month,
+        ${YEAR_MONTH},
         is_rejected,
         reason
       FROM document_master 
       WHERE req_id = $1
-      ORDER BY year, month, document_type`,
+      ORDER BY period, document_type`,
       [req_id]
     );
 
     return res.status(200).json({
       success: true,
-      documents: result.rows,
+      documents: result.rows.map(withDocumentUrl),
       scope_name: scope_name,
     });
   } catch (error) {
@@ -385,8 +576,9 @@ router.get('/documents/:req_id', requireAuth, async (req, res) => {
 /**
  * POST /api/idr/upload-document
  * Upload a document to S3 and update document_master table
+ * Months whose quarter is archived are refused with 409.
  */
-router.post('/upload-document', requireAuth, upload.single('file'), async (req, res) => {
+router.post('/upload-document', requireAuth, singleFileUpload(documentUpload, 'file'), async (req, res) => {
   try {
     const { req_id, document_type, year, month } = req.body;
 
@@ -405,133 +597,33 @@ router.post('/upload-document', requireAuth, upload.single('file'), async (req,
       });
     }
 
-    // Get plaza_name and scope_name from idr_master
-    const idrResult = await pool.query(
-      'SELECT plaza_name, scope_name FROM idr_master WHERE req_id = $1 LIMIT 1',
-      [req_id]
-    );
-
-    if (idrResult.rows.length === 0) {
-      return res.status(404).json({
-        success: false,
-        message: 'Request not found',
-      });
-    }
-
-    const { plaza_name, scope_name } = idrResult.rows[0];
-
-    if (!plaza_name || !scope_name) {
-      return res.status(400).json({
-        success: false,
-        message: 'Plaza name or scope name not found for this request',
-      });
-    }
-
-    // Get original filename
-    const originalFileName = req.file.originalname;
-    
-    // Construct S3 key: IDR/plaza_name/scope/document_type/month-year/filename
-    const s3Key = `IDR/${plaza_name}/${scope_name}/${document_type}/${month}-${year}/${originalFileName}`;
-
-    // Upload to S3
-    const uploadParams = {
-      Bucket: S3_BUCKET_NAME,
-      Key: s3Key,
-      Body: req.file.buffer,
-      ContentType: req.file.mimetype,
-    };
-
-    await s3Client.send(new PutObjectCommand(uploadParams));
-
-    // Construct S3 URL
-    const s3Url = `https://${S3_BUCKET_NAME}.s3.${process.env.AWS_REGION || 'us-east-1'}.amazonaws.com/${s3Key}`;
-
-    // Get current datetime in Mumbai timezone
-    const modifiedTimeResult = await pool.query(
-      "SELECT NOW() AT TIME ZONE 'Asia/Kolkata' as current_time"
-    );
-    const modifiedTime = modifiedTimeResult.rows[0].current_time;
-
-    // Check if any row exists with a document_url for this req_id, document_type, year, month
-    const existingRowWithUrl = await pool.query(
-      `SELECT id FROM document_master 
-       WHERE req_id = $1 AND document_type = $2 AND year = $3 AND month = $4 AND document_url IS NOT NULL
-       LIMIT 1`,
-      [req_id, document_type, year, month]
+    // The file has already been streamed to S3 (or matched a stored blob) by documentUpload
+    const { key: objectKey, url: s3Url } = req.file;
+
+    // Fill an empty slot of this month (or add a row when every slot has an upload), stamp
+    // modified_time and mark the request 'Done' once every slot is filled, in one statement.
+    // claim_document_slot() (schema.py) locks the slot FOR UPDATE SKIP LOCKED, so
+    // concurrent uploads of the same document type never overwrite each other.
+    const insertResult = await pool.query(
+      `SELECT id, req_id, document_type, object_key, modified_time, ${YEAR_MONTH}
+       FROM claim_document_slot($1, $2, ${documentPeriod('$3', '$4')}, $5)`,
+      [req_id, document_type, year, month, objectKey]
     );
 
-    let insertResult;
-    if (existingRowWithUrl.rows.length > 0) {
-      // If a row with document_url exists, create a new row for the additional file
-      insertResult = await pool.query(
-        `INSERT INTO document_master (req_id, document_type, document_url, modified_time, year, month)
-         VALUES ($1, $2, $3, $4, $5, $6)
-         RETURNING id, req_id, document_type, document_url, modified_time, year, month`,
-        [req_id, document_type, s3Url, modifiedTime, year, month]
-      );
-    } else {
-      // If no row with document_url exists, check for empty row or create new one
-      const emptyRow = await pool.query(
-        `SELECT id FROM document_master 
-         WHERE req_id = $1 AND document_type = $2 AND year = $3 AND month = $4 AND document_url IS NULL
-         LIMIT 1`,
-        [req_id, document_type, year, month]
-      );
-
-      if (emptyRow.rows.length > 0) {
-        // Update the empty row
-        insertResult = await pool.query(
-          `UPDATE document_master 
-           SET document_url = $1, modified_time = $2
-           WHERE id = $3
-           RETURNING id, req_id, document_type, document_url, modified_time, year, month`,
-          [s3Url, modifiedTime, emptyRow.rows[0].id]
-        );
-      } else {
-        // Create a new row (shouldn't happen normally, but handle edge case)
-        insertResult = await pool.query(
-          `INSERT INTO document_master (req_id, document_type, document_url, modified_time, year, month)
-           VALUES ($1, $2, $3, $4, $5, $6)
-           RETURNING id, req_id, document_type, document_url, modified_time, year, month`,
-          [req_id, document_type, s3Url, modifiedTime, year, month]
-        );
-      }
-    }
-
-    // Check if all documents for this req_id are uploaded and not rejected
-    // If so, mark the request as 'Done' in idr_master
-    const allDocumentsCheck = await pool.query(
-      `SELECT 
-        COUNT(*) as total_rows,
-        COUNT(CASE WHEN document_url IS NOT NULL THEN 1 END) as rows_with_url,
-        COUNT(CASE WHEN is_rejected = TRUE THEN 1 END) as rejected_rows
-      FROM document_master 
-      WHERE req_id = $1`,
-      [req_id]
-    );
-
-    const { total_rows, rows_with_url, rejected_rows } = allDocumentsCheck.rows[0];
-    const totalRows = parseInt(total_rows, 10);
-    const rowsWithUrl = parseInt(rows_with_url, 10);
-    const rejectedRows = parseInt(rejected_rows, 10);
-
-    // If all rows have document_url and none are rejected, mark as Done
-    if (totalRows > 0 && totalRows === rowsWithUrl && rejectedRows === 0) {
-      await pool.query(
-        `UPDATE idr_master 
-         SET done = 'Done' 
-         WHERE req_id = $1`,
-        [req_id]
-      );
-    }
-
     return res.status(200).json({
       success: true,
       message: 'Document uploaded successfully',
-      document: insertResult.rows[0],
+      document: withDocumentUrl(insertResult.rows[0]),
       url: s3Url,
     });
   } catch (error) {
+    // Raised by claim_document_slot() for a month whose quarter is archived
+    if (error.code === '23514') {
+      return res.status(409).json({
+        success: false,
+        message: error.message,
+      });
+    }
     console.error('Upload document error:', error);
     return res.status(500).json({
       success: false,
@@ -543,9 +635,11 @@ router.post('/upload-document', requireAuth, upload.single('file'), async (req,
 
 /**
  * DELETE /api/idr/delete-document
- * Delete a document from S3 and update/remove row from document_master table
- * - If last document: Delete from S3, set document_url to NULL (keep row)
- * - If multiple documents: Delete from S3, delete the entire row
+ * Delete a document and update/remove row from document_master table
+ * - If last document: clear its object_key (keep row)
+ * - If multiple documents: delete the entire row
+ * The S3 object is queued for deletion by a document_master trigger once no other document
+ * shares it (see document_blob in schema.py and scripts/s3_purge.js)
  */
 router.delete('/delete-document', requireAuth, async (req, res) => {
   try {
@@ -559,9 +653,9 @@ router.delete('/delete-document', requireAuth, async (req, res) => {
       });
     }
 
-    // Get document URL from document_master by ID
+    // Get the uploaded object of the document by ID
     const docResult = await pool.query(
-      `SELECT document_url FROM document_master 
+      `SELECT object_key FROM document_master 
        WHERE id = $1`,
       [document_id]
     );
@@ -573,50 +667,30 @@ router.delete('/delete-document', requireAuth, async (req, res) => {
       });
     }
 
-    const documentUrl = docResult.rows[0].document_url;
-
-    if (!documentUrl) {
+    if (!docResult.rows[0].object_key) {
       return res.status(400).json({
         success: false,
         message: 'Document URL not found',
       });
     }
 
-    // Count how many rows with document_url exist for this req_id, document_type, year, month
+    // Count how many uploaded rows exist for this req_id, document_type, year, month
     const countResult = await pool.query(
       `SELECT COUNT(*) as count FROM document_master 
-       WHERE req_id = $1 AND document_type = $2 AND year = $3 AND month = $4 AND document_url IS NOT NULL`,
+       WHERE req_id = $1 AND document_type = $2 AND period = ${documentPeriod('$3', '$4')} AND object_key IS NOT NULL`,
       [req_id, document_type, year, month]
     );
 
     const documentCount = parseInt(countResult.rows[0].count, 10);
 
-    // Delete from S3
-    try {
-      // Extract S3 key from URL
-      // URL format: https://bucket-name.s3.region.amazonaws.com/key
-      const urlParts = documentUrl.split('.amazonaws.com/');
-      if (urlParts.length === 2) {
-        const s3Key = urlParts[1];
-        const deleteParams = {
-          Bucket: S3_BUCKET_NAME,
-          Key: s3Key,
-        };
-        await s3Client.send(new DeleteObjectCommand(deleteParams));
-      }
-    } catch (s3Error) {
-      console.error('S3 delete error:', s3Error);
-      // Continue to update database even if S3 delete fails
-    }
-
     let result;
     if (documentCount === 1) {
-      // Last document: Set document_url to NULL but keep the row
+      // Last document: clear its object but keep the row
       const updateResult = await pool.query(
         `UPDATE document_master 
-         SET document_url = NULL, modified_time = NOW() AT TIME ZONE 'Asia/Kolkata'
+         SET object_key = NULL, modified_time = NOW() AT TIME ZONE 'Asia/Kolkata'
          WHERE id = $1
-         RETURNING id, req_id, document_type, document_url, modified_time, year, month`,
+         RETURNING id, req_id, document_type, object_key, modified_time, ${YEAR_MONTH}`,
         [document_id]
       );
 
@@ -627,13 +701,13 @@ router.delete('/delete-document', requireAuth, async (req, res) => {
         });
       }
 
-      result = updateResult.rows[0];
+      result = withDocumentUrl(updateResult.rows[0]);
     } else {
       // Multiple documents: Delete the entire row
       const deleteResult = await pool.query(
         `DELETE FROM document_master 
          WHERE id = $1
-         RETURNING id, req_id, document_type, document_url, modified_time, year, month`,
+         RETURNING id, req_id, document_type, object_key, modified_time, ${YEAR_MONTH}`,
         [document_id]
       );
 
@@ -644,7 +718,7 @@ router.delete('/delete-document', requireAuth, async (req, res) => {
         });
       }
 
-      result = deleteResult.rows[0];
+      result = withDocumentUrl(deleteResult.rows[0]);
     }
 
     return res.status(200).json({
@@ -666,7 +740,7 @@ router.delete('/delete-document', requireAuth, async (req, res) => {
  * POST /api/idr/replace-document
  * Replace a rejected document with a new upload in the same row
  */
-router.post('/replace-document', requireAuth, upload.single('file'), async (req, res) => {
+router.post('/replace-document', requireAuth, singleFileUpload(replacementUpload, 'file'), async (req, res) => {
   try {
     const { document_id } = req.body;
 
@@ -684,114 +758,22 @@ router.post('/replace-document', requireAuth, upload.single('file'), async (req,
       });
     }
 
-    // Get existing document row (to know req_id, type, year, month and current URL)
-    const docResult = await pool.query(
-      `SELECT dm.id, dm.req_id, dm.document_type, dm.document_url, dm.year, dm.month, im.plaza_name, im.scope_name
-       FROM document_master dm
-       JOIN idr_master im ON dm.req_id = im.req_id
-       WHERE dm.id = $1`,
-      [document_id]
-    );
+    // The new file has already been streamed to S3 (or matched a stored blob) by replacementUpload,
+    // which also loaded the existing row
+    // The old file is queued for S3 deletion by a document_master trigger once no row references it
 
-    if (docResult.rows.length === 0) {
-      return res.status(404).json({
-        success: false,
-        message: 'Document not found',
-      });
-    }
-
-    const existing = docResult.rows[0];
-    const { req_id, document_type, document_url, year, month, plaza_name, scope_name } = existing;
-
-    if (!plaza_name || !scope_name) {
-      return res.status(400).json({
-        success: false,
-        message: 'Plaza name or scope name not found for this request',
-      });
-    }
-
-    // Upload new file to S3
-    const originalFileName = req.file.originalname;
-    const s3Key = `IDR/${plaza_name}/${scope_name}/${document_type}/${month}-${year}/${originalFileName}`;
-
-    const uploadParams = {
-      Bucket: S3_BUCKET_NAME,
-      Key: s3Key,
-      Body: req.file.buffer,
-      ContentType: req.file.mimetype,
-    };
-
-    await s3Client.send(new PutObjectCommand(uploadParams));
-
-    const s3Url = `https://${S3_BUCKET_NAME}.s3.${process.env.AWS_REGION || 'us-east-1'}.amazonaws.com/${s3Key}`;
-
-    // Delete old file from S3 if it exists
-    if (document_url) {
-      try {
-        const urlParts = document_url.split('.amazonaws.com/');
-        if (urlParts.length === 2) {
-          const oldKey = urlParts[1];
-          const deleteParams = {
-            Bucket: S3_BUCKET_NAME,
-            Key: oldKey,
-          };
-          await s3Client.send(new DeleteObjectCommand(deleteParams));
-        }
-      } catch (s3Error) {
-        console.error('S3 delete (replace) error:', s3Error);
-        // continue even if old delete fails
-      }
-    }
-
-    // Get current datetime in Mumbai timezone
-    const modifiedTimeResult = await pool.query(
-      "SELECT NOW() AT TIME ZONE 'Asia/Kolkata' as current_time"
-    );
-    const modifiedTime = modifiedTimeResult.rows[0].current_time;
-
-    // Update same row with new URL and clear rejection
+    // Update same row with new object and clear rejection; marks the request 'Done' when
+    // this was its last missing or rejected document (see claim_document_slot in schema.py)
     const updateResult = await pool.query(
-      `UPDATE document_master
-       SET document_url = $1,
-           modified_time = $2,
-           is_rejected = FALSE,
-           reason = NULL
-       WHERE id = $3
-       RETURNING id, req_id, document_type, document_url, modified_time, year, month, is_rejected, reason`,
-      [s3Url, modifiedTime, document_id]
+      `SELECT id, req_id, document_type, object_key, modified_time, ${YEAR_MONTH}, is_rejected, reason
+       FROM claim_document_slot(NULL, NULL, NULL, $1, $2)`,
+      [req.file.key, document_id]
     );
 
-    // Check if all documents for this req_id are uploaded and not rejected
-    // If so, mark the request as 'Done' in idr_master
-    const allDocumentsCheck = await pool.query(
-      `SELECT 
-        COUNT(*) as total_rows,
-        COUNT(CASE WHEN document_url IS NOT NULL THEN 1 END) as rows_with_url,
-        COUNT(CASE WHEN is_rejected = TRUE THEN 1 END) as rejected_rows
-      FROM document_master 
-      WHERE req_id = $1`,
-      [req_id]
-    );
-
-    const { total_rows, rows_with_url, rejected_rows } = allDocumentsCheck.rows[0];
-    const totalRows = parseInt(total_rows, 10);
-    const rowsWithUrl = parseInt(rows_with_url, 10);
-    const rejectedRows = parseInt(rejected_rows, 10);
-
-    // If all rows have document_url and none are rejected, mark as Done
-    if (totalRows > 0 && totalRows === rowsWithUrl && rejectedRows === 0) {
-      await pool.query(
-        `UPDATE idr_master 
-         SET done = 'Done' 
-         WHERE req_id = $1`,
-        [req_id]
-      );
-    }
-
     return res.status(200).json({
       success: true,
       message: 'Document replaced successfully',
-      document: updateResult.rows[0],
+      document: withDocumentUrl(updateResult.rows[0]),
     });
   } catch (error) {
     console.error('Replace document error:', error);
@@ -823,18 +805,21 @@ router.get('/document-counts', requireAuth, async (req, res) => {
     const reqIdArray = Array.isArray(req_ids) ? req_ids : req_ids.split(',').map(id => id.trim());
 
     // Get document counts for each req_id, year, month combination
+    // im.req_id = ANY($1) repeats the join condition on purpose: it is a planner hint that keeps
+    // idr_master on its req_id index instead of a sequential scan (see HOT_QUERIES in query_plans.py)
     const result = await pool.query(
       `SELECT 
         dm.req_id,
-        im.plaza_name,
-        dm.year,
-        dm.month,
+        p.name AS plaza_name,
+        ${YEAR_MONTH},
         COUNT(*) as document_count
       FROM document_master dm
       INNER JOIN idr_master im ON dm.req_id = im.req_id
+      LEFT JOIN plaza p ON p.id = im.plaza_id
       WHERE dm.req_id = ANY($1::text[]) 
-        AND dm.document_url IS NOT NULL
-      GROUP BY dm.req_id, im.plaza_name, dm.year, dm.month`,
+        AND im.req_id = ANY($1::text[])
+        AND dm.object_key IS NOT NULL
+      GROUP BY dm.req_id, p.name, dm.period`,
       [reqIdArray]
     );
 
@@ -872,21 +857,20 @@ router.get('/plaza-documents', requireAuth, async (req, res) => {
         id,
         req_id,
         document_type,
-        document_url,
+        object_key,
         modified_time,
-        year,
-        month,
+        ${YEAR_MONTH},
         is_rejected,
         reason
       FROM document_master 
-      WHERE req_id = $1 AND year = $2 AND month = $3 AND document_url IS NOT NULL
+      WHERE req_id = $1 AND period = ${documentPeriod('$2', '$3')} AND object_key IS NOT NULL
       ORDER BY document_type, modified_time`,
       [req_id, year, month]
     );
 
     return res.status(200).json({
       success: true,
-      documents: result.rows,
+      documents: result.rows.map(withDocumentUrl),
     });
   } catch (error) {
     console.error('Get plaza documents error:', error);
@@ -898,159 +882,270 @@ router.get('/plaza-documents', requireAuth, async (req, res) => {
 });
 
 /**
- * POST /api/idr/reject-documents
- * Reject selected documents by updating is_rejected and reason columns
+ * GET /api/idr/overview
+ * Plaza x month grid of one IDR run in a single query: every request of the run with its
+ * total, filled and rejected slots per month. Replaces /submitted-requests + /document-counts
+ * on the request detail page.
+ * Query: scope_name ("all" or a scope), from_date, to_date, optional due_date.
+ * Responses carry an ETag; a matching If-None-Match is answered 304 after reading only the
+ * run's idr_master and request_progress rows.
+ * Only live documents are counted: months of archived quarters (db_init.py archive-partitions)
+ * have no cells.
  */
-router.post('/reject-documents', requireAuth, async (req, res) => {
+router.get('/overview', requireAuth, async (req, res) => {
   try {
-    const { document_ids, reason } = req.body;
+    const { scope_name, from_date, to_date, due_date } = req.query;
 
-    // Validate input
-    if (!document_ids || !Array.isArray(document_ids) || document_ids.length === 0) {
+    if (!scope_name || !from_date || !to_date) {
       return res.status(400).json({
         success: false,
-        message: 'Document IDs array is required',
+        message: 'Scope name, from date, and to date are required',
       });
     }
 
-    if (!reason || reason.trim() === '') {
-      return res.status(400).json({
-        success: false,
-        message: 'Reason is required',
-      });
+    const params = [];
+    const param = (value) => {
+      params.push(value);
+      return `$${params.length}`;
+    };
+    // Same date handling and sort key as /submitted-requests, so the run is read from
+    // idx_idr_master_scope_submitted / idx_idr_master_submitted
+    const istDate = (value) => `(${param(value)}::timestamptz AT TIME ZONE 'Asia/Kolkata')::date`;
+    const conditions = [
+      `COALESCE(im.from_date, 'infinity'::date) = ${istDate(from_date)}`,
+      `COALESCE(im.to_date, 'infinity'::date) = ${istDate(to_date)}`,
+    ];
+    if (scope_name !== 'all') {
+      conditions.push(`im.scope_id = ${scopeIdByName(param(scope_name))}`);
     }
-
-    // Get current datetime in Mumbai timezone
-    const modifiedTimeResult = await pool.query(
-      "SELECT NOW() AT TIME ZONE 'Asia/Kolkata' as current_time"
-    );
-    const modifiedTime = modifiedTimeResult.rows[0].current_time;
-
-    // Update all selected documents
-    const updateResult = await pool.query(
-      `UPDATE document_master 
-       SET is_rejected = TRUE, reason = $1, modified_time = $2
-       WHERE id = ANY($3::int[])
-       RETURNING id, req_id, document_type, document_url, is_rejected, reason, modified_time, year, month`,
-      [reason.trim(), modifiedTime, document_ids]
-    );
-
-    // Get unique req_ids from rejected documents
-    const uniqueReqIds = [...new Set(updateResult.rows.map(doc => doc.req_id))];
-
-    // For each req_id, check if it's marked as 'Done' and clear it if so
-    for (const reqId of uniqueReqIds) {
-      const idrCheck = await pool.query(
-        `SELECT done FROM idr_master WHERE req_id = $1`,
-        [reqId]
+    if (due_date) {
+      conditions.push(`COALESCE(im.due_date, 'infinity'::date) = ${istDate(due_date)}`);
+    }
+    const requests = `idr_master im
+      LEFT JOIN plaza p ON p.id = im.plaza_id
+      LEFT JOIN scope s ON s.id = im.scope_id`;
+
+    res.set('Cache-Control', 'private, no-cache');
+
+    if (req.get('If-None-Match')) {
+      const revisions = await pool.query(
+        `SELECT ${OVERVIEW_REVISION}
+         FROM ${requests}
+         WHERE ${conditions.join(' AND ')}
+         ORDER BY ${SUBMITTED_REQUESTS_SORT}`,
+        params
       );
-
-      if (idrCheck.rows.length > 0 && idrCheck.rows[0].done === 'Done') {
-        // Clear the done status since documents are now rejected
-        await pool.query(
-          `UPDATE idr_master SET done = NULL WHERE req_id = $1`,
-          [reqId]
-        );
+      res.set('ETag', overviewETag(revisions.rows));
+      if (req.fresh) {
+        return res.status(304).end();
       }
     }
 
-    // Send rejection emails
-    try {
-      // Group rejected documents by req_id to send one email per plaza
-      const documentsByReqId = new Map();
-      updateResult.rows.forEach(doc => {
-        if (!documentsByReqId.has(doc.req_id)) {
-          documentsByReqId.set(doc.req_id, []);
-        }
-        documentsByReqId.get(doc.req_id).push(doc);
-      });
-
-      // Send email for each unique req_id (plaza)
-      for (const [reqId, docs] of documentsByReqId.entries()) {
-        // Get plaza_name from idr_master
-        const idrResult = await pool.query(
-          `SELECT plaza_name FROM idr_master WHERE req_id = $1 LIMIT 1`,
-          [reqId]
-        );
-
-        if (idrResult.rows.length === 0 || !idrResult.rows[0].plaza_name) {
-          console.error(`Plaza name not found for req_id: ${reqId}`);
-          continue;
-        }
-
-        const plazaName = idrResult.rows[0].plaza_name;
-
-        // Get email_id from users table using plaza_name
-        const userResult = await pool.query(
-          `SELECT email_id FROM users WHERE plaza_name = $1 LIMIT 1`,
-          [plazaName]
-        );
-
-        if (userResult.rows.length === 0 || !userResult.rows[0].email_id) {
-          console.error(`Email ID not found for plaza: ${plazaName}`);
-          continue;
-        }
-
-        const emailId = userResult.rows[0].email_id;
-
-        // Format month names
-        const monthNames = [
-          "January", "February", "March", "April", "May", "June",
-          "July", "August", "September", "October", "November", "December"
-        ];
+    const result = await pool.query(
+      `SELECT 
+        im.id,
+        p.name AS plaza_name,
+        im.request_datetime,
+        im.due_date,
+        im.from_date,
+        im.to_date,
+        s.scope_name,
+        im.req_id,
+        ${DONE_STATUS},
+        COALESCE(cells.cells, '[]') AS cells,
+        ${OVERVIEW_REVISION}
+      FROM ${requests}
+      LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+          'year', to_char(c.period, 'YYYY'),
+          'month', to_char(c.period, 'MM'),
+          'total_slots', c.total_slots,
+          'filled_slots', c.filled_slots,
+          'rejected_slots', c.rejected_slots
+        ) ORDER BY c.period) AS cells
+        FROM (
+          SELECT dm.period,
+                 COUNT(*) AS total_slots,
+                 COUNT(dm.object_key) AS filled_slots,
+                 COUNT(*) FILTER (WHERE dm.is_rejected) AS rejected_slots
+          FROM document_master dm
+          WHERE dm.req_id = im.req_id
+            AND dm.period BETWEEN date_trunc('month', im.from_date)::date AND im.to_date
+          GROUP BY dm.period
+        ) c
+      ) cells ON TRUE
+      WHERE ${conditions.join(' AND ')}
+      ORDER BY ${SUBMITTED_REQUESTS_SORT}`,
+      params
+    );
 
-        // Build document list
-        const documentList = docs.map(doc => {
-          const monthName = monthNames[parseInt(doc.month) - 1] || doc.month;
-          return `- ${doc.document_type} (${monthName} ${doc.year})`;
-        }).join('\n');
+    res.set('ETag', overviewETag(result.rows));
+    return res.status(200).json({
+      success: true,
+      records: result.rows.map(({ revision, ...record }) => record),
+    });
+  } catch (error) {
+    console.error('Get request overview error:', error);
+    return res.status(500).json({
+      success: false,
+      message: 'Internal server error',
+    });
+  }
+});
 
-        // Get login URL from environment or use default
-        const loginUrl = process.env.FRONTEND_URL || 'http://localhost:5174';
-        const fullLoginUrl = `${loginUrl}/login`;
+/**
+ * POST /api/idr/cell-documents
+ * Uploaded documents of several plaza/month cells at once, for prefetching the cells of
+ * /overview. Body: { cells: [{ req_id, year, month }] } (at most MAX_DOCUMENT_CELLS).
+ * Documents are returned in the /plaza-documents shape, ordered by cell.
+ * Like /overview, this reads live documents only; archived quarters return none.
+ */
+router.post('/cell-documents', requireAuth, async (req, res) => {
+  try {
+    const { cells } = req.body;
 
-        // Create email body
-        const emailBody = `
-Dear User,
+    if (!Array.isArray(cells) || cells.length === 0) {
+      return res.status(400).json({
+        success: false,
+        message: 'Cells are required',
+      });
+    }
 
-Your documents have been rejected. Please review the details below and replace them.
+    if (cells.length > MAX_DOCUMENT_CELLS) {
+      return res.status(400).json({
+        success: false,
+        message: `At most ${MAX_DOCUMENT_CELLS} cells can be requested at once`,
+      });
+    }
 
-Reason for Rejection:
-${reason.trim()}
+    const reqIds = [];
+    const years = [];
+    const months = [];
+    for (const cell of cells) {
+      const year = Number(cell && cell.year);
+      const month = Number(cell && cell.month);
+      if (!cell || !cell.req_id || !Number.isInteger(year) || !Number.isInteger(month) || month < 1 || month > 12) {
+        return res.status(400).json({
+          success: false,
+          message: 'Every cell needs a request ID, year, and month',
+        });
+      }
+      reqIds.push(String(cell.req_id));
+      years.push(year);
+      months.push(month);
+    }
 
-Rejected Documents:
-${documentList}
+    const result = await pool.query(
+      `SELECT 
+        dm.id,
+        dm.req_id,
+        dm.document_type,
+        dm.object_key,
+        dm.modified_time,
+        ${YEAR_MONTH},
+        dm.is_rejected,
+        dm.reason
+      FROM (
+        SELECT DISTINCT req_id, ${documentPeriod('year', 'month')} AS cell_period
+        FROM unnest($1::text[], $2::int[], $3::int[]) AS c(req_id, year, month)
+      ) c
+      JOIN document_master dm ON dm.req_id = c.req_id AND dm.period = c.cell_period
+      WHERE dm.object_key IS NOT NULL
+      ORDER BY dm.req_id, dm.period, dm.document_type, dm.modified_time`,
+      [reqIds, years, months]
+    );
 
-Please log in to the IDR Portal using the link below and replace the rejected documents:
-${fullLoginUrl}
+    return res.status(200).json({
+      success: true,
+      documents: result.rows.map(withDocumentUrl),
+    });
+  } catch (error) {
+    console.error('Get cell documents error:', error);
+    return res.status(500).json({
+      success: false,
+      message: 'Internal server error',
+    });
+  }
+});
 
-After logging in, navigate to your document requests and replace the rejected documents with corrected versions.
+/**
+ * POST /api/idr/reject-documents
+ * Reject selected documents by updating is_rejected and reason columns
+ */
+router.post('/reject-documents', requireAuth, async (req, res) => {
+  try {
+    const { document_ids, reason } = req.body;
 
-If you have any questions or need assistance, please contact the administrator.
+    // Validate input
+    if (!document_ids || !Array.isArray(document_ids) || document_ids.length === 0) {
+      return res.status(400).json({
+        success: false,
+        message: 'Document IDs array is required',
+      });
+    }
 
-Best regards,
-Sharp and Tannan Associates
-        `.trim();
+    if (!reason || reason.trim() === '') {
+      return res.status(400).json({
+        success: false,
+        message: 'Reason is required',
+      });
+    }
 
-        // Send email
-        await transporter.sendMail({
-          from: process.env.SMTP_USER,
-          to: emailId,
-          subject: 'Document Rejection Notification - IDR Portal',
-          text: emailBody,
-        });
+    // Reject the documents, take their requests out of 'Done' and queue one rejection
+    // email per plaza (documents grouped, every plaza user as recipient) in one statement.
+    // The email is sent by scripts/rejection_email.js, not inside this request.
+    // Done requests have no reminder date, so reopened ones are put back on the reminder schedule.
+    const updateResult = await pool.query(
+      `WITH rejected AS (
+         UPDATE document_master
+         SET is_rejected = TRUE, reason = $1, modified_time = NOW() AT TIME ZONE 'Asia/Kolkata'
+         WHERE id = ANY($2::int[])
+         RETURNING id, req_id, document_type, object_key, is_rejected, reason, modified_time, ${YEAR_MONTH}
+       ),
+       reopened AS (
+         UPDATE idr_master im
+         SET done = FALSE,
+             reminder_email_datetime = COALESCE(
+               im.reminder_email_datetime,
+               NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(days => $3)
+             )
+         WHERE im.req_id IN (SELECT req_id FROM rejected)
+           AND im.done
+       ),
+       queued AS (
+         INSERT INTO email_outbox (kind, payload)
+         SELECT 'document_rejection',
+                jsonb_build_object(
+                  'plaza_name', p.name,
+                  'reason', $1::text,
+                  'recipients', COALESCE(r.recipients, '[]'::jsonb),
+                  'documents', jsonb_agg(
+                    jsonb_build_object('document_type', d.document_type, 'year', d.year, 'month', d.month)
+                    ORDER BY d.year, d.month, d.document_type
+                  )
+                )
+         FROM rejected d
+         JOIN idr_master im ON im.req_id = d.req_id
+         JOIN plaza p ON p.id = im.plaza_id
+         LEFT JOIN LATERAL (
+           SELECT jsonb_agg(email_id ORDER BY email_id) AS recipients
+           FROM users
+           WHERE plaza_id = im.plaza_id AND email_id IS NOT NULL
+         ) r ON TRUE
+         GROUP BY p.id, p.name, r.recipients
+         RETURNING id
+       )
+       SELECT * FROM rejected ORDER BY id`,
+      [reason.trim(), document_ids, REMINDER_INTERVAL_DAYS]
+    );
 
-        console.log(`Rejection email sent to ${emailId} for plaza ${plazaName}`);
-      }
-    } catch (emailError) {
-      console.error('Error sending rejection emails:', emailError);
-      // Don't fail the request if email fails, just log the error
-    }
+    // Hand the queued emails to the sender right away instead of waiting for its next tick
+    processRejectionEmails();
 
     return res.status(200).json({
       success: true,
       message: `Successfully rejected ${updateResult.rows.length} document(s)`,
-      documents: updateResult.rows,
+      documents: updateResult.rows.map(withDocumentUrl),
     });
   } catch (error) {
     console.error('Reject documents error:', error);
@@ -1064,8 +1159,9 @@ Sharp and Tannan Associates
 
 /**
  * DELETE /api/idr/request
- * Delete a request completely: delete all documents from S3, then delete from document_master and idr_master
+ * Delete a request completely: delete from document_master and idr_master
  * Filters by scope_name, from_date, and to_date to get all related req_ids
+ * Uploaded files, archived ones included, are queued for S3 deletion by the document_blob triggers (see scripts/s3_purge.js)
  */
 router.delete('/request', requireAuth, async (req, res) => {
   const client = await pool.connect();
@@ -1101,7 +1197,7 @@ router.delete('/request', requireAuth, async (req, res) => {
     // Use CAST to ensure proper date comparison
     const idrResult = await client.query(
       `SELECT req_id FROM idr_master 
-       WHERE scope_name = $1 AND from_date = $2::DATE AND to_date = $3::DATE`,
+       WHERE scope_id = ${scopeIdByName('$1')} AND from_date = $2::DATE AND to_date = $3::DATE`,
       [scope_name, fromDateOnly, toDateOnly]
     );
 
@@ -1116,55 +1212,24 @@ router.delete('/request', requireAuth, async (req, res) => {
 
     const reqIds = idrResult.rows.map(row => row.req_id);
 
-    // Get all document_master rows for all these req_ids
+    // Delete all rows from document_master and document_master_archive for all these req_ids
     const documentsResult = await client.query(
-      `SELECT id, document_url FROM document_master 
-       WHERE req_id = ANY($1::text[]) AND document_url IS NOT NULL`,
-      [reqIds]
-    );
-
-    const documents = documentsResult.rows;
-
-    // Delete all documents from S3 first
-    const s3DeleteErrors = [];
-    for (const doc of documents) {
-      if (doc.document_url) {
-        try {
-          // Extract S3 key from URL
-          // URL format: https://bucket-name.s3.region.amazonaws.com/key
-          const urlParts = doc.document_url.split('.amazonaws.com/');
-          if (urlParts.length === 2) {
-            const s3Key = urlParts[1];
-            const deleteParams = {
-              Bucket: S3_BUCKET_NAME,
-              Key: s3Key,
-            };
-            await s3Client.send(new DeleteObjectCommand(deleteParams));
-            console.log(`Deleted S3 object: ${s3Key}`);
-          }
-        } catch (s3Error) {
-          console.error(`Error deleting S3 object for document ${doc.id}:`, s3Error);
-          s3DeleteErrors.push({ document_id: doc.id, error: s3Error.message });
-          // Continue with other deletions even if one fails
-        }
-      }
-    }
-
-    // If there were S3 deletion errors, log them but continue with database deletion
-    if (s3DeleteErrors.length > 0) {
-      console.error('Some S3 deletions failed:', s3DeleteErrors);
-    }
-
-    // Delete all rows from document_master for all these req_ids
-    await client.query(
-      'DELETE FROM document_master WHERE req_id = ANY($1::text[])',
+      `WITH deleted AS (
+         DELETE FROM document_master WHERE req_id = ANY($1::text[])
+         RETURNING object_key
+       ),
+       archived AS (
+         DELETE FROM document_master_archive WHERE req_id = ANY($1::text[])
+         RETURNING object_key
+       )
+       SELECT (SELECT COUNT(object_key) FROM deleted) + (SELECT COUNT(object_key) FROM archived) AS uploaded`,
       [reqIds]
     );
 
     // Delete all rows from idr_master matching the filter (after document_master deletion)
     await client.query(
       `DELETE FROM idr_master 
-       WHERE scope_name = $1 AND from_date = $2::DATE AND to_date = $3::DATE`,
+       WHERE scope_id = ${scopeIdByName('$1')} AND from_date = $2::DATE AND to_date = $3::DATE`,
       [scope_name, fromDateOnly, toDateOnly]
     );
 
@@ -1176,8 +1241,7 @@ router.delete('/request', requireAuth, async (req, res) => {
       success: true,
       message: `Request and all associated documents deleted successfully`,
       deletedRequests: reqIds.length,
-      deletedDocuments: documents.length,
-      s3Errors: s3DeleteErrors.length > 0 ? s3DeleteErrors : undefined,
+      deletedDocuments: parseInt(documentsResult.rows[0].uploaded, 10),
     });
   } catch (error) {
     await client.query('ROLLBACK');
@@ -1,6 +1,7 @@
 const express = require('express');
 const { pool } = require('../config/db');
 const { requireAuth } = require('../middleware/auth');
+const { findScope, listScopes } = require('../utils/referenceData');
 
 const router = express.Router();
 
@@ -12,20 +13,37 @@ router.post('/', requireAuth, async (req, res) => {
   try {
     const { scope_name, required_documents } = req.body;
 
+    // Trimmed document types without blanks or repeats, in the order given
+    const documentTypes = [...new Set(
+      String(required_documents || '')
+        .split(',')
+        .map((doc) => doc.trim())
+        .filter((doc) => doc.length > 0)
+    )];
+
     // Validate input
-    if (!scope_name || !required_documents) {
+    if (!scope_name || documentTypes.length === 0) {
       return res.status(400).json({
         success: false,
         message: 'Scope name and required documents are required',
       });
     }
 
-    // Insert new scope
+    // Insert the scope and its documents in one statement
     const result = await pool.query(
-      `INSERT INTO scope (scope_name, required_documents)
-       VALUES ($1, $2)
-       RETURNING id, scope_name, required_documents`,
-      [scope_name, required_documents]
+      `WITH created AS (
+         INSERT INTO scope (scope_name)
+         VALUES ($1)
+         RETURNING id, scope_name
+       ),
+       documents AS (
+         INSERT INTO scope_document (scope_id, position, document_type)
+         SELECT created.id, d.position, d.document_type
+         FROM created, unnest($2::text[]) WITH ORDINALITY AS d(document_type, position)
+       )
+       SELECT id, scope_name, $3::text AS required_documents
+       FROM created`,
+      [scope_name, documentTypes, documentTypes.join(', ')]
     );
 
     return res.status(201).json({
@@ -52,13 +70,10 @@ router.get('/', requireAuth, async (req, res) => {
     const { scope_name } = req.query;
 
     if (scope_name) {
-      // Get specific scope by name
-      const result = await pool.query(
-        'SELECT id, scope_name, required_documents FROM scope WHERE scope_name = $1',
-        [scope_name]
-      );
+      // Get specific scope by name (the oldest one if the name is used twice)
+      const scope = await findScope(scope_name);
 
-      if (result.rows.length === 0) {
+      if (!scope) {
         return res.status(404).json({
           success: false,
           message: 'Scope not found',
@@ -67,17 +82,13 @@ router.get('/', requireAuth, async (req, res) => {
 
       return res.status(200).json({
         success: true,
-        scope: result.rows[0],
+        scope,
       });
     } else {
       // Get all scopes
-      const result = await pool.query(
-        'SELECT id, scope_name, required_documents FROM scope ORDER BY scope_name'
-      );
-
       return res.status(200).json({
         success: true,
-        scopes: result.rows,
+        scopes: await listScopes(),
       });
     }
   } catch (error) {
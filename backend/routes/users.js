@@ -4,10 +4,31 @@ const multer = require('multer');
 const XLSX = require('xlsx');
 const { pool } = require('../config/db');
 const { requireAuth } = require('../middleware/auth');
+const { PaginationError, parseLimit, decodeCursor, toPage } = require('../utils/pagination');
+const { assignedPlazaNames, unassignedClients } = require('../utils/referenceData');
 
 const router = express.Router();
 const upload = multer({ storage: multer.memoryStorage() });
 
+// Sort key of /all; must match idx_users_created in schema.py.
+// NULL created_at sorts first, as with the plain ORDER BY created_at DESC it replaces.
+const USERS_SORT = "COALESCE(u.created_at, 'infinity'::timestamp), u.id";
+const USERS_SORT_DESC = "COALESCE(u.created_at, 'infinity'::timestamp) DESC, u.id DESC";
+
+// Plaza row for a plaza name ($1, stored lowercase), created on first use. A row inserted
+// here is not visible to the SELECT of the same statement, so exactly one branch returns it.
+const ASSIGNED_PLAZA_CTE = `
+  inserted AS (
+    INSERT INTO plaza (name) VALUES (LOWER($1))
+    ON CONFLICT (name) DO NOTHING
+    RETURNING id, name
+  ),
+  assigned AS (
+    SELECT id, name FROM inserted
+    UNION ALL
+    SELECT id, name FROM plaza WHERE name = LOWER($1)
+  )`;
+
 router.post('/', async (req, res) => {
   try {
     const { name, designation, email_id, mob_no, user_code, role } = req.body;
@@ -60,7 +81,11 @@ router.post('/', async (req, res) => {
 router.get('/me', requireAuth, async (req, res) => {
   try {
     const result = await pool.query(
-      'SELECT id, name, email_id, role, designation, mob_no, user_code, temp_login, plaza_name FROM users WHERE id = $1',
+      `SELECT u.id, u.name, u.email_id, u.role, u.designation, u.mob_no, u.user_code, u.temp_login,
+              p.name AS plaza_name
+       FROM users u
+       LEFT JOIN plaza p ON p.id = u.plaza_id
+       WHERE u.id = $1`,
       [req.user.id]
     );
 
@@ -273,18 +298,13 @@ router.post('/bulk', upload.single('file'), async (req, res) => {
 
 /**
  * GET /api/users/clients
- * Get all client email addresses that don't have a plaza_name assigned
+ * Get all client email addresses that don't have a plaza assigned
  */
 router.get('/clients', requireAuth, async (req, res) => {
   try {
-    const result = await pool.query(
-      'SELECT id, email_id, name FROM users WHERE LOWER(role) = LOWER($1) AND (plaza_name IS NULL OR plaza_name = \'\') ORDER BY email_id',
-      ['client']
-    );
-
     return res.status(200).json({
       success: true,
-      clients: result.rows,
+      clients: await unassignedClients(),
     });
   } catch (error) {
     console.error('Get clients error:', error);
@@ -297,18 +317,13 @@ router.get('/clients', requireAuth, async (req, res) => {
 
 /**
  * GET /api/users/plazas
- * Get all unique plaza names from users table where plaza_name is not null
+ * Get the names of all plazas that have at least one user assigned
  */
 router.get('/plazas', requireAuth, async (req, res) => {
   try {
-    const result = await pool.query(
-      'SELECT DISTINCT plaza_name FROM users WHERE plaza_name IS NOT NULL AND plaza_name != \'\' ORDER BY plaza_name',
-      []
-    );
-
     return res.status(200).json({
       success: true,
-      plazas: result.rows.map(row => row.plaza_name),
+      plazas: await assignedPlazaNames(),
     });
   } catch (error) {
     console.error('Get plazas error:', error);
@@ -327,7 +342,7 @@ router.get('/statistics', requireAuth, async (req, res) => {
   try {
     // Get total unique plaza count
     const plazaResult = await pool.query(
-      'SELECT COUNT(DISTINCT plaza_name) as total FROM users WHERE plaza_name IS NOT NULL AND plaza_name != \'\''
+      'SELECT COUNT(DISTINCT plaza_id) as total FROM users WHERE plaza_id IS NOT NULL'
     );
     const totalPlazas = parseInt(plazaResult.rows[0].total, 10);
 
@@ -355,30 +370,67 @@ router.get('/statistics', requireAuth, async (req, res) => {
 
 /**
  * GET /api/users/all
- * Get all users
+ * Keyset-paginated users, newest first (created_at DESC, id DESC).
+ * Query: optional role, plaza_name, limit and cursor (next_cursor of the previous page).
+ * Backed by idx_users_created in schema.py.
  */
 router.get('/all', requireAuth, async (req, res) => {
   try {
+    const { role, plaza_name, cursor } = req.query;
+    const limit = parseLimit(req.query.limit);
+    const after = decodeCursor(cursor, 2);
+
+    const params = [];
+    const conditions = [];
+    const param = (value) => {
+      params.push(value);
+      return `$${params.length}`;
+    };
+
+    if (role) {
+      conditions.push(`u.role = ${param(role)}`);
+    }
+    if (plaza_name) {
+      conditions.push(`u.plaza_id = (SELECT id FROM plaza WHERE name = ${param(plaza_name)})`);
+    }
+    if (after) {
+      conditions.push(`(${USERS_SORT}) < (${param(after[0])}::timestamp, ${param(after[1])}::int)`);
+    }
+
     const result = await pool.query(
       `SELECT 
-        id,
-        name,
-        email_id,
-        designation,
-        mob_no,
-        user_code,
-        role,
-        plaza_name,
-        created_at
-      FROM users 
-      ORDER BY created_at DESC`
+        u.id,
+        u.name,
+        u.email_id,
+        u.designation,
+        u.mob_no,
+        u.user_code,
+        u.role,
+        p.name AS plaza_name,
+        u.created_at,
+        json_build_array(${USERS_SORT}) AS sort_key
+      FROM users u
+      LEFT JOIN plaza p ON p.id = u.plaza_id
+      ${conditions.length > 0 ? `WHERE ${conditions.join(' AND ')}` : ''}
+      ORDER BY ${USERS_SORT_DESC}
+      LIMIT ${param(limit + 1)}`,
+      params
     );
 
+    const { rows, nextCursor } = toPage(result.rows, limit);
+
     return res.status(200).json({
       success: true,
-      users: result.rows,
+      users: rows,
+      next_cursor: nextCursor,
     });
   } catch (error) {
+    if (error instanceof PaginationError) {
+      return res.status(400).json({
+        success: false,
+        message: error.message,
+      });
+    }
     console.error('Get all users error:', error);
     return res.status(500).json({
       success: false,
@@ -395,12 +447,12 @@ router.get('/plaza-assignments', requireAuth, async (req, res) => {
   try {
     const result = await pool.query(
       `SELECT 
-        plaza_name,
-        email_id,
-        created_at
-      FROM users 
-      WHERE plaza_name IS NOT NULL AND plaza_name != ''
-      ORDER BY created_at ASC`
+        p.name AS plaza_name,
+        u.email_id,
+        u.created_at
+      FROM users u
+      JOIN plaza p ON p.id = u.plaza_id
+      ORDER BY u.created_at ASC`
     );
 
     return res.status(200).json({
@@ -451,9 +503,14 @@ router.post('/assign-plaza', requireAuth, async (req, res) => {
       });
     }
 
-    // Update plaza_name for the user (convert to lowercase)
+    // Assign the plaza (created in the catalog if it is new) to the user
     const result = await pool.query(
-      'UPDATE users SET plaza_name = LOWER($1) WHERE email_id = $2 RETURNING id, email_id, plaza_name',
+      `WITH ${ASSIGNED_PLAZA_CTE}
+       UPDATE users u
+       SET plaza_id = assigned.id
+       FROM assigned
+       WHERE u.email_id = $2
+       RETURNING u.id, u.email_id, assigned.name AS plaza_name`,
       [plaza_name, email_id]
     );
 
@@ -473,7 +530,7 @@ router.post('/assign-plaza', requireAuth, async (req, res) => {
 
 /**
  * PUT /api/users/update-plaza-assignment
- * Update plaza assignment: remove plaza_name from old email_id and assign to new email_id
+ * Update plaza assignment: remove the plaza from old email_id and assign it to new email_id
  */
 router.put('/update-plaza-assignment', requireAuth, async (req, res) => {
   const client = await pool.connect();
@@ -494,7 +551,7 @@ router.put('/update-plaza-assignment', requireAuth, async (req, res) => {
 
     // Check if new user exists and is a client
     const newUserCheck = await client.query(
-      'SELECT id, role, plaza_name FROM users WHERE email_id = $1',
+      'SELECT id, role, plaza_id FROM users WHERE email_id = $1',
       [new_email_id]
     );
 
@@ -516,7 +573,7 @@ router.put('/update-plaza-assignment', requireAuth, async (req, res) => {
       });
     }
 
-    if (newUserCheck.rows[0].plaza_name && newUserCheck.rows[0].plaza_name !== '') {
+    if (newUserCheck.rows[0].plaza_id) {
       await client.query('ROLLBACK');
       client.release();
       return res.status(400).json({
@@ -540,15 +597,19 @@ router.put('/update-plaza-assignment', requireAuth, async (req, res) => {
       });
     }
 
-    // Remove plaza_name from old user
+    // Remove the plaza from old user
     await client.query(
-      'UPDATE users SET plaza_name = NULL WHERE email_id = $1',
+      'UPDATE users SET plaza_id = NULL WHERE email_id = $1',
       [old_email_id]
     );
 
-    // Assign plaza_name to new user (convert to lowercase)
+    // Assign the plaza to new user
     await client.query(
-      'UPDATE users SET plaza_name = LOWER($1) WHERE email_id = $2',
+      `WITH ${ASSIGNED_PLAZA_CTE}
+       UPDATE users u
+       SET plaza_id = assigned.id
+       FROM assigned
+       WHERE u.email_id = $2`,
       [plaza_name, new_email_id]
     );
 
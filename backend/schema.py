@@ -0,0 +1,824 @@
+"""
+Declarative schema of the plaza_web database: tables, indexes, routines, triggers and
+data migrations. migrator.py diffs the live database against these registries.
+"""
+
+# Bump SCHEMA_VERSION whenever TABLES, RENAMED_COLUMNS, DROPPED_COLUMNS, INDEXES,
+# FUNCTIONS, TRIGGERS, DATA_MIGRATIONS, LEGACY_COLUMN_MIGRATIONS, RETYPED_COLUMNS or PARTITIONED_TABLES change, otherwise already-migrated databases will take the fast path and skip the diff.
+SCHEMA_VERSION = 18
+
+# Desired schema: table name -> ordered list of (column, definition).
+# Missing tables are created in this order (referenced tables first), missing columns are
+# added with the same definition.
+TABLES = {
+    # Plaza catalog. Users and IDR requests refer to a plaza by id, so renaming one is a single row.
+    'plaza': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('name', 'VARCHAR(255) NOT NULL UNIQUE'),
+    ],
+    # scope_name is not unique; a name refers to its oldest scope (lowest id)
+    'scope': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('scope_name', 'VARCHAR(255)'),
+    ],
+    # Required document types of a scope, in the order they were entered
+    'scope_document': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('scope_id', 'INTEGER NOT NULL REFERENCES scope (id) ON DELETE CASCADE'),
+        ('position', 'INTEGER NOT NULL'),
+        ('document_type', 'VARCHAR(255) NOT NULL'),
+    ],
+    'users': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('name', 'VARCHAR(255) NOT NULL'),
+        ('designation', 'VARCHAR(255)'),
+        ('email_id', 'VARCHAR(255) NOT NULL UNIQUE'),
+        ('mob_no', 'VARCHAR(20)'),
+        ('user_code', 'VARCHAR(50)'),
+        ('role', 'VARCHAR(50) NOT NULL'),
+        ('temp_login', 'BOOLEAN DEFAULT TRUE'),
+        ('password', 'VARCHAR(255) NOT NULL'),
+        ('login_email_sent', 'BOOLEAN DEFAULT FALSE'),
+        # Stored as IST wall-clock time (TIMESTAMP WITHOUT TIME ZONE)
+        ('created_at', "TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')"),
+        ('plaza_id', 'INTEGER REFERENCES plaza (id) ON DELETE SET NULL'),
+    ],
+    'idr_master': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('plaza_id', 'INTEGER REFERENCES plaza (id)'),
+        ('request_datetime', 'TIMESTAMP WITHOUT TIME ZONE'),
+        ('due_date', 'DATE'),
+        ('from_date', 'DATE'),
+        ('to_date', 'DATE'),
+        ('done', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+        ('email_sent', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+        ('scope_id', 'INTEGER REFERENCES scope (id)'),
+        ('reminder_email_datetime', 'TIMESTAMP WITHOUT TIME ZONE'),
+        ('req_id', 'VARCHAR(255)'),
+    ],
+    # Partitioned by quarter (PARTITIONED_TABLES), so id is indexed rather than a primary key.
+    # object_key is the S3 key of the upload (the bucket URL prefix lives in config/s3.js) and
+    # period the first day of the document's month; routes still answer with document_url, year and month.
+    'document_master': [
+        ('id', 'SERIAL NOT NULL'),
+        ('req_id', 'VARCHAR(255)'),
+        ('document_type', 'VARCHAR(255)'),
+        ('object_key', 'TEXT'),
+        ('modified_time', 'TIMESTAMP WITHOUT TIME ZONE'),
+        ('period', 'DATE'),
+        ('is_rejected', 'BOOLEAN DEFAULT FALSE'),
+        ('reason', 'VARCHAR(255)'),
+    ],
+    # Per-request document_master counters, maintained by the request_progress triggers
+    'request_progress': [
+        ('req_id', 'VARCHAR(255) PRIMARY KEY'),
+        ('total_slots', 'INTEGER NOT NULL DEFAULT 0'),
+        ('filled_slots', 'INTEGER NOT NULL DEFAULT 0'),
+        ('rejected_slots', 'INTEGER NOT NULL DEFAULT 0'),
+    ],
+    # Dashboard rollup per plaza, scope and month, maintained by the dashboard_stats triggers.
+    # plaza_id / scope_id 0 collects requests without a plaza or scope, period 'infinity'
+    # documents without a month.
+    'dashboard_stats': [
+        ('plaza_id', 'INTEGER NOT NULL'),
+        ('scope_id', 'INTEGER NOT NULL'),
+        ('period', 'DATE NOT NULL'),
+        ('total_slots', 'INTEGER NOT NULL DEFAULT 0'),
+        ('filled_slots', 'INTEGER NOT NULL DEFAULT 0'),
+        ('rejected_slots', 'INTEGER NOT NULL DEFAULT 0'),
+    ],
+    # Durable queue of outgoing emails, drained by the scripts/*_email.js cron jobs.
+    # status: pending -> sending (claimed, next_attempt_at is the lease expiry) -> sent | skipped | failed
+    'email_outbox': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('kind', 'VARCHAR(50) NOT NULL'),
+        ('idr_master_id', 'INTEGER'),
+        ('payload', 'JSONB'),
+        ('status', "VARCHAR(20) NOT NULL DEFAULT 'pending'"),
+        ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+        ('next_attempt_at', "TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')"),
+        ('last_error', 'TEXT'),
+        ('created_at', "TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')"),
+        ('sent_at', 'TIMESTAMP WITHOUT TIME ZONE'),
+    ],
+    # S3 objects waiting to be deleted, drained in batches by scripts/s3_purge.js.
+    # status: pending -> purging (claimed, next_attempt_at is the lease expiry) -> purged | kept | failed
+    # ('kept' means a document_master row references the object again)
+    's3_purge_queue': [
+        ('id', 'SERIAL PRIMARY KEY'),
+        ('object_key', 'TEXT NOT NULL'),
+        ('status', "VARCHAR(20) NOT NULL DEFAULT 'pending'"),
+        ('attempts', 'INTEGER NOT NULL DEFAULT 0'),
+        ('next_attempt_at', "TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')"),
+        ('last_error', 'TEXT'),
+        ('created_at', "TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')"),
+        ('purged_at', 'TIMESTAMP WITHOUT TIME ZONE'),
+    ],
+    # Uploaded S3 objects by content (hex SHA-256). Uploads with the same bytes share one object;
+    # ref_count is the number of document_master (and archived) rows with its object_key, kept by
+    # the document_blob triggers, and the object is queued for purging when it drops to zero.
+    'document_blob': [
+        ('sha256', 'VARCHAR(64) PRIMARY KEY'),
+        ('object_key', 'TEXT NOT NULL UNIQUE'),
+        ('size', 'BIGINT NOT NULL'),
+        ('ref_count', 'INTEGER NOT NULL DEFAULT 0'),
+        ('created_at', "TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'Asia/Kolkata')"),
+    ],
+}
+
+# Closed document_master quarters, moved here as whole partitions by the archive-partitions command
+TABLES['document_master_archive'] = TABLES['document_master']
+
+# Range-partitioned tables: table -> partition key column. document_master is split into one
+# partition per financial quarter (April-March) of its period column, named <table>_fy<year>_q<n>
+# after the year the financial year starts in. Rows outside every quarter partition (NULL
+# periods, or quarters that do not exist yet) land in <table>_default until
+# ensure_quarter_partitions() creates their quarter and moves them over.
+# A table that is not yet partitioned on its key is rebuilt by partition_table_sql().
+PARTITIONED_TABLES = {
+    'document_master': 'period',
+    'document_master_archive': 'period',
+}
+
+# Quarter partitions kept ready ahead of the current one (by migrate and the partitions command)
+PARTITION_QUARTERS_AHEAD = 2
+
+# Table-level constraints added when a table is created: table -> list of constraint clauses
+TABLE_CONSTRAINTS = {
+    'scope_document': ['UNIQUE (scope_id, document_type)'],
+    'dashboard_stats': ['PRIMARY KEY (plaza_id, scope_id, period)'],
+}
+
+# Data fixes applied once, in the batch that first moves a database past the given
+# schema version: (version, sql, message)
+DATA_MIGRATIONS = [
+    (
+        7,
+        """
+            UPDATE idr_master
+            SET reminder_email_datetime = GREATEST(
+                COALESCE(request_datetime, NOW() AT TIME ZONE 'Asia/Kolkata') + INTERVAL '3 days',
+                NOW() AT TIME ZONE 'Asia/Kolkata'
+            )
+            WHERE reminder_email_datetime IS NULL
+            AND NOT done
+        """,
+        "Scheduled reminders for open IDR requests.",
+    ),
+    (
+        11,
+        """
+            UPDATE email_outbox o
+            SET payload = o.payload || jsonb_build_object('plaza_id', p.id)
+            FROM plaza p
+            WHERE o.kind = 'idr_reminder'
+            AND o.status IN ('pending', 'sending')
+            AND p.name = o.payload->>'plaza_name'
+        """,
+        "Pointed queued reminder digests at their plaza id.",
+    ),
+    (
+        13,
+        """
+            DROP TRIGGER IF EXISTS s3_purge_enqueue_update ON document_master;
+            DROP TRIGGER IF EXISTS s3_purge_enqueue_delete ON document_master;
+            DROP FUNCTION IF EXISTS s3_purge_enqueue()
+        """,
+        "Replaced the S3 purge triggers with the document_blob reference counters.",
+    ),
+]
+
+# One-off data migrations run in the same batch right after a table is created: table -> SQL
+ON_CREATE = {
+    # Carry over IDR requests whose notification the old email_sent flag had not yet recorded.
+    # The flag is still text here unless the database is new (see RETYPED_COLUMNS).
+    'email_outbox': """
+        LOCK TABLE idr_master IN SHARE ROW EXCLUSIVE MODE;
+        INSERT INTO email_outbox (kind, idr_master_id)
+        SELECT 'idr_request', id
+        FROM idr_master
+        WHERE COALESCE(email_sent::text, '') IN ('', 'false')
+        ORDER BY id
+    """,
+}
+
+# Aggregates that rebuild derived tables from their source rows: table -> (source table, SELECT).
+# The SELECT yields the derived table's columns in TABLES order. It populates a derived table
+# when it is first created and backs the backfill/verify commands.
+DERIVED_TABLES = {
+    'request_progress': (
+        'document_master',
+        """
+            SELECT req_id,
+                   COUNT(*) AS total_slots,
+                   COUNT(object_key) AS filled_slots,
+                   COUNT(*) FILTER (WHERE is_rejected) AS rejected_slots
+            FROM document_master
+            WHERE req_id IS NOT NULL
+            GROUP BY req_id
+        """,
+    ),
+    'dashboard_stats': (
+        'document_master',
+        """
+            SELECT COALESCE(im.plaza_id, 0) AS plaza_id,
+                   COALESCE(im.scope_id, 0) AS scope_id,
+                   COALESCE(dm.period, 'infinity') AS period,
+                   COUNT(*) AS total_slots,
+                   COUNT(dm.object_key) AS filled_slots,
+                   COUNT(*) FILTER (WHERE dm.is_rejected) AS rejected_slots
+            FROM document_master dm
+            JOIN idr_master im ON im.req_id = dm.req_id
+            GROUP BY 1, 2, 3
+        """,
+    ),
+}
+
+# Legacy columns that are renamed in place (old name -> new name)
+RENAMED_COLUMNS = {
+    'idr_master': [('status', 'done')],
+}
+
+# Legacy columns that are no longer part of the schema
+DROPPED_COLUMNS = {
+    'users': ['plaza_name'],
+    'idr_master': ['quarter', 'document_url', 'plaza_name', 'scope_name'],
+    'scope': ['required_documents'],
+    'document_master': ['year', 'month', 'document_url'],
+    'document_master_archive': ['year', 'month', 'document_url'],
+    's3_purge_queue': ['document_url'],
+}
+
+# Data carried over from a legacy column in the batch that drops it: (table, column) -> SQL.
+# They run once every table and column in TABLES exists, right before the drop.
+LEGACY_COLUMN_MIGRATIONS = {
+    ('users', 'plaza_name'): """
+        INSERT INTO plaza (name)
+        SELECT DISTINCT plaza_name FROM users WHERE plaza_name <> ''
+        ON CONFLICT (name) DO NOTHING;
+        UPDATE users u SET plaza_id = p.id FROM plaza p WHERE p.name = u.plaza_name
+    """,
+    ('idr_master', 'plaza_name'): """
+        INSERT INTO plaza (name)
+        SELECT DISTINCT plaza_name FROM idr_master WHERE plaza_name <> ''
+        ON CONFLICT (name) DO NOTHING;
+        UPDATE idr_master im SET plaza_id = p.id FROM plaza p WHERE p.name = im.plaza_name
+    """,
+    # Requests of scopes that no longer exist keep their name as a scope without documents
+    ('idr_master', 'scope_name'): """
+        INSERT INTO scope (scope_name)
+        SELECT DISTINCT scope_name FROM idr_master im
+        WHERE scope_name <> ''
+        AND NOT EXISTS (SELECT 1 FROM scope s WHERE s.scope_name = im.scope_name);
+        UPDATE idr_master im SET scope_id = s.id
+        FROM (SELECT scope_name, min(id) AS id FROM scope GROUP BY scope_name) s
+        WHERE s.scope_name = im.scope_name
+    """,
+    # Comma-separated document types, trimmed, without blanks or repeats
+    ('scope', 'required_documents'): """
+        INSERT INTO scope_document (scope_id, position, document_type)
+        SELECT s.id, min(d.position), btrim(d.document_type)
+        FROM scope s,
+             unnest(string_to_array(s.required_documents, ',')) WITH ORDINALITY AS d(document_type, position)
+        WHERE btrim(d.document_type) <> ''
+        GROUP BY s.id, btrim(d.document_type)
+        ON CONFLICT (scope_id, document_type) DO NOTHING
+    """,
+}
+
+# Columns converted to a compact type in place, in the same step as the legacy column drops:
+# (table, column) -> (legacy information_schema data_type, ALTER TABLE statement)
+RETYPED_COLUMNS = {
+    ('idr_master', 'done'): ('character varying', """
+        ALTER TABLE idr_master
+            ALTER COLUMN done TYPE BOOLEAN USING COALESCE(done = 'Done', FALSE),
+            ALTER COLUMN done SET DEFAULT FALSE,
+            ALTER COLUMN done SET NOT NULL
+    """),
+    ('idr_master', 'email_sent'): ('character varying', """
+        ALTER TABLE idr_master
+            ALTER COLUMN email_sent TYPE BOOLEAN USING COALESCE(email_sent <> '', FALSE),
+            ALTER COLUMN email_sent SET DEFAULT FALSE,
+            ALTER COLUMN email_sent SET NOT NULL
+    """),
+}
+
+# Values of the columns a partition_table_sql() rebuild adds, computed from the old table's
+# legacy columns while the rows are copied: table -> {column: expression}
+REBUILT_COLUMNS = {
+    'document_master': {
+        'period': 'make_date(year::integer, month::integer, 1)',
+        # URLs that are not S3 object URLs are kept whole rather than emptying their slot
+        'object_key': "COALESCE(NULLIF(split_part(document_url, '.amazonaws.com/', 2), ''), document_url)",
+    },
+}
+REBUILT_COLUMNS['document_master_archive'] = REBUILT_COLUMNS['document_master']
+
+# Indexes for the hot route queries: (name, table, columns [WHERE predicate], unique).
+# Built with CREATE INDEX CONCURRENTLY so a deploy never blocks writes.
+INDEXES = [
+    # idr_master lookups by req_id (upload, replace, documents, document-counts join)
+    ('idr_master_req_id_key', 'idr_master', '(req_id)', True),
+    # /client-requests: WHERE plaza_id = $1 ORDER BY ..., request_datetime DESC
+    ('idx_idr_master_plaza_id', 'idr_master', '(plaza_id, request_datetime DESC)', False),
+    # /submitted-requests and DELETE /request: scope + date range
+    ('idx_idr_master_scope_dates', 'idr_master', '(scope_id, from_date, to_date)', False),
+    # Document lookups by id (replace-document, reject-documents); document_master has no primary key
+    ('idx_document_master_id', 'document_master', '(id)', False),
+    # Completion aggregates (WHERE req_id = $1) and upload slot lookups
+    ('idx_document_master_slot', 'document_master', '(req_id, document_type, period)', False),
+    # /plaza-documents and /document-counts only ever read uploaded rows
+    (
+        'idx_document_master_uploaded',
+        'document_master',
+        '(req_id, period, document_type, modified_time) WHERE object_key IS NOT NULL',
+        False,
+    ),
+    # Reminder scheduler: range scan over due reminders only
+    (
+        'idx_idr_master_reminder_due',
+        'idr_master',
+        '(reminder_email_datetime) WHERE reminder_email_datetime IS NOT NULL',
+        False,
+    ),
+    # Reminder scheduler: open requests that lost their reminder date (reopened after Done)
+    (
+        'idx_idr_master_reminder_unscheduled',
+        'idr_master',
+        '(id) WHERE reminder_email_datetime IS NULL AND plaza_id IS NOT NULL AND NOT done',
+        False,
+    ),
+    # IDR email cron and rejection mailer: recipients by plaza
+    ('idx_users_plaza_id', 'users', '(plaza_id)', False),
+    # Dashboard filters by scope and period (plaza filters use the primary key)
+    ('idx_dashboard_stats_scope_period', 'dashboard_stats', '(scope_id, period)', False),
+    # Outbox claim: due rows that are still pending or whose sending lease has expired
+    (
+        'idx_email_outbox_due',
+        'email_outbox',
+        "(next_attempt_at) WHERE status IN ('pending', 'sending')",
+        False,
+    ),
+    # /submitted-requests keyset pagination (SUBMITTED_REQUESTS_SORT in routes/idr.js), all scopes and one scope
+    (
+        'idx_idr_master_submitted',
+        'idr_master',
+        "(COALESCE(from_date, 'infinity'::date), COALESCE(to_date, 'infinity'::date), "
+        "COALESCE(due_date, 'infinity'::date), COALESCE(plaza_id, 0), id)",
+        False,
+    ),
+    (
+        'idx_idr_master_scope_submitted',
+        'idr_master',
+        "(scope_id, COALESCE(from_date, 'infinity'::date), COALESCE(to_date, 'infinity'::date), "
+        "COALESCE(due_date, 'infinity'::date), COALESCE(plaza_id, 0), id)",
+        False,
+    ),
+    # /api/users/all keyset pagination (USERS_SORT in routes/users.js)
+    ('idx_users_created', 'users', "(COALESCE(created_at, 'infinity'::timestamp) DESC, id DESC)", False),
+    # S3 purge: "is this object still referenced" checks by the purge worker and reconciliation
+    (
+        'idx_document_master_object_key',
+        'document_master',
+        '(object_key) WHERE object_key IS NOT NULL',
+        False,
+    ),
+    # Archived documents keep their S3 objects; the purge worker checks them as well
+    (
+        'idx_document_master_archive_object_key',
+        'document_master_archive',
+        '(object_key) WHERE object_key IS NOT NULL',
+        False,
+    ),
+    # S3 purge claim, same shape as the email outbox
+    (
+        'idx_s3_purge_queue_due',
+        's3_purge_queue',
+        "(next_attempt_at) WHERE status IN ('pending', 'purging')",
+        False,
+    ),
+    # Reconciliation skips objects that are already queued
+    (
+        'idx_s3_purge_queue_key',
+        's3_purge_queue',
+        "(object_key) WHERE status IN ('pending', 'purging')",
+        False,
+    ),
+]
+
+
+# Signed document_master change sets, as seen from statement-level trigger transition tables
+DOCUMENT_CHANGES = {
+    'INSERT': "SELECT req_id, period, object_key, is_rejected, 1 AS sign FROM new_rows",
+    'UPDATE': (
+        "SELECT req_id, period, object_key, is_rejected, 1 AS sign FROM new_rows "
+        "UNION ALL SELECT req_id, period, object_key, is_rejected, -1 FROM old_rows"
+    ),
+    'DELETE': "SELECT req_id, period, object_key, is_rejected, -1 AS sign FROM old_rows",
+}
+
+# Adds the signed per-req_id counts of a change set to request_progress
+REQUEST_PROGRESS_UPSERT = """
+                INSERT INTO request_progress AS rp (req_id, total_slots, filled_slots, rejected_slots)
+                SELECT req_id,
+                       SUM(sign),
+                       COALESCE(SUM(sign) FILTER (WHERE object_key IS NOT NULL), 0),
+                       COALESCE(SUM(sign) FILTER (WHERE is_rejected), 0)
+                FROM ({changes}) AS changes
+                WHERE req_id IS NOT NULL
+                GROUP BY req_id
+                ON CONFLICT (req_id) DO UPDATE
+                SET total_slots = rp.total_slots + EXCLUDED.total_slots,
+                    filled_slots = rp.filled_slots + EXCLUDED.filled_slots,
+                    rejected_slots = rp.rejected_slots + EXCLUDED.rejected_slots;"""
+
+REQUEST_PROGRESS_CLEANUP = """
+                DELETE FROM request_progress
+                WHERE total_slots <= 0
+                AND req_id IN (SELECT req_id FROM old_rows);"""
+
+# Adds the signed per-(plaza, scope, month) counts of a change set to dashboard_stats
+DASHBOARD_STATS_UPSERT = """
+                INSERT INTO dashboard_stats AS ds (
+                    plaza_id, scope_id, period, total_slots, filled_slots, rejected_slots
+                )
+                SELECT COALESCE(im.plaza_id, 0),
+                       COALESCE(im.scope_id, 0),
+                       COALESCE(changes.period, 'infinity'),
+                       SUM(sign),
+                       COALESCE(SUM(sign) FILTER (WHERE changes.object_key IS NOT NULL), 0),
+                       COALESCE(SUM(sign) FILTER (WHERE changes.is_rejected), 0)
+                FROM ({changes}) AS changes
+                JOIN idr_master im ON im.req_id = changes.req_id
+                GROUP BY 1, 2, 3
+                ON CONFLICT (plaza_id, scope_id, period) DO UPDATE
+                SET total_slots = ds.total_slots + EXCLUDED.total_slots,
+                    filled_slots = ds.filled_slots + EXCLUDED.filled_slots,
+                    rejected_slots = ds.rejected_slots + EXCLUDED.rejected_slots;"""
+
+# Adds the signed per-object_key counts of a change set to document_blob.ref_count and queues
+# every object that is no longer referenced: blobs whose count reaches zero, and keys uploaded
+# before document_blob existed. The purge waits a few minutes so an upload that has just
+# matched the blob can still reference it (the purge worker keeps referenced objects).
+DOCUMENT_BLOB_UPSERT = """
+                WITH changes AS (
+                    SELECT object_key, SUM(sign)::integer AS delta
+                    FROM ({changes}) AS changes
+                    WHERE object_key IS NOT NULL
+                    GROUP BY object_key
+                    HAVING SUM(sign) <> 0
+                ),
+                counted AS (
+                    UPDATE document_blob b
+                    SET ref_count = b.ref_count + changes.delta
+                    FROM changes
+                    WHERE b.object_key = changes.object_key
+                    RETURNING b.object_key, b.ref_count
+                )
+                INSERT INTO s3_purge_queue (object_key, next_attempt_at)
+                SELECT changes.object_key, NOW() AT TIME ZONE 'Asia/Kolkata' + INTERVAL '10 minutes'
+                FROM changes
+                LEFT JOIN counted ON counted.object_key = changes.object_key
+                WHERE changes.delta < 0
+                AND COALESCE(counted.ref_count, 0) <= 0;"""
+
+DASHBOARD_STATS_CLEANUP = """
+                DELETE FROM dashboard_stats ds
+                USING old_rows o
+                JOIN idr_master im ON im.req_id = o.req_id
+                WHERE ds.total_slots <= 0
+                AND ds.plaza_id = COALESCE(im.plaza_id, 0)
+                AND ds.scope_id = COALESCE(im.scope_id, 0)
+                AND ds.period = COALESCE(o.period, 'infinity');"""
+
+
+def counter_trigger_function(name, upsert, cleanup):
+    """
+    Build a statement-level trigger function that applies the net effect of a
+    document_master statement to a counter table, so bulk writes cost one upsert
+    per counter row instead of one per document row.
+    """
+    return f"""
+        CREATE OR REPLACE FUNCTION {name}()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            -- Transition tables only exist for the events that declare them
+            IF TG_OP = 'INSERT' THEN{upsert.format(changes=DOCUMENT_CHANGES['INSERT'])}
+            ELSIF TG_OP = 'UPDATE' THEN{upsert.format(changes=DOCUMENT_CHANGES['UPDATE'])}
+            ELSE{upsert.format(changes=DOCUMENT_CHANGES['DELETE'])}{cleanup}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """
+
+
+def counter_triggers(function_name, table='document_master'):
+    """Return TRIGGERS entries that run a counter_trigger_function() for every write to table."""
+    return [
+        (
+            f'{function_name.replace("_apply", "")}_{event.lower()}',
+            table,
+            f'AFTER {event} ON {table} REFERENCING {transition} '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION {function_name}()',
+        )
+        for event, transition in (
+            ('INSERT', 'NEW TABLE AS new_rows'),
+            ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+            ('DELETE', 'OLD TABLE AS old_rows'),
+        )
+    ]
+
+
+# Server-side routines installed with CREATE OR REPLACE on every migration: (name, sql).
+FUNCTIONS = [
+    # Creates a whole IDR run in one statement: one idr_master row per plaza plus a
+    # document_master slot for every (required document x month) of the date range.
+    # Used by POST /api/idr/master instead of awaiting one INSERT per slot.
+    # Plazas and the scope are given by name; names missing from the catalog are skipped.
+    ('create_idr_run', """
+        CREATE OR REPLACE FUNCTION create_idr_run(
+            plaza_names TEXT[],
+            req_ids TEXT[],
+            run_scope_name TEXT,
+            run_due_date DATE,
+            run_from_date DATE,
+            run_to_date DATE
+        )
+        RETURNS SETOF idr_master
+        LANGUAGE sql
+        AS $$
+            WITH run_scope AS (
+                SELECT min(id) AS id FROM scope WHERE scope_name = run_scope_name
+            ),
+            inserted AS (
+                INSERT INTO idr_master (
+                    plaza_id, request_datetime, due_date, from_date, to_date,
+                    scope_id, req_id, reminder_email_datetime
+                )
+                SELECT pl.id, NOW() AT TIME ZONE 'Asia/Kolkata', run_due_date, run_from_date,
+                       run_to_date, run_scope.id, p.req_id,
+                       -- First reminder three days after the request (see scripts/idr_reminder_email.js)
+                       NOW() AT TIME ZONE 'Asia/Kolkata' + INTERVAL '3 days'
+                FROM unnest(plaza_names, req_ids) WITH ORDINALITY AS p(plaza_name, req_id, ord)
+                JOIN plaza pl ON pl.name = p.plaza_name
+                CROSS JOIN run_scope
+                ORDER BY p.ord
+                RETURNING *
+            ),
+            documents AS (
+                SELECT sd.document_type, sd.position
+                FROM scope_document sd
+                WHERE sd.scope_id = (SELECT id FROM run_scope)
+            ),
+            months AS (
+                SELECT generate_series(
+                    date_trunc('month', run_from_date),
+                    date_trunc('month', run_to_date),
+                    INTERVAL '1 month'
+                ) AS month_start
+            ),
+            slots AS (
+                INSERT INTO document_master (req_id, document_type, object_key, modified_time, period)
+                SELECT i.req_id, d.document_type, NULL, i.request_datetime, m.month_start::date
+                FROM inserted i
+                CROSS JOIN documents d
+                CROSS JOIN months m
+                WHERE i.req_id IS NOT NULL
+                ORDER BY i.id, d.position, m.month_start
+            )
+            SELECT * FROM inserted ORDER BY id
+        $$
+    """),
+    # Stores an uploaded object in one call (POST /upload-document, POST /replace-document):
+    # takes an empty slot of (req_id, document_type, period), or appends a row when every slot
+    # is filled, or, given replaced_id, overwrites that row and clears its rejection. Slots
+    # are claimed FOR UPDATE SKIP LOCKED, so concurrent uploads never take the same row.
+    # The request is then marked done if every slot is filled and none rejected; the
+    # request_progress triggers have already counted the write by then.
+    ('claim_document_slot', """
+        CREATE OR REPLACE FUNCTION claim_document_slot(
+            slot_req_id TEXT,
+            slot_document_type TEXT,
+            slot_period DATE,
+            new_object_key TEXT,
+            replaced_id INTEGER DEFAULT NULL
+        )
+        RETURNS SETOF document_master
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            stored document_master;
+            uploaded_at TIMESTAMP WITHOUT TIME ZONE := NOW() AT TIME ZONE 'Asia/Kolkata';
+        BEGIN
+            IF replaced_id IS NOT NULL THEN
+                UPDATE document_master
+                SET object_key = new_object_key, modified_time = uploaded_at,
+                    is_rejected = FALSE, reason = NULL
+                WHERE id = replaced_id
+                RETURNING * INTO stored;
+            ELSE
+                WITH slot AS (
+                    SELECT id, period
+                    FROM document_master
+                    WHERE req_id = slot_req_id AND document_type = slot_document_type
+                    AND period = slot_period AND object_key IS NULL
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE document_master dm
+                SET object_key = new_object_key, modified_time = uploaded_at
+                FROM slot
+                WHERE dm.id = slot.id AND dm.period = slot.period
+                RETURNING dm.* INTO stored;
+
+                IF NOT FOUND THEN
+                    IF EXISTS (SELECT 1 FROM archived_quarters(slot_period, slot_period)) THEN
+                        RAISE EXCEPTION 'Documents of % are archived', to_char(slot_period, 'YYYY-MM')
+                            USING ERRCODE = 'check_violation';
+                    END IF;
+                    INSERT INTO document_master (req_id, document_type, object_key, modified_time, period)
+                    VALUES (slot_req_id, slot_document_type, new_object_key, uploaded_at, slot_period)
+                    RETURNING * INTO stored;
+                END IF;
+            END IF;
+
+            IF stored.id IS NULL THEN
+                RETURN;
+            END IF;
+
+            UPDATE idr_master im
+            SET done = TRUE
+            FROM request_progress rp
+            WHERE im.req_id = stored.req_id
+            AND NOT im.done
+            AND rp.req_id = im.req_id
+            AND rp.total_slots > 0
+            AND rp.filled_slots = rp.total_slots
+            AND rp.rejected_slots = 0;
+
+            RETURN NEXT stored;
+        END
+        $$
+    """),
+    # Per-request completion counters (request_progress)
+    (
+        'request_progress_apply',
+        counter_trigger_function('request_progress_apply', REQUEST_PROGRESS_UPSERT, REQUEST_PROGRESS_CLEANUP),
+    ),
+    # Per-plaza/scope/month dashboard rollup (dashboard_stats)
+    (
+        'dashboard_stats_apply',
+        counter_trigger_function('dashboard_stats_apply', DASHBOARD_STATS_UPSERT, DASHBOARD_STATS_CLEANUP),
+    ),
+    # Per-object document_blob reference counts and S3 purge queueing, so routes never call
+    # S3 while holding row locks and a shared upload is only purged with its last reference
+    (
+        'document_blob_apply',
+        counter_trigger_function('document_blob_apply', DOCUMENT_BLOB_UPSERT, ''),
+    ),
+    # Creates the quarter partitions of a PARTITIONED_TABLES parent between two dates and
+    # moves any rows of those quarters out of its default partition. Returns the new partitions.
+    ('create_quarter_partitions', """
+        CREATE OR REPLACE FUNCTION create_quarter_partitions(parent TEXT, first_day DATE, last_day DATE)
+        RETURNS SETOF TEXT
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            partition_key TEXT := substring(pg_get_partkeydef(parent::regclass) FROM '^RANGE [(](.*)[)]$');
+            quarter_start DATE;
+            quarter_end DATE;
+            partition_name TEXT;
+        BEGIN
+            FOR quarter_start IN
+                SELECT generate_series(date_trunc('quarter', first_day), date_trunc('quarter', last_day), INTERVAL '3 months')
+            LOOP
+                quarter_end := quarter_start + INTERVAL '3 months';
+                -- Financial year quarters: April-June is Q1 of the year starting that April
+                partition_name := format('%s_fy%s_q%s', parent,
+                    extract(year FROM quarter_start - INTERVAL '3 months'),
+                    extract(quarter FROM quarter_start - INTERVAL '3 months'));
+                -- Archived quarters keep their name, so they are never recreated; create_idr_run()
+                -- and claim_document_slot() refuse new rows for them (see archived_quarters())
+                CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', partition_name, parent);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM %I WHERE %s >= %L AND %s < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM moved',
+                    parent || '_default', partition_key, quarter_start, partition_key, quarter_end, partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    parent, partition_name, quarter_start, quarter_end
+                );
+                RETURN NEXT partition_name;
+            END LOOP;
+        END
+        $$
+    """),
+    # Keeps quarter partitions ready from the current quarter to quarters_ahead quarters out,
+    # plus any quarter that already has rows waiting in the default partition.
+    # Run by migrate, the partitions command and scripts/partition_maintenance.js.
+    ('ensure_quarter_partitions', """
+        CREATE OR REPLACE FUNCTION ensure_quarter_partitions(parent TEXT, quarters_ahead INTEGER)
+        RETURNS SETOF TEXT
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            partition_key TEXT := substring(pg_get_partkeydef(parent::regclass) FROM '^RANGE [(](.*)[)]$');
+            today DATE := (NOW() AT TIME ZONE 'Asia/Kolkata')::date;
+            first_day DATE;
+            last_day DATE;
+        BEGIN
+            EXECUTE format('SELECT min(%s), max(%s) FROM %I', partition_key, partition_key, parent || '_default')
+            INTO first_day, last_day;
+            RETURN QUERY SELECT create_quarter_partitions(
+                parent,
+                LEAST(first_day, today),
+                GREATEST(last_day, (today + make_interval(months => 3 * quarters_ahead))::date)
+            );
+        END
+        $$
+    """),
+    # Quarter partitions of document_master_archive that overlap first_day..last_day.
+    # New rows of an archived quarter would stay in document_master_default for good, so
+    # POST /master and claim_document_slot() turn those periods down.
+    ('archived_quarters', """
+        CREATE OR REPLACE FUNCTION archived_quarters(first_day DATE, last_day DATE)
+        RETURNS SETOF TEXT
+        LANGUAGE sql
+        STABLE
+        AS $$
+            SELECT c.relname::text
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid,
+                 regexp_match(pg_get_expr(c.relpartbound, c.oid), 'FROM [(]''([^'']+)''[)] TO [(]''([^'']+)''[)]') AS bound
+            WHERE i.inhparent = 'document_master_archive'::regclass
+            AND bound[1]::date <= last_day
+            AND bound[2]::date > first_day
+            ORDER BY bound[1]::date
+        $$
+    """),
+    # Tells every backend replica which reference table changed, so its reference cache
+    # (utils/referenceCache.js) drops what it read from it. Notifications are sent on commit.
+    ('reference_cache_notify', """
+        CREATE OR REPLACE FUNCTION reference_cache_notify()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            PERFORM pg_notify('reference_cache', TG_TABLE_NAME);
+            RETURN NULL;
+        END
+        $$
+    """),
+    # Queues the "new IDR request" email for every inserted idr_master row
+    ('email_outbox_enqueue_idr', """
+        CREATE OR REPLACE FUNCTION email_outbox_enqueue_idr()
+        RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            INSERT INTO email_outbox (kind, idr_master_id)
+            SELECT 'idr_request', id FROM new_rows ORDER BY id;
+            RETURN NULL;
+        END
+        $$
+    """),
+]
+
+# Triggers recreated on every migration: (name, table, definition after "CREATE TRIGGER name")
+TRIGGERS = (
+    counter_triggers('request_progress_apply')
+    + counter_triggers('dashboard_stats_apply')
+    + counter_triggers('document_blob_apply')
+    # Archived rows still hold their document_blob reference (see archive_partitions()),
+    # so deleting them releases it and queues the object for purging like a live delete
+    + counter_triggers('document_blob_apply', 'document_master_archive')
+) + [
+    (
+        'email_outbox_enqueue_idr',
+        'idr_master',
+        'AFTER INSERT ON idr_master REFERENCING NEW TABLE AS new_rows '
+        'FOR EACH STATEMENT EXECUTE FUNCTION email_outbox_enqueue_idr()',
+    ),
+] + [
+    # Reference cache invalidation; users and idr_master only notify for the columns the
+    # cached lookups read (utils/referenceData.js), not for logins or request progress
+    (
+        'reference_cache_notify',
+        table,
+        f'AFTER INSERT OR {update} OR DELETE OR TRUNCATE ON {table} '
+        'FOR EACH STATEMENT EXECUTE FUNCTION reference_cache_notify()',
+    )
+    for table, update in (
+        ('scope', 'UPDATE'),
+        ('scope_document', 'UPDATE'),
+        ('plaza', 'UPDATE'),
+        ('users', 'UPDATE OF name, email_id, role, plaza_id'),
+        ('idr_master', 'UPDATE OF scope_id'),
+    )
+]
@@ -0,0 +1,60 @@
+const crypto = require('crypto');
+const jwt = require('jsonwebtoken');
+const { encryptToken, decryptToken } = require('../utils/tokenEncryption');
+const { requireAuth, sessionCache } = require('../middleware/auth');
+
+/**
+ * Micro-benchmark: requests per second through requireAuth
+ * Usage: node scripts/benchmarkAuth.js [iterations] [sessions]
+ *
+ * "scrypt per request" reproduces the old middleware (key derived on every call),
+ * "derived key" is requireAuth with an empty cache on every call and
+ * "session cache" is requireAuth as it runs in production.
+ */
+const ITERATIONS = parseInt(process.argv[2] || '20000', 10);
+const SESSIONS = parseInt(process.argv[3] || '100', 10);
+const JWT_SECRET = process.env.JWT_SECRET || 'your-secret-key-change-in-production';
+
+const tokens = Array.from({ length: SESSIONS }, (_, i) =>
+  encryptToken(jwt.sign({ id: i, email_id: `user${i}@bench.invalid`, role: 'client', name: `User ${i}` }, JWT_SECRET, {
+    expiresIn: '1h',
+  }))
+);
+
+const res = {
+  status() {
+    return this;
+  },
+  json() {
+    throw new Error('requireAuth rejected a valid token');
+  },
+  clearCookie() {},
+};
+
+const legacyRequireAuth = (req, _res, next) => {
+  // Equivalent of the scryptSync call the old decryptToken() made on every request
+  crypto.scryptSync(process.env.TOKEN_ENCRYPTION_KEY || 'bench', 'salt', 32);
+  req.user = jwt.verify(decryptToken(req.cookies.sessionToken), JWT_SECRET);
+  next();
+};
+
+const uncachedRequireAuth = (req, _res, next) => {
+  sessionCache.clear();
+  requireAuth(req, _res, next);
+};
+
+const run = (name, middleware, iterations) => {
+  const next = () => {};
+  const started = process.hrtime.bigint();
+  for (let i = 0; i < iterations; i += 1) {
+    middleware({ cookies: { sessionToken: tokens[i % tokens.length] } }, res, next);
+  }
+  const seconds = Number(process.hrtime.bigint() - started) / 1e9;
+  console.log(`${name.padEnd(20)} ${String(iterations).padStart(8)} req ${(iterations / seconds).toFixed(0).padStart(10)} req/s`);
+};
+
+// scrypt is ~1000x slower than the other paths, so it gets fewer iterations
+run('scrypt per request', legacyRequireAuth, Math.max(1, Math.floor(ITERATIONS / 100)));
+run('derived key', uncachedRequireAuth, ITERATIONS);
+sessionCache.clear();
+run('session cache', requireAuth, ITERATIONS);
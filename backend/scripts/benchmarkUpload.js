@@ -0,0 +1,63 @@
+const { execFileSync } = require('child_process');
+const { Readable } = require('stream');
+const { PutObjectCommand, DeleteObjectCommand } = require('@aws-sdk/client-s3');
+const { s3Client, S3_BUCKET_NAME } = require('../config/s3');
+const { uploadStream, PART_SIZE, QUEUE_SIZE } = require('../utils/s3Upload');
+
+/**
+ * Benchmark: buffered PutObject (the old multer.memoryStorage path) vs uploadStream()
+ * Usage: node scripts/benchmarkUpload.js [sizeMB] [buffered|streaming]
+ *
+ * Point it at a local S3-compatible server, e.g. MinIO:
+ *   AWS_S3_ENDPOINT=http://localhost:9000 AWS_S3_BUCKET_NAME=idr-bench \
+ *   AWS_ACCESS_KEY_ID=minioadmin AWS_SECRET_ACCESS_KEY=minioadmin node scripts/benchmarkUpload.js 512
+ * Each mode runs in its own process so peak RSS is measured separately.
+ */
+const SIZE_MB = parseInt(process.argv[2] || '256', 10);
+const MODE = process.argv[3];
+const CHUNK = Buffer.alloc(64 * 1024, 'x');
+
+// Simulated upload body arriving in 64 KB chunks, like busboy's file stream
+const source = () => Readable.from((function* chunks() {
+  for (let i = 0; i < (SIZE_MB * 1024 * 1024) / CHUNK.length; i += 1) {
+    yield CHUNK;
+  }
+})());
+
+const modes = {
+  buffered: async (Key) => {
+    const chunks = [];
+    for await (const chunk of source()) {
+      chunks.push(chunk);
+    }
+    await s3Client.send(new PutObjectCommand({ Bucket: S3_BUCKET_NAME, Key, Body: Buffer.concat(chunks) }));
+  },
+  streaming: async (Key) => {
+    await uploadStream(s3Client, { Bucket: S3_BUCKET_NAME, Key, ContentType: 'application/octet-stream', Body: source() });
+  },
+};
+
+const run = async (mode) => {
+  const key = `benchmarks/upload-${mode}-${process.pid}`;
+  const started = process.hrtime.bigint();
+  await modes[mode](key);
+  const seconds = Number(process.hrtime.bigint() - started) / 1e9;
+  const peakRssMb = process.resourceUsage().maxRSS / 1024;
+  await s3Client.send(new DeleteObjectCommand({ Bucket: S3_BUCKET_NAME, Key: key }));
+  console.log(
+    `${mode.padEnd(10)} ${String(SIZE_MB).padStart(6)} MB ${(SIZE_MB / seconds).toFixed(1).padStart(8)} MB/s ` +
+    `peak RSS ${peakRssMb.toFixed(0).padStart(6)} MB`
+  );
+};
+
+if (MODE) {
+  run(MODE).catch((error) => {
+    console.error(error);
+    process.exit(1);
+  });
+} else {
+  console.log(`part size ${PART_SIZE / (1024 * 1024)} MB, ${QUEUE_SIZE} parts in flight`);
+  for (const mode of Object.keys(modes)) {
+    execFileSync(process.execPath, [__filename, String(SIZE_MB), mode], { stdio: 'inherit' });
+  }
+}
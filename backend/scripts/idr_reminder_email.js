@@ -0,0 +1,246 @@
+const cron = require('cron');
+const { pool } = require('../config/db');
+const { transporter } = require('../config/mail');
+const {
+  mapWithConcurrency,
+  recordResults,
+  SEND_CONCURRENCY,
+  LEASE_MINUTES,
+  formatDate,
+} = require('../utils/outbox');
+
+// Reminder tuning. create_idr_run() in schema.py schedules the first reminder 3 days out.
+const REMINDER_INTERVAL_DAYS = parseInt(process.env.IDR_REMINDER_INTERVAL_DAYS || '3', 10);
+const SCHEDULE_BATCH_SIZE = parseInt(process.env.IDR_REMINDER_BATCH_SIZE || '500', 10);
+const SEND_BATCH_SIZE = parseInt(process.env.IDR_REMINDER_SEND_BATCH_SIZE || '50', 10);
+const TIME_BUDGET_MS = parseInt(process.env.IDR_REMINDER_TIME_BUDGET_MS || '45000', 10);
+
+const monthNames = [
+  "January", "February", "March", "April", "May", "June",
+  "July", "August", "September", "October", "November", "December"
+];
+
+// Pick due requests with a range scan on reminder_email_datetime, queue one digest per
+// plaza in email_outbox and push the next reminder of every open request of those plazas
+// forward, all in one statement. Requests that are already Done stop being scheduled.
+// Open requests without a reminder date (Done requests that were reopened) count as due,
+// so they are put back on the schedule. Returns the number of due requests processed.
+const scheduleBatch = async () => {
+  const result = await pool.query(
+    `WITH due AS (
+       SELECT id, plaza_id, done
+       FROM idr_master
+       WHERE reminder_email_datetime <= NOW() AT TIME ZONE 'Asia/Kolkata'
+          OR (reminder_email_datetime IS NULL AND plaza_id IS NOT NULL AND NOT done)
+       ORDER BY reminder_email_datetime NULLS FIRST
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED
+     ),
+     plazas AS (
+       SELECT DISTINCT plaza_id
+       FROM due
+       WHERE plaza_id IS NOT NULL AND NOT done
+     ),
+     advanced AS (
+       UPDATE idr_master im
+       SET reminder_email_datetime = CASE
+             WHEN im.plaza_id IS NULL OR im.done THEN NULL
+             ELSE NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(days => $2)
+           END
+       WHERE im.id IN (SELECT id FROM due)
+          OR (
+            im.plaza_id IN (SELECT plaza_id FROM plazas)
+            AND NOT im.done
+          )
+       RETURNING im.id
+     ),
+     queued AS (
+       INSERT INTO email_outbox (kind, payload)
+       SELECT 'idr_reminder', jsonb_build_object('plaza_id', plaza_id)
+       FROM plazas
+       RETURNING id
+     )
+     SELECT
+       (SELECT COUNT(*) FROM due) AS due_count,
+       (SELECT COUNT(*) FROM queued) AS queued_count`,
+    [SCHEDULE_BATCH_SIZE, REMINDER_INTERVAL_DAYS]
+  );
+
+  const { due_count, queued_count } = result.rows[0];
+  if (parseInt(queued_count, 10) > 0) {
+    console.log(`Queued ${queued_count} IDR reminder digest(s)`);
+  }
+  return parseInt(due_count, 10);
+};
+
+// Claim queued reminder digests and prefetch recipients plus every outstanding
+// (request, document type, month) slot of each plaza across all open requests.
+// A slot is outstanding while none of its rows holds an accepted upload.
+const claimBatch = async () => {
+  const result = await pool.query(
+    `WITH claimed AS (
+       SELECT id
+       FROM email_outbox
+       WHERE kind = 'idr_reminder'
+         AND status IN ('pending', 'sending')
+         AND next_attempt_at <= NOW() AT TIME ZONE 'Asia/Kolkata'
+       ORDER BY next_attempt_at
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED
+     ),
+     leased AS (
+       UPDATE email_outbox o
+       SET status = 'sending',
+           attempts = o.attempts + 1,
+           next_attempt_at = NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(mins => $2)
+       FROM claimed
+       WHERE o.id = claimed.id
+       RETURNING o.id, o.attempts, (o.payload->>'plaza_id')::int AS plaza_id
+     )
+     SELECT
+       l.id AS outbox_id,
+       l.attempts,
+       p.name AS plaza_name,
+       r.recipients,
+       d.slots
+     FROM leased l
+     LEFT JOIN plaza p ON p.id = l.plaza_id
+     LEFT JOIN LATERAL (
+       SELECT array_agg(email_id ORDER BY email_id) AS recipients
+       FROM users
+       WHERE plaza_id = l.plaza_id AND email_id IS NOT NULL
+     ) r ON TRUE
+     LEFT JOIN LATERAL (
+       SELECT json_agg(slot ORDER BY slot.due_date, slot.scope_name, slot.year, slot.month, slot.document_type) AS slots
+       FROM (
+         SELECT
+           s.scope_name,
+           im.due_date,
+           dm.document_type,
+           to_char(dm.period, 'YYYY') AS year,
+           to_char(dm.period, 'MM') AS month,
+           bool_or(dm.is_rejected) AS rejected
+         FROM idr_master im
+         JOIN document_master dm ON dm.req_id = im.req_id
+         LEFT JOIN scope s ON s.id = im.scope_id
+         WHERE im.plaza_id = l.plaza_id
+           AND NOT im.done
+         GROUP BY im.req_id, s.scope_name, im.due_date, dm.document_type, dm.period
+         HAVING NOT bool_or(dm.object_key IS NOT NULL AND NOT COALESCE(dm.is_rejected, FALSE))
+       ) slot
+     ) d ON TRUE`,
+    [SEND_BATCH_SIZE, LEASE_MINUTES]
+  );
+
+  return result.rows;
+};
+
+// Build the digest for one plaza, grouped by scope and due date
+const buildDigest = (row, fullLoginUrl) => {
+  const groups = new Map();
+  for (const slot of row.slots) {
+    const key = `${slot.scope_name} (due ${formatDate(slot.due_date)})`;
+    if (!groups.has(key)) {
+      groups.set(key, []);
+    }
+    const monthName = monthNames[parseInt(slot.month, 10) - 1] || slot.month;
+    const status = slot.rejected ? ' - rejected, please replace' : '';
+    groups.get(key).push(`- ${slot.document_type} (${monthName} ${slot.year})${status}`);
+  }
+
+  const sections = [...groups.entries()]
+    .map(([heading, lines]) => `${heading}:\n${lines.join('\n')}`)
+    .join('\n\n');
+
+  return {
+    from: process.env.SMTP_FROM || process.env.SMTP_USER,
+    to: row.recipients.join(','),
+    subject: `Reminder: ${row.slots.length} pending IDR document(s) for ${row.plaza_name}`,
+    text: `Dear User,
+
+This is a reminder that the following documents are still pending for your plaza (${row.plaza_name}).
+
+${sections}
+
+Please log in to the portal and upload the pending documents before the due date.
+
+Login: ${fullLoginUrl}
+
+Regards,
+SNTA Team`,
+  };
+};
+
+// Main worker: schedule due reminders, then send the queued digests, within a fixed time budget
+let running = false;
+
+const processIdrReminders = async () => {
+  if (running) {
+    return;
+  }
+  running = true;
+
+  const deadline = Date.now() + TIME_BUDGET_MS;
+
+  try {
+    // Anything left over when the budget runs out is still due on the next tick
+    while (Date.now() < deadline) {
+      const dueCount = await scheduleBatch();
+      if (dueCount < SCHEDULE_BATCH_SIZE) {
+        break;
+      }
+    }
+
+    const loginUrl = process.env.FRONTEND_URL || 'http://localhost:5174';
+    const fullLoginUrl = `${loginUrl}/login`;
+
+    while (Date.now() < deadline) {
+      const rows = await claimBatch();
+      if (rows.length === 0) {
+        break;
+      }
+
+      const outcomes = await mapWithConcurrency(rows, SEND_CONCURRENCY, async (row) => {
+        if (!row.slots || row.slots.length === 0) {
+          return { outboxId: row.outbox_id, status: 'skipped', error: 'No outstanding documents' };
+        }
+        if (!row.recipients || row.recipients.length === 0) {
+          const error = `No email IDs found for plaza: ${row.plaza_name}`;
+          console.error(error);
+          return { outboxId: row.outbox_id, status: 'failed', error };
+        }
+
+        try {
+          const mail = buildDigest(row, fullLoginUrl);
+          await transporter.sendMail(mail);
+          console.log(`IDR reminder sent to plaza ${row.plaza_name} (${mail.to}), ${row.slots.length} pending`);
+          return { outboxId: row.outbox_id, status: 'sent' };
+        } catch (emailErr) {
+          console.error(`Error sending IDR reminder for plaza ${row.plaza_name}:`, emailErr);
+          return { outboxId: row.outbox_id, status: 'retry', error: emailErr.message };
+        }
+      });
+
+      await recordResults(outcomes);
+
+      if (rows.length < SEND_BATCH_SIZE) {
+        break;
+      }
+    }
+  } catch (err) {
+    console.error('Error in IDR reminder cron job:', err);
+  } finally {
+    running = false;
+  }
+};
+
+// Run the script every 15 minutes
+const job = new cron.CronJob('*/15 * * * *', processIdrReminders);
+
+module.exports = {
+  startIdrReminderJob: () => {
+    job.start();
+  },
+  processIdrReminders,
+  REMINDER_INTERVAL_DAYS,
+};
@@ -1,101 +1,106 @@
 const cron = require('cron');
 const { pool } = require('../config/db');
 const { transporter } = require('../config/mail');
-
-// Helper to format dates as DD-MM-YYYY
-const formatDate = (dateInput) => {
-  const d = new Date(dateInput);
-  const day = String(d.getDate()).padStart(2, '0');
-  const month = String(d.getMonth() + 1).padStart(2, '0');
-  const year = d.getFullYear();
-  return `${day}-${month}-${year}`;
+const { scopeDocuments } = require('../utils/referenceData');
+const {
+  SEND_CONCURRENCY,
+  LEASE_MINUTES,
+  formatDate,
+  mapWithConcurrency,
+  recordResults,
+} = require('../utils/outbox');
+
+// Outbox tuning (see email_outbox in schema.py)
+const BATCH_SIZE = parseInt(process.env.IDR_EMAIL_BATCH_SIZE || '50', 10);
+
+// Claim a batch of due outbox rows and prefetch everything needed to send them
+// (request and all plaza recipients) in one statement; scope documents come from the reference cache.
+// SKIP LOCKED lets several backend replicas drain the outbox without double-sending.
+const claimBatch = async () => {
+  const result = await pool.query(
+    `WITH claimed AS (
+       SELECT id
+       FROM email_outbox
+       WHERE kind = 'idr_request'
+         AND status IN ('pending', 'sending')
+         AND next_attempt_at <= NOW() AT TIME ZONE 'Asia/Kolkata'
+       ORDER BY next_attempt_at
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED
+     ),
+     leased AS (
+       UPDATE email_outbox o
+       SET status = 'sending',
+           attempts = o.attempts + 1,
+           next_attempt_at = NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(mins => $2)
+       FROM claimed
+       WHERE o.id = claimed.id
+       RETURNING o.id, o.idr_master_id, o.attempts
+     )
+     SELECT
+       l.id AS outbox_id,
+       l.attempts,
+       im.id,
+       p.name AS plaza_name,
+       s.scope_name,
+       im.from_date,
+       im.to_date,
+       im.due_date,
+       im.scope_id,
+       s.id IS NOT NULL AS scope_found,
+       r.recipients
+     FROM leased l
+     LEFT JOIN idr_master im ON im.id = l.idr_master_id
+     LEFT JOIN plaza p ON p.id = im.plaza_id
+     LEFT JOIN scope s ON s.id = im.scope_id
+     LEFT JOIN LATERAL (
+       SELECT array_agg(email_id ORDER BY email_id) AS recipients
+       FROM users
+       WHERE plaza_id = im.plaza_id AND email_id IS NOT NULL
+     ) r ON TRUE`,
+    [BATCH_SIZE, LEASE_MINUTES]
+  );
+
+  return result.rows;
 };
 
-// Main worker: find pending IDR emails and send them
-const processPendingIdrEmails = async () => {
-  const client = await pool.connect();
-
-  try {
-    // Find IDR master rows where email has not been sent yet
-    const idrRes = await client.query(
-      `SELECT id, plaza_name, scope_name, from_date, to_date, due_date
-       FROM idr_master
-       WHERE (email_sent IS NULL OR email_sent = '')`
-    );
-
-    if (idrRes.rows.length === 0) {
-      return;
-    }
-
-    // Preload month-independent values
-    const loginUrl = process.env.FRONTEND_URL || 'http://localhost:5174';
-    const fullLoginUrl = `${loginUrl}/login`;
+// Build the mail for one claimed row, or return an error string for data that can never be sent
+const buildMail = (row, fullLoginUrl, documentTypes) => {
+  const { id, plaza_name, scope_name, from_date, to_date, due_date } = row;
 
-    for (const row of idrRes.rows) {
-      const { id, plaza_name, scope_name, from_date, to_date, due_date } = row;
-
-      if (!plaza_name || !scope_name) {
-        console.error(`Skipping IDR row ${id}: missing plaza_name or scope_name`);
-        // Mark as sent to avoid repeated attempts for invalid data
-        await client.query('UPDATE idr_master SET email_sent = $1 WHERE id = $2', ['sent', id]);
-        continue;
-      }
-
-      try {
-        // Get required documents for this scope
-        const scopeRes = await client.query(
-          'SELECT required_documents FROM scope WHERE scope_name = $1',
-          [scope_name]
-        );
-
-        if (scopeRes.rows.length === 0) {
-          console.error(`Scope not found for IDR row ${id}, scope_name: ${scope_name}`);
-          await client.query('UPDATE idr_master SET email_sent = $1 WHERE id = $2', ['sent', id]);
-          continue;
-        }
-
-        const requiredDocumentsStr = scopeRes.rows[0].required_documents || '';
-        const requiredDocuments = requiredDocumentsStr
-          .split(',')
-          .map((doc) => doc.trim())
-          .filter((doc) => doc.length > 0);
-
-        const documentList =
-          requiredDocuments.length > 0
-            ? requiredDocuments.map((doc) => `- ${doc}`).join('\n')
-            : '- No specific document types configured.';
-
-        // Get all emails linked to this plaza
-        const userRes = await client.query(
-          'SELECT email_id FROM users WHERE plaza_name = $1 AND email_id IS NOT NULL',
-          [plaza_name]
-        );
-
-        if (userRes.rows.length === 0) {
-          console.error(`No email IDs found for plaza: ${plaza_name} (IDR row ${id})`);
-          // Mark as sent to avoid infinite retry loop
-          await client.query('UPDATE idr_master SET email_sent = $1 WHERE id = $2', ['sent', id]);
-          continue;
-        }
+  if (!id) {
+    return { error: 'IDR request no longer exists' };
+  }
+  if (!plaza_name || !scope_name) {
+    return { error: `Skipping IDR row ${id}: missing plaza_name or scope_name` };
+  }
+  if (!row.scope_found) {
+    return { error: `Scope not found for IDR row ${id}, scope_name: ${scope_name}` };
+  }
+  if (!row.recipients || row.recipients.length === 0) {
+    return { error: `No email IDs found for plaza: ${plaza_name} (IDR row ${id})` };
+  }
 
-        const toAddresses = userRes.rows.map((u) => u.email_id).join(',');
+  const requiredDocuments = documentTypes.get(row.scope_id) || [];
 
-        const fromDateStr = formatDate(from_date);
-        const toDateStr = formatDate(to_date);
-        const dueDateStr = formatDate(due_date);
+  const documentList =
+    requiredDocuments.length > 0
+      ? requiredDocuments.map((doc) => `- ${doc}`).join('\n')
+      : '- No specific document types configured.';
 
-        const mailOptions = {
-          from: process.env.SMTP_FROM || process.env.SMTP_USER,
-          to: toAddresses,
-          subject: `New IDR Request: ${scope_name}`,
-          text: `Dear User,
+  return {
+    mail: {
+      from: process.env.SMTP_FROM || process.env.SMTP_USER,
+      to: row.recipients.join(','),
+      subject: `New IDR Request: ${scope_name}`,
+      text: `Dear User,
 
 A new IDR request has been created for your plaza (${plaza_name}).
 
 Scope: ${scope_name}
-From: ${fromDateStr}
-To: ${toDateStr}
-Due Date: ${dueDateStr}
+From: ${formatDate(from_date)}
+To: ${formatDate(to_date)}
+Due Date: ${formatDate(due_date)}
 
 Required Document Types:
 ${documentList}
@@ -106,24 +111,59 @@ Login: ${fullLoginUrl}
 
 Regards,
 SNTA Team`,
-        };
-
-        await transporter.sendMail(mailOptions);
-        console.log(
-          `IDR request email sent for row ${id} to plaza ${plaza_name} (${toAddresses})`
-        );
-
-        // Mark as sent so it won't be reprocessed
-        await client.query('UPDATE idr_master SET email_sent = $1 WHERE id = $2', ['sent', id]);
-      } catch (emailErr) {
-        console.error(`Error processing IDR email for row ${id}:`, emailErr);
-        // Do not mark as sent so it will be retried on next cron run
+    },
+  };
+};
+
+// Main worker: drain due IDR request emails from the outbox in batches
+let running = false;
+
+const processPendingIdrEmails = async () => {
+  // A slow SMTP server must not let cron ticks pile up on each other
+  if (running) {
+    return;
+  }
+  running = true;
+
+  try {
+    const loginUrl = process.env.FRONTEND_URL || 'http://localhost:5174';
+    const fullLoginUrl = `${loginUrl}/login`;
+
+    for (;;) {
+      const rows = await claimBatch();
+      if (rows.length === 0) {
+        break;
+      }
+
+      const documentTypes = await scopeDocuments();
+      const outcomes = await mapWithConcurrency(rows, SEND_CONCURRENCY, async (row) => {
+        const { mail, error } = buildMail(row, fullLoginUrl, documentTypes);
+
+        if (error) {
+          console.error(error);
+          return { outboxId: row.outbox_id, status: 'failed', error };
+        }
+
+        try {
+          await transporter.sendMail(mail);
+          console.log(`IDR request email sent for row ${row.id} to plaza ${row.plaza_name} (${mail.to})`);
+          return { outboxId: row.outbox_id, status: 'sent' };
+        } catch (emailErr) {
+          console.error(`Error processing IDR email for row ${row.id} (attempt ${row.attempts}):`, emailErr);
+          return { outboxId: row.outbox_id, status: 'retry', error: emailErr.message };
+        }
+      });
+
+      await recordResults(outcomes);
+
+      if (rows.length < BATCH_SIZE) {
+        break;
       }
     }
   } catch (err) {
     console.error('Error in IDR email cron job:', err);
   } finally {
-    client.release();
+    running = false;
   }
 };
 
@@ -134,6 +174,5 @@ module.exports = {
   startIdrEmailJob: () => {
     job.start();
   },
+  processPendingIdrEmails,
 };
-
-
@@ -0,0 +1,44 @@
+const cron = require('cron');
+const { pool } = require('../config/db');
+
+// Quarters to create ahead of today (PARTITION_QUARTERS_AHEAD in schema.py)
+const QUARTERS_AHEAD = parseInt(process.env.DOCUMENT_PARTITIONS_AHEAD || '2', 10);
+
+// Keep quarter partitions of document_master created ahead of time, so new rows never
+// land in document_master_default. ensure_quarter_partitions() in schema.py skips
+// quarters that already exist and moves any rows out of the default partition.
+// Archived quarters are skipped too; POST /master and uploads refuse their months.
+let running = false;
+
+const ensureDocumentPartitions = async () => {
+  if (running) {
+    return;
+  }
+  running = true;
+
+  try {
+    const result = await pool.query(
+      `SELECT count(*) AS created FROM ensure_quarter_partitions('document_master', $1)`,
+      [QUARTERS_AHEAD]
+    );
+    const created = parseInt(result.rows[0].created, 10);
+    if (created > 0) {
+      console.log(`Created ${created} document_master partition(s)`);
+    }
+  } catch (err) {
+    console.error('Error in partition maintenance job:', err);
+  } finally {
+    running = false;
+  }
+};
+
+// Run on the first day of every month (03:00), and once at startup
+const job = new cron.CronJob('0 3 1 * *', ensureDocumentPartitions);
+
+module.exports = {
+  startPartitionJob: () => {
+    job.start();
+    ensureDocumentPartitions();
+  },
+  ensureDocumentPartitions,
+};
@@ -0,0 +1,142 @@
+const cron = require('cron');
+const { pool } = require('../config/db');
+const { transporter } = require('../config/mail');
+const {
+  mapWithConcurrency,
+  recordResults,
+  SEND_CONCURRENCY,
+  LEASE_MINUTES,
+} = require('../utils/outbox');
+
+// Rejection emails are queued by POST /api/idr/reject-documents with everything they need in payload
+const BATCH_SIZE = parseInt(process.env.REJECTION_EMAIL_BATCH_SIZE || '50', 10);
+
+const monthNames = [
+  "January", "February", "March", "April", "May", "June",
+  "July", "August", "September", "October", "November", "December"
+];
+
+// Claim a batch of due rejection emails (same lease and SKIP LOCKED scheme as the IDR request outbox)
+const claimBatch = async () => {
+  const result = await pool.query(
+    `WITH claimed AS (
+       SELECT id
+       FROM email_outbox
+       WHERE kind = 'document_rejection'
+         AND status IN ('pending', 'sending')
+         AND next_attempt_at <= NOW() AT TIME ZONE 'Asia/Kolkata'
+       ORDER BY next_attempt_at
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED
+     )
+     UPDATE email_outbox o
+     SET status = 'sending',
+         attempts = o.attempts + 1,
+         next_attempt_at = NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(mins => $2)
+     FROM claimed
+     WHERE o.id = claimed.id
+     RETURNING o.id AS outbox_id, o.attempts, o.payload`,
+    [BATCH_SIZE, LEASE_MINUTES]
+  );
+
+  return result.rows;
+};
+
+// Build the rejection email for one plaza
+const buildMail = ({ plaza_name, reason, recipients, documents }, fullLoginUrl) => {
+  const documentList = documents.map(doc => {
+    const monthName = monthNames[parseInt(doc.month) - 1] || doc.month;
+    return `- ${doc.document_type} (${monthName} ${doc.year})`;
+  }).join('\n');
+
+  const emailBody = `
+Dear User,
+
+Your documents have been rejected. Please review the details below and replace them.
+
+Reason for Rejection:
+${reason}
+
+Rejected Documents:
+${documentList}
+
+Please log in to the IDR Portal using the link below and replace the rejected documents:
+${fullLoginUrl}
+
+After logging in, navigate to your document requests and replace the rejected documents with corrected versions.
+
+If you have any questions or need assistance, please contact the administrator.
+
+Best regards,
+Sharp and Tannan Associates
+  `.trim();
+
+  return {
+    from: process.env.SMTP_USER,
+    to: recipients.join(','),
+    subject: `Document Rejection Notification - IDR Portal (${plaza_name})`,
+    text: emailBody,
+  };
+};
+
+// Main worker: drain queued rejection emails in batches
+let running = false;
+
+const processRejectionEmails = async () => {
+  if (running) {
+    return;
+  }
+  running = true;
+
+  try {
+    const loginUrl = process.env.FRONTEND_URL || 'http://localhost:5174';
+    const fullLoginUrl = `${loginUrl}/login`;
+
+    for (;;) {
+      const rows = await claimBatch();
+      if (rows.length === 0) {
+        break;
+      }
+
+      const outcomes = await mapWithConcurrency(rows, SEND_CONCURRENCY, async (row) => {
+        const { plaza_name, recipients } = row.payload;
+
+        if (!recipients || recipients.length === 0) {
+          const error = `Email ID not found for plaza: ${plaza_name}`;
+          console.error(error);
+          return { outboxId: row.outbox_id, status: 'failed', error };
+        }
+
+        try {
+          const mail = buildMail(row.payload, fullLoginUrl);
+          await transporter.sendMail(mail);
+          console.log(`Rejection email sent to ${mail.to} for plaza ${plaza_name}`);
+          return { outboxId: row.outbox_id, status: 'sent' };
+        } catch (emailErr) {
+          console.error(`Error sending rejection email for plaza ${plaza_name} (attempt ${row.attempts}):`, emailErr);
+          return { outboxId: row.outbox_id, status: 'retry', error: emailErr.message };
+        }
+      });
+
+      await recordResults(outcomes);
+
+      if (rows.length < BATCH_SIZE) {
+        break;
+      }
+    }
+  } catch (err) {
+    console.error('Error in rejection email job:', err);
+  } finally {
+    running = false;
+  }
+};
+
+// Catch up every minute on anything the route-triggered run did not send (retries, restarts)
+const job = new cron.CronJob('*/1 * * * *', processRejectionEmails);
+
+module.exports = {
+  startRejectionEmailJob: () => {
+    job.start();
+  },
+  processRejectionEmails,
+};
@@ -0,0 +1,225 @@
+const cron = require('cron');
+const { DeleteObjectsCommand, ListObjectsV2Command } = require('@aws-sdk/client-s3');
+const { pool } = require('../config/db');
+const { s3Client, S3_BUCKET_NAME } = require('../config/s3');
+const { mapWithConcurrency } = require('../utils/outbox');
+
+// Purge queue tuning (see s3_purge_queue in schema.py)
+const BATCH_SIZE = parseInt(process.env.S3_PURGE_BATCH_SIZE || '5000', 10);
+const PURGE_CONCURRENCY = parseInt(process.env.S3_PURGE_CONCURRENCY || '4', 10);
+const MAX_ATTEMPTS = parseInt(process.env.S3_PURGE_MAX_ATTEMPTS || '8', 10);
+const LEASE_MINUTES = 10;
+// DeleteObjects accepts at most 1,000 keys per call
+const KEYS_PER_REQUEST = 1000;
+// Reconciliation leaves recent objects alone: uploads reach S3 before their document_master row
+const RECONCILE_GRACE_HOURS = parseInt(process.env.S3_RECONCILE_GRACE_HOURS || '24', 10);
+const RECONCILE_PREFIX = 'IDR/';
+
+// Claim a batch of due purge rows. Rows whose object is referenced by document_master
+// (or an archived quarter in document_master_archive) again, e.g. an upload matched its
+// document_blob, are closed as 'kept' in the same statement; only the rest are returned
+// for deletion, and their unreferenced document_blob rows are removed so no new upload
+// is matched to an object that is about to disappear.
+const claimBatch = async () => {
+  const result = await pool.query(
+    `WITH claimed AS (
+       SELECT id
+       FROM s3_purge_queue
+       WHERE status IN ('pending', 'purging')
+         AND next_attempt_at <= NOW() AT TIME ZONE 'Asia/Kolkata'
+       ORDER BY next_attempt_at
+       LIMIT $1
+       FOR UPDATE SKIP LOCKED
+     ),
+     leased AS (
+       UPDATE s3_purge_queue q
+       SET status = CASE
+             WHEN EXISTS (SELECT 1 FROM document_master dm WHERE dm.object_key = q.object_key)
+               OR EXISTS (SELECT 1 FROM document_master_archive da WHERE da.object_key = q.object_key)
+               THEN 'kept'
+             ELSE 'purging'
+           END,
+           attempts = q.attempts + 1,
+           next_attempt_at = NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(mins => $2)
+       FROM claimed
+       WHERE q.id = claimed.id
+       RETURNING q.id, q.object_key, q.status, q.attempts
+     ),
+     forgotten AS (
+       DELETE FROM document_blob b
+       USING leased
+       WHERE leased.status = 'purging'
+         AND b.object_key = leased.object_key
+         AND b.ref_count = 0
+     )
+     SELECT id, object_key, attempts
+     FROM leased
+     WHERE status = 'purging'`,
+    [BATCH_SIZE, LEASE_MINUTES]
+  );
+
+  return result.rows;
+};
+
+// Delete one chunk of at most KEYS_PER_REQUEST objects and return an outcome per row
+const deleteChunk = async (rows) => {
+  const keys = [...new Set(rows.map((row) => row.object_key))];
+
+  try {
+    const result = await s3Client.send(new DeleteObjectsCommand({
+      Bucket: S3_BUCKET_NAME,
+      Delete: {
+        Objects: keys.map((Key) => ({ Key })),
+        Quiet: true,
+      },
+    }));
+
+    // Quiet mode only reports the keys that failed
+    const failed = new Map((result.Errors || []).map((error) => [error.Key, `${error.Code}: ${error.Message}`]));
+    return rows.map((row) => (
+      failed.has(row.object_key)
+        ? { id: row.id, status: 'retry', error: failed.get(row.object_key) }
+        : { id: row.id, status: 'purged' }
+    ));
+  } catch (s3Error) {
+    console.error('S3 DeleteObjects error:', s3Error);
+    return rows.map((row) => ({ id: row.id, status: 'retry', error: s3Error.message }));
+  }
+};
+
+// Record the outcome of a whole batch in one statement. Failed deletes go back to
+// 'pending' with exponential backoff until MAX_ATTEMPTS, then become 'failed'.
+const recordResults = async (outcomes) => {
+  await pool.query(
+    `WITH outcome AS (
+       SELECT * FROM unnest($1::int[], $2::text[], $3::text[]) AS r(id, status, error)
+     )
+     UPDATE s3_purge_queue q
+     SET status = CASE
+           WHEN outcome.status = 'retry' AND q.attempts >= $4 THEN 'failed'
+           WHEN outcome.status = 'retry' THEN 'pending'
+           ELSE outcome.status
+         END,
+         last_error = outcome.error,
+         purged_at = CASE WHEN outcome.status = 'purged' THEN NOW() AT TIME ZONE 'Asia/Kolkata' END,
+         next_attempt_at = CASE
+           WHEN outcome.status = 'retry'
+             THEN NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(mins => LEAST(POWER(2, q.attempts)::int, 360))
+           ELSE q.next_attempt_at
+         END
+     FROM outcome
+     WHERE q.id = outcome.id`,
+    [
+      outcomes.map((o) => o.id),
+      outcomes.map((o) => o.status),
+      outcomes.map((o) => o.error || null),
+      MAX_ATTEMPTS,
+    ]
+  );
+};
+
+// Main worker: drain the purge queue in batches
+let running = false;
+
+const processS3Purge = async () => {
+  if (running) {
+    return;
+  }
+  running = true;
+
+  try {
+    for (;;) {
+      const rows = await claimBatch();
+      if (rows.length === 0) {
+        break;
+      }
+
+      const chunks = [];
+      for (let i = 0; i < rows.length; i += KEYS_PER_REQUEST) {
+        chunks.push(rows.slice(i, i + KEYS_PER_REQUEST));
+      }
+
+      const outcomes = (await mapWithConcurrency(chunks, PURGE_CONCURRENCY, deleteChunk)).flat();
+      await recordResults(outcomes);
+
+      const purged = outcomes.filter((o) => o.status === 'purged').length;
+      console.log(`Purged ${purged} S3 object(s), ${outcomes.length - purged} to retry`);
+
+      if (rows.length < BATCH_SIZE) {
+        break;
+      }
+    }
+  } catch (err) {
+    console.error('Error in S3 purge cron job:', err);
+  } finally {
+    running = false;
+  }
+};
+
+// Reconciliation: queue bucket objects under IDR/ that no document_master (or archived) row references,
+// e.g. leftovers from before the purge queue existed or from failed requests.
+let reconciling = false;
+
+const reconcileS3Objects = async () => {
+  if (reconciling) {
+    return;
+  }
+  reconciling = true;
+
+  const cutoff = Date.now() - RECONCILE_GRACE_HOURS * 60 * 60 * 1000;
+  let continuationToken;
+  let scanned = 0;
+  let queued = 0;
+
+  try {
+    do {
+      const page = await s3Client.send(new ListObjectsV2Command({
+        Bucket: S3_BUCKET_NAME,
+        Prefix: RECONCILE_PREFIX,
+        ContinuationToken: continuationToken,
+      }));
+      continuationToken = page.NextContinuationToken;
+
+      const keys = (page.Contents || [])
+        .filter((object) => object.LastModified && object.LastModified.getTime() < cutoff)
+        .map((object) => object.Key);
+      scanned += (page.Contents || []).length;
+
+      if (keys.length > 0) {
+        // One statement per listing page (up to 1,000 keys)
+        const result = await pool.query(
+          `INSERT INTO s3_purge_queue (object_key)
+           SELECT o.object_key
+           FROM unnest($1::text[]) AS o(object_key)
+           WHERE NOT EXISTS (SELECT 1 FROM document_master dm WHERE dm.object_key = o.object_key)
+             AND NOT EXISTS (SELECT 1 FROM document_master_archive da WHERE da.object_key = o.object_key)
+             AND NOT EXISTS (
+               SELECT 1 FROM s3_purge_queue q
+               WHERE q.object_key = o.object_key AND q.status IN ('pending', 'purging')
+             )`,
+          [keys]
+        );
+        queued += result.rowCount;
+      }
+    } while (continuationToken);
+
+    console.log(`S3 reconciliation scanned ${scanned} object(s), queued ${queued} unreferenced`);
+  } catch (err) {
+    console.error('Error in S3 reconciliation job:', err);
+  } finally {
+    reconciling = false;
+  }
+};
+
+// Drain the queue every minute; reconcile once a night (02:30)
+const purgeJob = new cron.CronJob('*/1 * * * *', processS3Purge);
+const reconcileJob = new cron.CronJob('30 2 * * *', reconcileS3Objects);
+
+module.exports = {
+  startS3PurgeJob: () => {
+    purgeJob.start();
+    reconcileJob.start();
+  },
+  processS3Purge,
+  reconcileS3Objects,
+};
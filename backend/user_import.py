@@ -0,0 +1,286 @@
+"""
+User provisioning for Plaza Portal: bcrypt-hashed bulk inserts (add_users) and the
+streaming upload_excel.xlsx importer behind `python db_init.py import-users`.
+"""
+
+import csv
+import os
+import secrets
+
+from db import db_connection
+
+
+# bcrypt cost factor for stored passwords (routes/auth.js verifies them with bcrypt.compare)
+BCRYPT_ROUNDS = 12
+
+
+def hash_password(password):
+    """Return the bcrypt hash of one password as text."""
+    import bcrypt
+
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash a list of passwords on a process pool so cost-12 hashes use every core.
+    workers defaults to os.cpu_count(); workers=1 hashes in-process.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < 2:
+        return [hash_password(password) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(passwords))) as executor:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(executor.map(hash_password, passwords, chunksize=chunksize))
+
+
+def add_users(users, workers=None):
+    """
+    Add many users in one transaction.
+
+    users is an iterable of dicts with add_user()'s keyword arguments. Existing emails
+    are found with a single = ANY() query, only the new users' passwords are hashed
+    (on a process pool, see hash_passwords) and they go in as one multi-row INSERT.
+    Returns {email_id: user_id} for the inserted users, or None on error.
+    """
+    from psycopg2.extras import execute_values
+
+    users = list(users)
+    seen_emails = set()
+    try:
+        for user in users:
+            # Validate required fields
+            if not user.get('name') or not user.get('email_id') or not user.get('password') or not user.get('role'):
+                raise ValueError("Name, email_id, password, and role are required fields")
+            if user['email_id'] in seen_emails:
+                raise ValueError(f"Email '{user['email_id']}' is listed more than once")
+            seen_emails.add(user['email_id'])
+    except ValueError as e:
+        print(f"Validation error: {e}")
+        return None
+
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            # Check which emails already exist
+            cursor.execute("SELECT email_id FROM users WHERE email_id = ANY(%s)", (list(seen_emails),))
+            existing = {row[0] for row in cursor.fetchall()}
+            for email_id in sorted(existing):
+                print(f"Skipping '{email_id}': user already exists")
+
+            new_users = [user for user in users if user['email_id'] not in existing]
+            hashes = hash_passwords([user['password'] for user in new_users], workers)
+
+            # Insert new users with IST timezone for created_at
+            rows = []
+            if new_users:
+                rows = execute_values(cursor, """
+                    INSERT INTO users (name, designation, email_id, mob_no, user_code, role, password, temp_login, created_at)
+                    VALUES %s
+                    ON CONFLICT (email_id) DO NOTHING
+                    RETURNING email_id, id
+                """, [
+                    (
+                        user['name'],
+                        user.get('designation'),
+                        user['email_id'],
+                        user.get('mob_no'),
+                        user.get('user_code'),
+                        user['role'],
+                        password_hash,
+                        user.get('temp_login') is not False,
+                    )
+                    for user, password_hash in zip(new_users, hashes)
+                ], template="(%s, %s, %s, %s, %s, %s, %s, %s, (NOW() AT TIME ZONE 'Asia/Kolkata'))",
+                   page_size=len(new_users), fetch=True)
+            conn.commit()
+
+    except Exception as e:
+        print(f"Error adding users: {e}")
+        return None
+
+    user_ids = dict(rows)
+    print(f"Added {len(user_ids)} user(s), {len(users) - len(user_ids)} skipped.")
+    return user_ids
+
+
+def add_user(name, email_id, password, role, designation=None, mob_no=None, user_code=None, temp_login=None):
+    """Add a single user; see add_users()."""
+    user_ids = add_users([{
+        'name': name,
+        'email_id': email_id,
+        'password': password,
+        'role': role,
+        'designation': designation,
+        'mob_no': mob_no,
+        'user_code': user_code,
+        'temp_login': temp_login,
+    }], workers=1)
+
+    if not user_ids:
+        return None
+
+    print(f"User '{name}' (ID: {user_ids[email_id]}) added successfully!")
+    return user_ids[email_id]
+
+
+# Column layout of upload_excel.xlsx (header -> users column), shared with POST /api/users/bulk
+USER_IMPORT_COLUMNS = {
+    'name': 'name',
+    'email': 'email_id',
+    'designation': 'designation',
+    'mobile': 'mob_no',
+    'user code': 'user_code',
+    'user type': 'role',
+}
+
+USER_IMPORT_CHUNK_SIZE = 5000
+
+
+def read_user_rows(path):
+    """
+    Stream (row_number, {users column: value}) pairs from the first sheet of an
+    upload_excel.xlsx-style workbook without loading the whole sheet into memory.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportError("openpyxl is not installed. Install it using: pip install openpyxl") from e
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+
+        header = [str(h or '').strip().lower() for h in next(rows, ())]
+        missing = [h for h in USER_IMPORT_COLUMNS if h not in header]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        positions = {column: header.index(h) for h, column in USER_IMPORT_COLUMNS.items()}
+
+        for row_number, row in enumerate(rows, start=2):
+            values = {
+                column: (str(row[i]).strip() if i < len(row) and row[i] is not None else '')
+                for column, i in positions.items()
+            }
+            if any(values.values()):
+                yield row_number, values
+    finally:
+        workbook.close()
+
+
+def load_user_chunk(cursor, chunk, seen_emails):
+    """
+    Validate and insert one chunk of (row_number, values) pairs.
+
+    Duplicates are found with one = ANY() query per chunk and the valid rows go in as
+    a single multi-row INSERT ... ON CONFLICT DO NOTHING, so a row that races another
+    writer is reported instead of aborting the import. Returns (inserted, errors).
+    """
+    from psycopg2.extras import execute_values
+
+    errors = []
+    candidates = []
+    for row_number, values in chunk:
+        email_id = values['email_id']
+        if not values['name'] or not email_id or not values['role']:
+            errors.append((row_number, email_id, 'Name, Email, and User Type are required'))
+        elif email_id in seen_emails:
+            errors.append((row_number, email_id, 'Duplicate email in file'))
+        else:
+            seen_emails.add(email_id)
+            candidates.append((row_number, values))
+
+    cursor.execute(
+        "SELECT email_id FROM users WHERE email_id = ANY(%s)",
+        ([values['email_id'] for _, values in candidates],),
+    )
+    existing = {row[0] for row in cursor.fetchall()}
+
+    to_insert = []
+    for row_number, values in candidates:
+        if values['email_id'] in existing:
+            errors.append((row_number, values['email_id'], 'User with this email already exists'))
+        else:
+            to_insert.append((row_number, values))
+
+    if not to_insert:
+        return 0, errors
+
+    # Temporary password; replaced and mailed by the login email job (login_email_sent = FALSE)
+    inserted_emails = execute_values(cursor, """
+        INSERT INTO users (name, designation, email_id, mob_no, user_code, role, password)
+        VALUES %s
+        ON CONFLICT (email_id) DO NOTHING
+        RETURNING email_id
+    """, [
+        (
+            values['name'],
+            values['designation'] or None,
+            values['email_id'],
+            values['mob_no'] or None,
+            values['user_code'] or None,
+            values['role'],
+            secrets.token_hex(12),
+        )
+        for _, values in to_insert
+    ], page_size=len(to_insert), fetch=True)
+    inserted_emails = {row[0] for row in inserted_emails}
+
+    for row_number, values in to_insert:
+        if values['email_id'] not in inserted_emails:
+            errors.append((row_number, values['email_id'], 'User with this email already exists'))
+
+    return len(inserted_emails), errors
+
+
+def import_users(path, report_path=None, dry_run=False):
+    """
+    Bulk-import users from an upload_excel.xlsx-style workbook.
+
+    Rows are streamed and loaded in chunks inside one transaction. Invalid or
+    duplicate rows are skipped and listed in the per-row error report (printed, and
+    written as CSV to report_path if given) instead of aborting the import.
+    With dry_run the whole import is rolled back after validation and loading.
+    """
+    inserted = 0
+    errors = []
+
+    try:
+        with db_connection() as conn, conn.cursor() as cursor:
+            seen_emails = set()
+            chunk = []
+            for item in read_user_rows(path):
+                chunk.append(item)
+                if len(chunk) >= USER_IMPORT_CHUNK_SIZE:
+                    chunk_inserted, chunk_errors = load_user_chunk(cursor, chunk, seen_emails)
+                    inserted += chunk_inserted
+                    errors.extend(chunk_errors)
+                    chunk = []
+            if chunk:
+                chunk_inserted, chunk_errors = load_user_chunk(cursor, chunk, seen_emails)
+                inserted += chunk_inserted
+                errors.extend(chunk_errors)
+
+            if not dry_run:
+                conn.commit()
+
+    except Exception as e:
+        print(f"Error importing users: {e}")
+        return None
+
+    if report_path:
+        with open(report_path, 'w', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(['row', 'email', 'error'])
+            writer.writerows(sorted(errors))
+
+    for row_number, email_id, error in sorted(errors)[:50]:
+        print(f"Row {row_number} ({email_id or 'no email'}): {error}")
+    if len(errors) > 50:
+        print(f"... and {len(errors) - 50} more row error(s)")
+    print(f"{'Validated' if dry_run else 'Imported'} {inserted} user(s), {len(errors)} row(s) rejected.")
+
+    return {'inserted': inserted, 'errors': sorted(errors)}
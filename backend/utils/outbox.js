@@ -0,0 +1,84 @@
+const { pool } = require('../config/db');
+
+/**
+ * Helpers shared by the cron workers that drain email_outbox (see schema.py)
+ * and the other background queues.
+ */
+
+// Outbox tuning
+const SEND_CONCURRENCY = parseInt(process.env.IDR_EMAIL_CONCURRENCY || '5', 10);
+const MAX_ATTEMPTS = parseInt(process.env.IDR_EMAIL_MAX_ATTEMPTS || '8', 10);
+const LEASE_MINUTES = 10;
+
+// Helper to format dates as DD-MM-YYYY
+const formatDate = (dateInput) => {
+  const d = new Date(dateInput);
+  const day = String(d.getDate()).padStart(2, '0');
+  const month = String(d.getMonth() + 1).padStart(2, '0');
+  const year = d.getFullYear();
+  return `${day}-${month}-${year}`;
+};
+
+// Run async work over items with at most `limit` tasks in flight
+const mapWithConcurrency = async (items, limit, worker) => {
+  const results = new Array(items.length);
+  let next = 0;
+
+  const runners = Array.from({ length: Math.min(limit, items.length) }, async () => {
+    while (next < items.length) {
+      const index = next;
+      next += 1;
+      results[index] = await worker(items[index]);
+    }
+  });
+
+  await Promise.all(runners);
+  return results;
+};
+
+// Record the outcome of a whole batch in one statement. Failed sends go back to
+// 'pending' with exponential backoff until MAX_ATTEMPTS, invalid rows become 'failed'.
+const recordResults = async (outcomes) => {
+  await pool.query(
+    `WITH outcome AS (
+       SELECT * FROM unnest($1::int[], $2::text[], $3::text[]) AS r(id, status, error)
+     ),
+     updated AS (
+       UPDATE email_outbox o
+       SET status = CASE
+             WHEN outcome.status = 'retry' AND o.attempts >= $4 THEN 'failed'
+             WHEN outcome.status = 'retry' THEN 'pending'
+             ELSE outcome.status
+           END,
+           last_error = outcome.error,
+           sent_at = CASE WHEN outcome.status = 'sent' THEN NOW() AT TIME ZONE 'Asia/Kolkata' END,
+           next_attempt_at = CASE
+             WHEN outcome.status = 'retry'
+               THEN NOW() AT TIME ZONE 'Asia/Kolkata' + make_interval(mins => LEAST(POWER(2, o.attempts)::int, 360))
+             ELSE o.next_attempt_at
+           END
+       FROM outcome
+       WHERE o.id = outcome.id
+       RETURNING o.idr_master_id, o.status
+     )
+     UPDATE idr_master im
+     SET email_sent = TRUE
+     FROM updated
+     WHERE im.id = updated.idr_master_id AND updated.status IN ('sent', 'failed')`,
+    [
+      outcomes.map((o) => o.outboxId),
+      outcomes.map((o) => o.status),
+      outcomes.map((o) => o.error || null),
+      MAX_ATTEMPTS,
+    ]
+  );
+};
+
+module.exports = {
+  SEND_CONCURRENCY,
+  MAX_ATTEMPTS,
+  LEASE_MINUTES,
+  formatDate,
+  mapWithConcurrency,
+  recordResults,
+};
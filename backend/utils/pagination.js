@@ -0,0 +1,58 @@
+/**
+ * Keyset pagination helpers.
+ * A cursor is the sort key of the last row of a page, as returned by the query
+ * in a `sort_key` json_build_array(...) column, encoded as base64url JSON.
+ */
+
+const DEFAULT_PAGE_SIZE = 200;
+const MAX_PAGE_SIZE = 1000;
+
+// Error for a malformed cursor or page size (reported as 400 by the routes)
+class PaginationError extends Error {}
+
+function parseLimit(limit) {
+  if (limit === undefined || limit === '') {
+    return DEFAULT_PAGE_SIZE;
+  }
+  const parsed = parseInt(limit, 10);
+  if (!Number.isInteger(parsed) || parsed < 1) {
+    throw new PaginationError('limit must be a positive integer');
+  }
+  return Math.min(parsed, MAX_PAGE_SIZE);
+}
+
+function decodeCursor(cursor, length) {
+  if (!cursor) {
+    return null;
+  }
+  try {
+    const values = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    if (Array.isArray(values) && values.length === length) {
+      return values;
+    }
+  } catch (error) {
+    // fall through
+  }
+  throw new PaginationError('Invalid cursor');
+}
+
+/**
+ * Split a LIMIT limit + 1 result into the page and the cursor of the next page
+ * @returns {{ rows: object[], nextCursor: string|null }}
+ */
+function toPage(rows, limit) {
+  const page = rows.slice(0, limit).map(({ sort_key, ...row }) => row);
+  const nextCursor = rows.length > limit
+    ? Buffer.from(JSON.stringify(rows[limit - 1].sort_key)).toString('base64url')
+    : null;
+  return { rows: page, nextCursor };
+}
+
+module.exports = {
+  DEFAULT_PAGE_SIZE,
+  MAX_PAGE_SIZE,
+  PaginationError,
+  parseLimit,
+  decodeCursor,
+  toPage,
+};
@@ -0,0 +1,117 @@
+/**
+ * In-process query statistics for the shared pg pool (see config/db.js).
+ * Queries are grouped by name, which is their SQL text with whitespace collapsed,
+ * and slow queries are kept in a bounded sample with their parameters redacted.
+ */
+
+const MAX_NAME_LENGTH = 200;
+
+// Keep the shape of a parameter but never its value
+function redactParam(value) {
+  if (value === null || value === undefined) {
+    return null;
+  }
+  if (Array.isArray(value)) {
+    return `<array:${value.length}>`;
+  }
+  if (Buffer.isBuffer(value)) {
+    return `<buffer:${value.length}>`;
+  }
+  if (value instanceof Date) {
+    return '<date>';
+  }
+  if (typeof value === 'string') {
+    return `<string:${value.length}>`;
+  }
+  return `<${typeof value}>`;
+}
+
+function queryName(text) {
+  return String(text || '').replace(/\s+/g, ' ').trim().slice(0, MAX_NAME_LENGTH);
+}
+
+function createQueryStats({ slowQueryMs, maxSlowQueries, maxNames }) {
+  const queries = new Map();
+  const slowQueries = [];
+  const poolWait = { count: 0, totalMs: 0, maxMs: 0 };
+  let maxWaiting = 0;
+
+  return {
+    recordQuery(text, params, durationMs, error) {
+      const name = queryName(text);
+      let entry = queries.get(name);
+      if (!entry) {
+        // Unbounded dynamic SQL must not grow the map forever; drop the oldest name
+        if (queries.size >= maxNames) {
+          queries.delete(queries.keys().next().value);
+        }
+        entry = { calls: 0, errors: 0, totalMs: 0, maxMs: 0 };
+        queries.set(name, entry);
+      }
+      entry.calls += 1;
+      entry.totalMs += durationMs;
+      entry.maxMs = Math.max(entry.maxMs, durationMs);
+      if (error) {
+        entry.errors += 1;
+      }
+
+      if (durationMs >= slowQueryMs) {
+        const sample = {
+          name,
+          durationMs: Math.round(durationMs),
+          params: (params || []).map(redactParam),
+          error: error ? error.message : undefined,
+          at: new Date().toISOString(),
+        };
+        slowQueries.push(sample);
+        if (slowQueries.length > maxSlowQueries) {
+          slowQueries.shift();
+        }
+        console.warn(`Slow query (${sample.durationMs} ms): ${name}`, sample.params);
+      }
+    },
+
+    recordPoolWait(durationMs, waitingCount) {
+      poolWait.count += 1;
+      poolWait.totalMs += durationMs;
+      poolWait.maxMs = Math.max(poolWait.maxMs, durationMs);
+      maxWaiting = Math.max(maxWaiting, waitingCount);
+    },
+
+    // Totals since start (or the last reset), slowest names first
+    snapshot(pool) {
+      const round = (ms) => Math.round(ms * 100) / 100;
+      return {
+        pool: {
+          total: pool.totalCount,
+          idle: pool.idleCount,
+          waiting: pool.waitingCount,
+          maxWaiting,
+          acquisitions: poolWait.count,
+          meanWaitMs: round(poolWait.count ? poolWait.totalMs / poolWait.count : 0),
+          maxWaitMs: round(poolWait.maxMs),
+        },
+        queries: [...queries.entries()]
+          .map(([name, entry]) => ({
+            name,
+            calls: entry.calls,
+            errors: entry.errors,
+            totalMs: round(entry.totalMs),
+            meanMs: round(entry.totalMs / entry.calls),
+            maxMs: round(entry.maxMs),
+          }))
+          .sort((a, b) => b.totalMs - a.totalMs),
+        slowQueries: [...slowQueries],
+      };
+    },
+
+    reset() {
+      queries.clear();
+      slowQueries.length = 0;
+      Object.assign(poolWait, { count: 0, totalMs: 0, maxMs: 0 });
+      maxWaiting = 0;
+    },
+  };
+}
+
+module.exports = { createQueryStats, redactParam, queryName };
@@ -0,0 +1,133 @@
+/**
+ * In-process read-through cache for reference data (scopes, plazas, clients).
+ * Every entry names the tables it was read from. schema.py declares triggers that
+ * NOTIFY the channel with the table name on every write, so each backend replica drops
+ * the affected entries without polling. While the LISTEN connection is down nothing is
+ * cached, because invalidations could be missed; the cache starts empty on reconnect.
+ */
+function createReferenceCache({ connect, channel, maxEntries, retryMs }) {
+  const entries = new Map();
+  const stats = new Map();
+  let listening = false;
+  let listener = null;
+  let notifications = 0;
+  let bypasses = 0;
+
+  const statsFor = (name) => {
+    let entry = stats.get(name);
+    if (!entry) {
+      entry = { hits: 0, misses: 0, invalidations: 0 };
+      stats.set(name, entry);
+    }
+    return entry;
+  };
+
+  const invalidate = (table) => {
+    for (const [key, entry] of entries) {
+      if (entry.tables.includes(table)) {
+        entries.delete(key);
+        statsFor(entry.name).invalidations += 1;
+      }
+    }
+  };
+
+  const stopListening = () => {
+    listening = false;
+    entries.clear();
+  };
+
+  const listen = async () => {
+    if (listener) {
+      return;
+    }
+    const client = connect();
+    listener = client;
+
+    let retrying = false;
+    const retry = (error) => {
+      if (retrying) {
+        return;
+      }
+      retrying = true;
+      if (error) {
+        console.error('Reference cache listener error:', error);
+      }
+      stopListening();
+      listener = null;
+      client.end().catch(() => {});
+      setTimeout(() => listen(), retryMs);
+    };
+
+    client.on('notification', (message) => {
+      notifications += 1;
+      invalidate(message.payload);
+    });
+    client.on('error', retry);
+    client.on('end', () => retry());
+
+    try {
+      await client.connect();
+      await client.query(`LISTEN ${channel}`);
+      // Anything cached before this point may have missed an invalidation
+      entries.clear();
+      listening = true;
+    } catch (error) {
+      retry(error);
+    }
+  };
+
+  return {
+    listen,
+
+    /**
+     * Return the cached value of key, or load() it. A pending load is shared by every
+     * caller and is dropped if one of its tables changes meanwhile, or if it fails.
+     */
+    get({ name, key = name, tables }, load) {
+      if (!listening) {
+        bypasses += 1;
+        return load();
+      }
+
+      const cached = entries.get(key);
+      if (cached) {
+        statsFor(name).hits += 1;
+        return cached.value;
+      }
+
+      statsFor(name).misses += 1;
+      const entry = { name, tables, value: Promise.resolve().then(load) };
+      entry.value.catch(() => {
+        if (entries.get(key) === entry) {
+          entries.delete(key);
+        }
+      });
+      entries.set(key, entry);
+      if (entries.size > maxEntries) {
+        entries.delete(entries.keys().next().value);
+      }
+      return entry.value;
+    },
+
+    invalidate,
+
+    // Counters since start (or the last reset), by entry name
+    snapshot() {
+      return {
+        listening,
+        entries: entries.size,
+        notifications,
+        bypasses,
+        lookups: Object.fromEntries([...stats].map(([name, entry]) => [name, { ...entry }])),
+      };
+    },
+
+    reset() {
+      stats.clear();
+      notifications = 0;
+      bypasses = 0;
+    },
+  };
+}
+
+module.exports = { createReferenceCache };
@@ -0,0 +1,94 @@
+const { pool, referenceCache } = require('../config/db');
+
+/**
+ * Reference lookups served from referenceCache (config/db.js). Each one lists the tables
+ * it reads; a write to any of them drops the cached value on every backend replica.
+ * Cached values are shared between callers and must not be modified.
+ */
+
+// Required documents are stored one scope_document row each and returned as the
+// comma-separated list the frontend sends
+const REQUIRED_DOCUMENTS = `(
+  SELECT string_agg(sd.document_type, ', ' ORDER BY sd.position)
+  FROM scope_document sd
+  WHERE sd.scope_id = s.id
+) AS required_documents`;
+
+const SCOPE_TABLES = ['scope', 'scope_document'];
+
+// Every scope with its required documents, by name
+const listScopes = () => referenceCache.get({ name: 'scopes', tables: SCOPE_TABLES }, async () => {
+  const result = await pool.query(
+    `SELECT s.id, s.scope_name, ${REQUIRED_DOCUMENTS}
+     FROM scope s
+     ORDER BY s.scope_name`
+  );
+  return result.rows;
+});
+
+// Scope of a name (the oldest one if the name is used twice), or null
+const findScope = (scopeName) => referenceCache.get(
+  { name: 'scope', key: `scope:${scopeName}`, tables: SCOPE_TABLES },
+  async () => {
+    const result = await pool.query(
+      `SELECT s.id, s.scope_name, ${REQUIRED_DOCUMENTS}
+       FROM scope s
+       WHERE s.scope_name = $1
+       ORDER BY s.id
+       LIMIT 1`,
+      [scopeName]
+    );
+    return result.rows[0] || null;
+  }
+);
+
+// Map of scope id -> required document types in order, for the email workers
+const scopeDocuments = () => referenceCache.get({ name: 'scope_documents', tables: ['scope_document'] }, async () => {
+  const result = await pool.query(
+    `SELECT scope_id, array_agg(document_type ORDER BY position) AS document_types
+     FROM scope_document
+     GROUP BY scope_id`
+  );
+  return new Map(result.rows.map((row) => [row.scope_id, row.document_types]));
+});
+
+// Names of the scopes that have IDR requests
+const requestedScopeNames = () => referenceCache.get({ name: 'requested_scopes', tables: ['scope', 'idr_master'] }, async () => {
+  const result = await pool.query(
+    `SELECT DISTINCT s.scope_name
+     FROM scope s
+     WHERE s.scope_name IS NOT NULL
+       AND EXISTS (SELECT 1 FROM idr_master im WHERE im.scope_id = s.id)
+     ORDER BY s.scope_name`
+  );
+  return result.rows.map((row) => row.scope_name);
+});
+
+// Names of the plazas that have at least one user assigned
+const assignedPlazaNames = () => referenceCache.get({ name: 'assigned_plazas', tables: ['plaza', 'users'] }, async () => {
+  const result = await pool.query(
+    `SELECT p.name
+     FROM plaza p
+     WHERE EXISTS (SELECT 1 FROM users u WHERE u.plaza_id = p.id)
+     ORDER BY p.name`
+  );
+  return result.rows.map((row) => row.name);
+});
+
+// Client users without a plaza
+const unassignedClients = () => referenceCache.get({ name: 'unassigned_clients', tables: ['users'] }, async () => {
+  const result = await pool.query(
+    'SELECT id, email_id, name FROM users WHERE LOWER(role) = LOWER($1) AND plaza_id IS NULL ORDER BY email_id',
+    ['client']
+  );
+  return result.rows;
+});
+
+module.exports = {
+  listScopes,
+  findScope,
+  scopeDocuments,
+  requestedScopeNames,
+  assignedPlazaNames,
+  unassignedClients,
+};
@@ -0,0 +1,229 @@
+const crypto = require('crypto');
+const {
+  PutObjectCommand,
+  CreateMultipartUploadCommand,
+  UploadPartCommand,
+  CompleteMultipartUploadCommand,
+  AbortMultipartUploadCommand,
+  DeleteObjectCommand,
+} = require('@aws-sdk/client-s3');
+
+// S3 rejects multipart parts smaller than 5 MB (except the last one)
+const MIN_PART_SIZE = 5 * 1024 * 1024;
+
+const MAX_UPLOAD_BYTES = parseInt(process.env.MAX_UPLOAD_MB || '500', 10) * 1024 * 1024;
+const PART_SIZE = Math.max(parseInt(process.env.S3_UPLOAD_PART_MB || '8', 10) * 1024 * 1024, MIN_PART_SIZE);
+const QUEUE_SIZE = parseInt(process.env.S3_UPLOAD_QUEUE_SIZE || '4', 10);
+
+/**
+ * Stream a readable into S3. Files smaller than one part go up as a single PutObject,
+ * larger ones as a multipart upload with at most queueSize parts in flight, so memory
+ * stays around partSize * (queueSize + 1) whatever the file size.
+ * The multipart upload is aborted if the stream or any part fails.
+ *
+ * The content is hashed (SHA-256) as it streams. When findExisting(sha256) returns the key of
+ * an object with the same content, nothing is stored: a small file skips its PutObject and a
+ * multipart upload is aborted instead of completed.
+ * @returns {Promise<{size: number, sha256: string, existingKey: string|null}>}
+ */
+async function uploadStream(s3Client, {
+  Bucket, Key, ContentType, Body, partSize = PART_SIZE, queueSize = QUEUE_SIZE, findExisting = null,
+}) {
+  const hash = crypto.createHash('sha256');
+  let chunks = [];
+  let buffered = 0;
+  let size = 0;
+  let uploadId = null;
+  const parts = [];
+  const inFlight = new Set();
+  // First failed part. A part can fail while nothing is waiting on it, so every wait
+  // below checks this instead of relying on the part's promise rejecting.
+  let partError = null;
+
+  const startPart = (body) => {
+    const part = { PartNumber: parts.length + 1 };
+    parts.push(part);
+    const request = s3Client
+      .send(new UploadPartCommand({ Bucket, Key, UploadId: uploadId, PartNumber: part.PartNumber, Body: body }))
+      .then(
+        (result) => {
+          part.ETag = result.ETag;
+        },
+        (error) => {
+          partError = partError || error;
+        }
+      )
+      .finally(() => inFlight.delete(request));
+    inFlight.add(request);
+  };
+
+  // Wait until at most `limit` parts are in flight, then fail if any part has failed
+  const drainTo = async (limit) => {
+    while (inFlight.size > limit) {
+      await Promise.race(inFlight);
+    }
+    if (partError) {
+      throw partError;
+    }
+  };
+
+  try {
+    // Async iteration pauses the source while we wait for a free part slot
+    for await (const chunk of Body) {
+      hash.update(chunk);
+      chunks.push(chunk);
+      buffered += chunk.length;
+      size += chunk.length;
+
+      if (buffered >= partSize) {
+        if (!uploadId) {
+          const created = await s3Client.send(new CreateMultipartUploadCommand({ Bucket, Key, ContentType }));
+          uploadId = created.UploadId;
+        }
+        await drainTo(queueSize - 1);
+        startPart(Buffer.concat(chunks, buffered));
+        chunks = [];
+        buffered = 0;
+      }
+    }
+
+    // multer/busboy truncate the stream instead of failing it when the size limit is hit
+    if (Body.truncated) {
+      throw Object.assign(new Error('File too large'), { code: 'LIMIT_FILE_SIZE' });
+    }
+
+    const sha256 = hash.digest('hex');
+    const existingKey = findExisting ? await findExisting(sha256) : null;
+    if (existingKey) {
+      if (uploadId) {
+        await drainTo(0);
+        await s3Client.send(new AbortMultipartUploadCommand({ Bucket, Key, UploadId: uploadId }));
+      }
+      return { size, sha256, existingKey };
+    }
+
+    if (!uploadId) {
+      await s3Client.send(new PutObjectCommand({ Bucket, Key, ContentType, Body: Buffer.concat(chunks, buffered) }));
+      return { size, sha256, existingKey: null };
+    }
+
+    if (buffered > 0) {
+      await drainTo(queueSize - 1);
+      startPart(Buffer.concat(chunks, buffered));
+      chunks = [];
+    }
+    await drainTo(0);
+
+    await s3Client.send(new CompleteMultipartUploadCommand({
+      Bucket,
+      Key,
+      UploadId: uploadId,
+      MultipartUpload: { Parts: parts },
+    }));
+    return { size, sha256, existingKey: null };
+  } catch (error) {
+    if (uploadId) {
+      await Promise.allSettled(inFlight);
+      await s3Client
+        .send(new AbortMultipartUploadCommand({ Bucket, Key, UploadId: uploadId }))
+        .catch((abortError) => console.error('S3 multipart abort error:', abortError));
+    }
+    throw error;
+  }
+}
+
+/**
+ * multer storage engine that streams each file straight into S3 instead of
+ * buffering it in memory. resolveKey(req, file) returns the object key; it runs
+ * when the file part starts, so form fields it needs must be sent before the file.
+ *
+ * With blobs ({ find(sha256), register({ sha256, key, size }) }) uploads are deduplicated by
+ * content: a file whose hash find() knows is not stored again, and a new object is registered,
+ * which returns the key the content is stored under if an identical upload registered first.
+ * The stored file carries { key, url, size, sha256, deduplicated }.
+ */
+function s3StreamStorage({ s3Client, bucket, resolveKey, objectUrl, blobs = null }) {
+  return {
+    _handleFile(req, file, cb) {
+      (async () => {
+        const key = await resolveKey(req, file);
+        const { size, sha256, existingKey } = await uploadStream(s3Client, {
+          Bucket: bucket,
+          Key: key,
+          ContentType: file.mimetype,
+          Body: file.stream,
+          findExisting: blobs ? blobs.find : null,
+        });
+
+        let storedKey = existingKey || key;
+        if (blobs && !existingKey) {
+          storedKey = await blobs.register({ sha256, key, size });
+          if (storedKey !== key) {
+            // Lost the race to an identical upload; share its object and drop ours
+            await s3Client.send(new DeleteObjectCommand({ Bucket: bucket, Key: key }));
+          }
+        }
+        return { key: storedKey, url: objectUrl(storedKey), size, sha256, deduplicated: storedKey !== key };
+      })().then(
+        (info) => cb(null, info),
+        (error) => {
+          // Drain the rest of the part so the request can finish
+          file.stream.resume();
+          cb(error);
+        }
+      );
+    },
+
+    _removeFile(req, file, cb) {
+      // Files that failed mid-upload were never stored, and shared objects belong to other documents
+      if (!file.key || file.deduplicated) {
+        return cb(null);
+      }
+      return s3Client
+        .send(new DeleteObjectCommand({ Bucket: bucket, Key: file.key }))
+        .then(() => cb(null), cb);
+    },
+  };
+}
+
+/**
+ * Wrap upload.single(field) so upload and validation errors become JSON responses
+ * (413 for the size cap, error.status for resolveKey rejections) like the routes' own.
+ */
+function singleFileUpload(upload, field) {
+  const handler = upload.single(field);
+  return (req, res, next) => {
+    handler(req, res, (error) => {
+      if (!error) {
+        return next();
+      }
+      if (error.code === 'LIMIT_FILE_SIZE') {
+        return res.status(413).json({
+          success: false,
+          message: `File exceeds the ${Math.round(MAX_UPLOAD_BYTES / (1024 * 1024))} MB upload limit`,
+        });
+      }
+      if (error.status) {
+        return res.status(error.status).json({
+          success: false,
+          message: error.message,
+        });
+      }
+      console.error('File upload error:', error);
+      return res.status(500).json({
+        success: false,
+        message: 'Internal server error',
+        error: error.message,
+      });
+    });
+  };
+}
+
+module.exports = {
+  MAX_UPLOAD_BYTES,
+  PART_SIZE,
+  QUEUE_SIZE,
+  uploadStream,
+  s3StreamStorage,
+  singleFileUpload,
+};
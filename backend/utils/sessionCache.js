@@ -0,0 +1,54 @@
+/**
+ * Bounded LRU cache of verified session tokens.
+ * Entries expire after ttlMs or at the JWT's own exp, whichever comes first,
+ * and the least recently used entry is evicted once maxEntries is reached.
+ */
+function createSessionCache({ maxEntries, ttlMs }) {
+  // Map iteration order is insertion order, so re-inserting on a hit keeps it LRU
+  const entries = new Map();
+
+  return {
+    get(token) {
+      const entry = entries.get(token);
+      if (!entry) {
+        return null;
+      }
+      if (entry.expiresAt <= Date.now()) {
+        entries.delete(token);
+        return null;
+      }
+      entries.delete(token);
+      entries.set(token, entry);
+      return entry.value;
+    },
+
+    set(token, value, expSeconds) {
+      const expiresAt = Math.min(
+        Date.now() + ttlMs,
+        expSeconds ? expSeconds * 1000 : Infinity
+      );
+      if (expiresAt <= Date.now()) {
+        return;
+      }
+      entries.delete(token);
+      entries.set(token, { value, expiresAt });
+      if (entries.size > maxEntries) {
+        entries.delete(entries.keys().next().value);
+      }
+    },
+
+    delete(token) {
+      entries.delete(token);
+    },
+
+    clear() {
+      entries.clear();
+    },
+
+    get size() {
+      return entries.size;
+    },
+  };
+}
+
+module.exports = { createSessionCache };
@@ -4,6 +4,9 @@ const crypto = require('crypto');
 const ENCRYPTION_KEY = process.env.TOKEN_ENCRYPTION_KEY || crypto.randomBytes(32).toString('hex');
 const ALGORITHM = 'aes-256-gcm';
 
+// scrypt is deliberately slow and synchronous, so derive the AES key once at startup
+const KEY = crypto.scryptSync(ENCRYPTION_KEY, 'salt', 32);
+
 /**
  * Encrypts a JWT token with an additional encryption layer
  * @param {string} token - The JWT token to encrypt
@@ -11,9 +14,8 @@ const ALGORITHM = 'aes-256-gcm';
  */
 function encryptToken(token) {
   try {
-    const key = crypto.scryptSync(ENCRYPTION_KEY, 'salt', 32);
     const iv = crypto.randomBytes(16);
-    const cipher = crypto.createCipheriv(ALGORITHM, key, iv);
+    const cipher = crypto.createCipheriv(ALGORITHM, KEY, iv);
 
     let encrypted = cipher.update(token, 'utf8', 'hex');
     encrypted += cipher.final('hex');
@@ -34,7 +36,6 @@ function encryptToken(token) {
  */
 function decryptToken(encryptedToken) {
   try {
-    const key = crypto.scryptSync(ENCRYPTION_KEY, 'salt', 32);
     const parts = encryptedToken.split(':');
 
     if (parts.length !== 3) {
@@ -45,7 +46,7 @@ function decryptToken(encryptedToken) {
     const iv = Buffer.from(ivHex, 'hex');
     const authTag = Buffer.from(authTagHex, 'hex');
 
-    const decipher = crypto.createDecipheriv(ALGORITHM, key, iv);
+    const decipher = crypto.createDecipheriv(ALGORITHM, KEY, iv);
     decipher.setAuthTag(authTag);
 
     let decrypted = decipher.update(encrypted, 'hex', 'utf8');
@@ -181,8 +181,16 @@ export const api = {
     return data;
   },
 
-  async getAllUsers() {
-    const response = await fetch(`${API_BASE_URL}/api/users/all`, {
+  // One keyset page of users; pass the previous page's next_cursor to continue
+  async getAllUsers(options: { cursor?: string | null; limit?: number; role?: string; plaza_name?: string } = {}) {
+    const params = new URLSearchParams();
+    Object.entries(options).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        params.append(key, String(value));
+      }
+    });
+
+    const response = await fetch(`${API_BASE_URL}/api/users/all?${params.toString()}`, {
       method: 'GET',
       credentials: 'include',
     });
@@ -356,9 +364,28 @@ export const api = {
     return data;
   },
 
-  async getSubmittedRequests(scope_name: string) {
+  // One keyset page of submitted requests; pass the previous page's next_cursor to continue
+  async getSubmittedRequests(
+    scope_name: string,
+    options: {
+      cursor?: string | null;
+      limit?: number;
+      from_date?: string;
+      to_date?: string;
+      due_date?: string;
+      plaza_name?: string;
+      done?: 'done' | 'pending';
+    } = {}
+  ) {
+    const params = new URLSearchParams({ scope_name });
+    Object.entries(options).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        params.append(key, String(value));
+      }
+    });
+
     const response = await fetch(
-      `${API_BASE_URL}/api/idr/submitted-requests?scope_name=${encodeURIComponent(scope_name)}`,
+      `${API_BASE_URL}/api/idr/submitted-requests?${params.toString()}`,
       {
         method: 'GET',
         credentials: 'include',
@@ -405,12 +432,13 @@ export const api = {
   },
 
   async uploadDocument(req_id: string, document_type: string, year: string, month: string, file: File) {
+    // The backend streams the file to S3 and needs these fields first, so the file goes last
     const formData = new FormData();
-    formData.append('file', file);
     formData.append('req_id', req_id);
     formData.append('document_type', document_type);
     formData.append('year', year);
     formData.append('month', month);
+    formData.append('file', file);
 
     const response = await fetch(`${API_BASE_URL}/api/idr/upload-document`, {
       method: 'POST',
@@ -429,8 +457,8 @@ export const api = {
 
   async replaceDocument(document_id: number, file: File) {
     const formData = new FormData();
-    formData.append('file', file);
     formData.append('document_id', String(document_id));
+    formData.append('file', file);
 
     const response = await fetch(`${API_BASE_URL}/api/idr/replace-document`, {
       method: 'POST',
@@ -531,6 +559,53 @@ export const api = {
     return data;
   },
 
+  // Plaza x month grid of one run; revalidated with the browser cache's ETag, so an
+  // unchanged grid comes back as a 304 without a body
+  async getRequestOverview(
+    scope_name: string,
+    options: { from_date: string; to_date: string; due_date?: string }
+  ) {
+    const params = new URLSearchParams({ scope_name });
+    Object.entries(options).forEach(([key, value]) => {
+      if (value) {
+        params.append(key, value);
+      }
+    });
+
+    const response = await fetch(`${API_BASE_URL}/api/idr/overview?${params}`, {
+      method: 'GET',
+      credentials: 'include',
+      cache: 'no-cache',
+    });
+
+    const data = await response.json();
+
+    if (!response.ok) {
+      throw new Error(data.message || 'Failed to fetch request overview');
+    }
+
+    return data;
+  },
+
+  async getCellDocuments(cells: { req_id: string; year: string; month: string }[]) {
+    const response = await fetch(`${API_BASE_URL}/api/idr/cell-documents`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      credentials: 'include',
+      body: JSON.stringify({ cells }),
+    });
+
+    const data = await response.json();
+
+    if (!response.ok) {
+      throw new Error(data.message || 'Failed to fetch cell documents');
+    }
+
+    return data;
+  },
+
   async rejectDocuments(document_ids: number[], reason: string) {
     const response = await fetch(`${API_BASE_URL}/api/idr/reject-documents`, {
       method: 'POST',
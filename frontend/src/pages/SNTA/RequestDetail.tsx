@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { useNavigate, useSearchParams } from "react-router-dom"
 import { Sidebar } from "@/components/layout/Sidebar"
 import { Navbar } from "@/components/layout/Navbar"
@@ -30,14 +30,15 @@ interface IDRRecord {
   scope_name: string
   req_id: string
   done: string | null
+  cells: OverviewCell[]
 }
 
-interface DocumentCount {
-  req_id: string
-  plaza_name: string
+interface OverviewCell {
   year: string
   month: string
-  document_count: number
+  total_slots: number
+  filled_slots: number
+  rejected_slots: number
 }
 
 interface Document {
@@ -96,6 +97,8 @@ export default function RequestDetail() {
   const [records, setRecords] = useState<IDRRecord[]>([])
   const [actualScopeName, setActualScopeName] = useState<string>('') // Actual scope_name from records
   const [documentCounts, setDocumentCounts] = useState<Map<string, number>>(new Map())
+  // Uploaded documents by "req_id-year-month", filled by prefetching a row's cells on hover
+  const cellDocumentsCache = useRef<Map<string, Document[]>>(new Map())
   const [selectedCell, setSelectedCell] = useState<{ req_id: string; plaza_name: string; month: string; year: string } | null>(null)
   const [cellDocuments, setCellDocuments] = useState<Document[]>([])
   const [requiredDocumentTypes, setRequiredDocumentTypes] = useState<string[]>([])
@@ -118,27 +121,33 @@ export default function RequestDetail() {
     }
   }, [scopeParam, from_date, to_date, due_date])
 
-  useEffect(() => {
-    if (records.length > 0) {
-      fetchDocumentCounts()
-    }
-  }, [records])
+  // One call for the whole grid: every request of the run with its per-month counts
+  const loadOverview = async () => {
+    const data = await api.getRequestOverview(scopeParam, { from_date, to_date, due_date })
+    const overview: IDRRecord[] = data.records || []
+
+    // Create a map: key = "req_id-year-month", value = count
+    const countsMap = new Map<string, number>()
+    overview.forEach((record) => {
+      record.cells.forEach((cell) => {
+        countsMap.set(`${record.req_id}-${cell.year}-${cell.month}`, Number(cell.filled_slots))
+      })
+    })
+
+    cellDocumentsCache.current = new Map()
+    setRecords(overview)
+    setDocumentCounts(countsMap)
+    return overview
+  }
 
   const fetchRecords = async () => {
     setIsLoading(true)
     try {
-      const data = await api.getSubmittedRequests(scopeParam)
-      // Filter records by date range
-      const filtered = (data.records || []).filter((record: IDRRecord) => 
-        record.from_date === from_date && 
-        record.to_date === to_date && 
-        record.due_date === due_date
-      )
-      setRecords(filtered)
-      
+      const overview = await loadOverview()
+
       // If scope was "all", extract the actual scope_name from the first record
-      if (scopeParam === 'all' && filtered.length > 0 && filtered[0].scope_name) {
-        setActualScopeName(filtered[0].scope_name)
+      if (scopeParam === 'all' && overview.length > 0 && overview[0].scope_name) {
+        setActualScopeName(overview[0].scope_name)
       } else if (scopeParam !== 'all') {
         setActualScopeName(scopeParam)
       }
@@ -152,25 +161,39 @@ export default function RequestDetail() {
   }
 
   const fetchDocumentCounts = async () => {
-    if (records.length === 0) return
-
     try {
-      const reqIds = records.map(r => r.req_id)
-      const data = await api.getDocumentCounts(reqIds)
-      
-      // Create a map: key = "req_id-year-month", value = count
-      const countsMap = new Map<string, number>()
-      data.counts.forEach((count: DocumentCount) => {
-        const key = `${count.req_id}-${count.year}-${count.month}`
-        countsMap.set(key, Number(count.document_count))
-      })
-      
-      setDocumentCounts(countsMap)
+      await loadOverview()
     } catch (error) {
       console.error("Error fetching document counts:", error)
     }
   }
 
+  // Fetch the documents of several cells in one call and keep them for the documents dialog
+  const fetchCellDocuments = async (cells: { req_id: string; year: string; month: string }[]) => {
+    // A reload of the overview replaces the cache; answers to older requests land in the old one
+    const cache = cellDocumentsCache.current
+    const data = await api.getCellDocuments(cells)
+    const documents: Document[] = data.documents || []
+    const byCell = new Map<string, Document[]>(
+      cells.map((cell) => [`${cell.req_id}-${cell.year}-${cell.month}`, []])
+    )
+    documents.forEach((doc) => {
+      byCell.get(`${doc.req_id}-${doc.year}-${doc.month}`)?.push(doc)
+    })
+    byCell.forEach((cellDocs, key) => cache.set(key, cellDocs))
+    return byCell
+  }
+
+  const prefetchRow = (record: IDRRecord) => {
+    const cells = record.cells
+      .filter((cell) => cell.filled_slots > 0)
+      .map((cell) => ({ req_id: record.req_id, year: cell.year, month: cell.month }))
+      .filter((cell) => !cellDocumentsCache.current.has(`${cell.req_id}-${cell.year}-${cell.month}`))
+    if (cells.length > 0) {
+      fetchCellDocuments(cells).catch((error) => console.warn("Error prefetching documents:", error))
+    }
+  }
+
   const handleCellClick = async (record: IDRRecord, month: string) => {
     // Extract year and month number from month string (e.g., "January 2025")
     const [monthName, year] = month.split(' ')
@@ -215,9 +238,15 @@ export default function RequestDetail() {
         setRequiredDocumentTypes([])
       }
 
-      // Fetch uploaded documents
-      const data = await api.getPlazaDocuments(record.req_id, year, monthNum)
-      setCellDocuments(data.documents || [])
+      // Uploaded documents, unless the row was prefetched
+      const key = `${record.req_id}-${year}-${monthNum}`
+      const cached = cellDocumentsCache.current.get(key)
+      if (cached) {
+        setCellDocuments(cached)
+      } else {
+        const byCell = await fetchCellDocuments([{ req_id: record.req_id, year, month: monthNum }])
+        setCellDocuments(byCell.get(key) || [])
+      }
     } catch (error) {
       console.error("Error fetching documents:", error)
       toast.error("Failed to load documents")
@@ -267,19 +296,20 @@ export default function RequestDetail() {
       await api.rejectDocuments(documentIds, rejectReason)
       toast.success(`Successfully rejected ${documentIds.length} document(s)`)
       
+      // Refresh document counts (this also drops prefetched documents)
+      await fetchDocumentCounts()
+
       // Refresh documents to show updated status
       if (selectedCell) {
-        const data = await api.getPlazaDocuments(selectedCell.req_id, selectedCell.year, selectedCell.month)
-        setCellDocuments(data.documents || [])
+        const { req_id, year, month } = selectedCell
+        const byCell = await fetchCellDocuments([{ req_id, year, month }])
+        setCellDocuments(byCell.get(`${req_id}-${year}-${month}`) || [])
       }
       
       // Reset reject mode
       setIsRejectMode(false)
       setSelectedDocuments(new Set())
       setRejectReason("")
-      
-      // Refresh document counts
-      fetchDocumentCounts()
     } catch (error) {
       console.error("Error rejecting documents:", error)
       toast.error(error instanceof Error ? error.message : "Failed to reject documents")
@@ -464,6 +494,7 @@ export default function RequestDetail() {
                         {records.map((record) => (
                           <tr 
                             key={record.id} 
+                            onMouseEnter={() => prefetchRow(record)}
                             className={`hover:bg-muted/50 ${
                               record.done === 'Done' ? 'bg-green-50/30 dark:bg-green-950/20' : ''
                             }`}
@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react"
+import { useState, useEffect, useRef } from "react"
 import { useNavigate } from "react-router-dom"
 import { Sidebar } from "@/components/layout/Sidebar"
 import { Navbar } from "@/components/layout/Navbar"
@@ -54,25 +54,31 @@ export default function SubmittedRequests() {
   const [selectedScope, setSelectedScope] = useState<string>("all")
   const [statusFilter, setStatusFilter] = useState<string>("all") // "all", "pending", "done"
   const [plazaFilter, setPlazaFilter] = useState<string>("all") // "all" or specific plaza_name
+  const [plazas, setPlazas] = useState<string[]>([])
   const [records, setRecords] = useState<IDRRecord[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [groups, setGroups] = useState<Group[]>([])
   const [isLoading, setIsLoading] = useState(false)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
+  // Bumped whenever the filters change, so responses of older requests are dropped
+  const requestGeneration = useRef(0)
 
   useEffect(() => {
     fetchUniqueScopes()
+    fetchPlazas()
   }, [])
 
   useEffect(() => {
+    // The cursor belongs to the previous filters
+    requestGeneration.current += 1
+    setNextCursor(null)
     if (selectedScope) {
       fetchSubmittedRequests()
-      // Reset plaza filter when scope changes
-      setPlazaFilter('all')
     } else {
       setRecords([])
       setGroups([])
-      setPlazaFilter('all')
     }
-  }, [selectedScope])
+  }, [selectedScope, statusFilter, plazaFilter])
 
   useEffect(() => {
     if (records.length > 0) {
@@ -80,7 +86,7 @@ export default function SubmittedRequests() {
     } else {
       setGroups([])
     }
-  }, [records, statusFilter, plazaFilter])
+  }, [records])
 
 
 
@@ -94,37 +100,73 @@ export default function SubmittedRequests() {
     }
   }
 
+  const fetchPlazas = async () => {
+    try {
+      const data = await api.getPlazas()
+      setPlazas(data.plazas || [])
+    } catch (error) {
+      console.error("Error fetching plazas:", error)
+    }
+  }
+
+  // Status and plaza filters are applied by the server, one keyset page at a time
+  const submittedRequestFilters = () => ({
+    done: statusFilter === 'all' ? undefined : statusFilter as 'done' | 'pending',
+    plaza_name: plazaFilter === 'all' ? undefined : plazaFilter,
+  })
+
+  // Reset the plaza filter in the same update as the scope, so only one request is sent
+  const handleScopeChange = (scope: string) => {
+    setSelectedScope(scope)
+    setPlazaFilter('all')
+  }
+
   const fetchSubmittedRequests = async () => {
+    const generation = requestGeneration.current
     setIsLoading(true)
     try {
-      const data = await api.getSubmittedRequests(selectedScope)
+      const data = await api.getSubmittedRequests(selectedScope, submittedRequestFilters())
+      if (generation !== requestGeneration.current) return
       setRecords(data.records || [])
+      setNextCursor(data.next_cursor || null)
     } catch (error) {
+      if (generation !== requestGeneration.current) return
       console.error("Error fetching submitted requests:", error)
       toast.error("Failed to load submitted document requests")
       setRecords([])
+      setNextCursor(null)
     } finally {
-      setIsLoading(false)
+      if (generation === requestGeneration.current) {
+        setIsLoading(false)
+      }
     }
   }
 
-  const groupRecords = () => {
-    // Filter records based on status filter
-    let filteredRecords = records
-    if (statusFilter === 'pending') {
-      filteredRecords = records.filter(record => !record.done || record.done === '')
-    } else if (statusFilter === 'done') {
-      filteredRecords = records.filter(record => record.done === 'Done')
-    }
-
-    // Filter records based on plaza filter
-    if (plazaFilter !== 'all') {
-      filteredRecords = filteredRecords.filter(record => record.plaza_name === plazaFilter)
+  const loadMoreRequests = async () => {
+    if (!nextCursor) return
+    const generation = requestGeneration.current
+    setIsLoadingMore(true)
+    try {
+      const data = await api.getSubmittedRequests(selectedScope, {
+        ...submittedRequestFilters(),
+        cursor: nextCursor,
+      })
+      if (generation !== requestGeneration.current) return
+      setRecords(prev => [...prev, ...(data.records || [])])
+      setNextCursor(data.next_cursor || null)
+    } catch (error) {
+      if (generation !== requestGeneration.current) return
+      console.error("Error fetching submitted requests:", error)
+      toast.error("Failed to load more document requests")
+    } finally {
+      setIsLoadingMore(false)
     }
+  }
 
+  const groupRecords = () => {
     const grouped = new Map<string, IDRRecord[]>()
 
-    filteredRecords.forEach(record => {
+    records.forEach(record => {
       const key = `${record.from_date}|${record.to_date}|${record.due_date}`
       if (!grouped.has(key)) {
         grouped.set(key, [])
@@ -205,7 +247,7 @@ export default function SubmittedRequests() {
                 <div className="flex flex-wrap gap-2 items-end">
                   <div className="space-y-2 w-[200px]">
                     <Label htmlFor="scope">Scope</Label>
-                    <Select value={selectedScope} onValueChange={setSelectedScope}>
+                    <Select value={selectedScope} onValueChange={handleScopeChange}>
                       <SelectTrigger id="scope" className="w-full">
                         <SelectValue placeholder="Select scope" />
                       </SelectTrigger>
@@ -237,14 +279,14 @@ export default function SubmittedRequests() {
                     <Select 
                       value={plazaFilter} 
                       onValueChange={setPlazaFilter}
-                      disabled={records.length === 0}
+                      disabled={plazas.length === 0}
                     >
                       <SelectTrigger id="plaza" className="w-full">
                         <SelectValue placeholder="Select plaza" />
                       </SelectTrigger>
                       <SelectContent>
                         <SelectItem value="all">All Plazas</SelectItem>
-                        {Array.from(new Set(records.map(r => r.plaza_name)))
+                        {[...plazas]
                           .sort()
                           .map((plaza) => (
                             <SelectItem key={plaza} value={plaza}>
@@ -332,6 +374,13 @@ export default function SubmittedRequests() {
                         )
                       })}
                     </div>
+                    {nextCursor && (
+                      <div className="flex justify-center">
+                        <Button variant="outline" onClick={loadMoreRequests} disabled={isLoadingMore}>
+                          {isLoadingMore ? 'Loading...' : 'Load more'}
+                        </Button>
+                      </div>
+                    )}
                   </div>
                 )}
 
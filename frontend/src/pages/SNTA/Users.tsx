@@ -78,7 +78,9 @@ export default function Users() {
   const [isCollapsed, setIsCollapsed] = useState(false)
   const [isMobileMenuOpen, setIsMobileMenuOpen] = useState(false)
   const [users, setUsers] = useState<User[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [isLoading, setIsLoading] = useState(false)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
   const [showCreateForm, setShowCreateForm] = useState(false)
   
   const [values, setValues] = React.useState<UserFormState>({
@@ -105,6 +107,7 @@ export default function Users() {
     try {
       const data = await api.getAllUsers()
       setUsers(data.users || [])
+      setNextCursor(data.next_cursor || null)
     } catch (error) {
       console.error("Error fetching users:", error)
       toast.error("Failed to load users")
@@ -113,6 +116,21 @@ export default function Users() {
     }
   }
 
+  const loadMoreUsers = async () => {
+    if (!nextCursor) return
+    setIsLoadingMore(true)
+    try {
+      const data = await api.getAllUsers({ cursor: nextCursor })
+      setUsers(prev => [...prev, ...(data.users || [])])
+      setNextCursor(data.next_cursor || null)
+    } catch (error) {
+      console.error("Error fetching users:", error)
+      toast.error("Failed to load more users")
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }
+
   function setField<K extends keyof UserFormState>(key: K, v: UserFormState[K]) {
     setValues((prev) => ({ ...prev, [key]: v }))
     setErrors((prev) => ({ ...prev, [key]: undefined }))
@@ -441,6 +459,13 @@ export default function Users() {
                     </Table>
                   </div>
                 )}
+                {!isLoading && nextCursor && (
+                  <div className="flex justify-center pt-4">
+                    <Button variant="outline" onClick={loadMoreUsers} disabled={isLoadingMore}>
+                      {isLoadingMore ? "Loading..." : "Load more"}
+                    </Button>
+                  </div>
+                )}
               </CardContent>
             </Card>
           </div>